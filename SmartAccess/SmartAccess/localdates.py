@@ -0,0 +1,115 @@
+"""
+Stored local-date bucketing for scan and log tables.
+
+Filtering on ``timestamp__date`` or ``timestamp__time__hour`` wraps the column
+in a function call per row, which SQLite cannot answer from an index. Models
+using ``LocalDateBucketed`` instead store the campus-local date and hour of
+their timestamp in indexed columns, and ``LocalDateQuerySet`` turns "today",
+"last N days" and date-range filters into plain range predicates on them.
+"""
+
+import zoneinfo
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+CAMPUS_TIME_ZONE = zoneinfo.ZoneInfo(getattr(settings, 'CAMPUS_TIME_ZONE', settings.TIME_ZONE))
+
+
+def campus_localtime(value):
+    return timezone.localtime(value, CAMPUS_TIME_ZONE)
+
+
+def campus_localdate(value=None):
+    return campus_localtime(value or timezone.now()).date()
+
+
+def local_date_q(on=None, start=None, end=None, prefix=''):
+    """
+    Q object for a local date (``on``) or inclusive range (``start``/``end``).
+
+    ``prefix`` reaches the column through a relation, e.g. ``'transport_logs__'``
+    inside a filtered Count.
+    """
+    field = f'{prefix}local_date'
+    if on is not None:
+        return Q(**{field: on})
+    q = Q()
+    if start is not None:
+        q &= Q(**{f'{field}__gte': start})
+    if end is not None:
+        q &= Q(**{f'{field}__lte': end})
+    return q
+
+
+class LocalDateQuerySet(models.QuerySet):
+    def on_date(self, day):
+        return self.filter(local_date_q(on=day))
+
+    def today(self):
+        return self.on_date(campus_localdate())
+
+    def between_dates(self, start=None, end=None):
+        return self.filter(local_date_q(start=start, end=end))
+
+    def last_days(self, days):
+        """Rows from the last ``days`` days up to and including today."""
+        return self.between_dates(start=campus_localdate() - timedelta(days=days))
+
+    def from_hour(self, hour):
+        return self.filter(local_hour__gte=hour)
+
+    def before_hour(self, hour):
+        return self.filter(local_hour__lt=hour)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips save(), so fill the buckets here
+        objs = list(objs)
+        for obj in objs:
+            obj.set_local_bucket()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class LocalDateBucketed(models.Model):
+    """
+    Abstract base storing the campus-local date and hour of ``LOCAL_DATE_FIELD``.
+
+    The columns are filled on save() and bulk_create(); rows written before
+    they existed are filled by the ``backfill_local_dates`` command.
+    Subclasses with their own Meta extend ``LocalDateBucketed.Meta`` to keep
+    the (date, hour) index.
+    """
+    LOCAL_DATE_FIELD = 'timestamp'
+
+    local_date = models.DateField(null=True, blank=True, editable=False, db_index=True)
+    local_hour = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+
+    objects = LocalDateQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+        indexes = [
+            # Hour filters within a date range (from_hour/before_hour)
+            models.Index(fields=['local_date', 'local_hour'], name='%(class)s_date_hour_idx'),
+        ]
+
+    def set_local_bucket(self):
+        value = getattr(self, self.LOCAL_DATE_FIELD)
+        if value is None:
+            # auto_now_add fields are only filled in during save()
+            value = timezone.now()
+            setattr(self, self.LOCAL_DATE_FIELD, value)
+        local = campus_localtime(value)
+        self.local_date = local.date()
+        self.local_hour = local.hour
+
+    def save(self, *args, **kwargs):
+        self.set_local_bucket()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.LOCAL_DATE_FIELD in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'local_date', 'local_hour'}
+        super().save(*args, **kwargs)
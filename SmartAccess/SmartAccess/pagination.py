@@ -0,0 +1,103 @@
+"""
+Keyset (cursor) pagination for append-only log tables.
+
+Pages are addressed by an opaque cursor encoding the ordering value and id
+of the row at the page edge, so every page is an index range scan of
+``per_page + 1`` rows. No COUNT(*) is issued unless asked for, and page
+5000 costs the same as page 1.
+"""
+
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class KeysetPage:
+    """One page of results; iterates like a Paginator page in templates."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def encode_cursor(value, pk, direction):
+    payload = json.dumps([value.isoformat(), pk, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(value, pk, direction)`` or None for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, pk, direction = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = parse_datetime(value)
+    except (ValueError, TypeError):
+        return None
+    if value is None or not isinstance(pk, int) or direction not in ('next', 'prev'):
+        return None
+    return value, pk, direction
+
+
+def keyset_paginate(queryset, cursor=None, per_page=10, field='timestamp', with_count=False):
+    """
+    Return a KeysetPage of ``queryset`` ordered newest first by ``(field, id)``.
+
+    ``cursor`` is a token from a previous page's ``next_cursor`` or
+    ``previous_cursor``. Pass ``with_count=True`` to also compute the total.
+    """
+    count = queryset.count() if with_count else None
+    position = decode_cursor(cursor)
+
+    if position is None:
+        rows = list(queryset.order_by(f'-{field}', '-id')[:per_page + 1])
+        has_more, has_before = len(rows) > per_page, False
+        rows = rows[:per_page]
+    else:
+        value, pk, direction = position
+        if direction == 'next':
+            rows = list(queryset.filter(
+                Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk})
+            ).order_by(f'-{field}', '-id')[:per_page + 1])
+            has_more, has_before = len(rows) > per_page, True
+            rows = rows[:per_page]
+        else:
+            rows = list(queryset.filter(
+                Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk})
+            ).order_by(field, 'id')[:per_page + 1])
+            has_more, has_before = True, len(rows) > per_page
+            rows = rows[:per_page][::-1]
+
+    next_cursor = previous_cursor = None
+    if rows and has_more:
+        next_cursor = encode_cursor(getattr(rows[-1], field), rows[-1].pk, 'next')
+    if rows and has_before:
+        previous_cursor = encode_cursor(getattr(rows[0], field), rows[0].pk, 'prev')
+
+    return KeysetPage(rows, next_cursor, previous_cursor, count)
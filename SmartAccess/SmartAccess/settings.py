@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -128,6 +129,9 @@ LANGUAGE_CODE = 'en-us'
 
 TIME_ZONE = 'UTC'
 
+# Timezone used to bucket scans and logs into local dates and hours
+CAMPUS_TIME_ZONE = TIME_ZONE
+
 USE_I18N = True
 
 USE_TZ = True
@@ -173,6 +177,9 @@ CACHES = {
     }
 }
 
+# NFC reader (Raspberry Pi) used to scan cards for assignment
+NFC_READER_URL = os.environ.get('NFC_READER_URL', 'http://127.0.0.1:5000')
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For development
 # For production:
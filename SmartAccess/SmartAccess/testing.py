@@ -0,0 +1,28 @@
+"""
+Helpers shared by the apps' tests.
+
+Presence, cards, gates and counters live in the cache (Redis in
+production); tests run against a local-memory cache that is emptied before
+every test, together with the per-process card LRU.
+"""
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'smartaccess-tests',
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CachedTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        from attendance.cards import _local
+
+        cache.clear()
+        _local.clear()
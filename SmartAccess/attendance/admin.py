@@ -1,3 +1,71 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from .gates import issue_reader_key
+from .models import Card, Gate, Holiday, PunctualityPolicy, Reader, Term
 
-# Register your models here.
+
+@admin.register(Gate)
+class GateAdmin(admin.ModelAdmin):
+    list_display = ['name', 'location', 'is_active', 'created_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'location']
+
+
+@admin.register(Card)
+class CardAdmin(admin.ModelAdmin):
+    list_display = ['uid', 'kind', 'student', 'user', 'status', 'updated_at']
+    list_filter = ['kind', 'status']
+    search_fields = ['uid', 'student__name', 'student__roll_number', 'user__username']
+    raw_id_fields = ['student', 'user']
+    actions = ['mark_lost', 'revoke']
+
+    @admin.action(description='Mark selected cards as lost')
+    def mark_lost(self, request, queryset):
+        # Saved one by one so the signals invalidate caches and the roster
+        for card in queryset:
+            card.status = 'lost'
+            card.save()
+
+    @admin.action(description='Revoke selected cards')
+    def revoke(self, request, queryset):
+        for card in queryset:
+            card.status = 'revoked'
+            card.save()
+
+
+@admin.register(Term)
+class TermAdmin(admin.ModelAdmin):
+    list_display = ['name', 'start_date', 'end_date']
+
+
+@admin.register(Reader)
+class ReaderAdmin(admin.ModelAdmin):
+    list_display = ['name', 'gate', 'key_prefix', 'is_active', 'created_at']
+    list_filter = ['is_active', 'gate']
+    search_fields = ['name', 'gate__name']
+    readonly_fields = ['key_prefix', 'created_at']
+    actions = ['rotate_keys']
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            super().save_model(request, obj, form, change)
+            return
+        key = issue_reader_key(obj)
+        messages.success(request, f'API key for {obj} (shown once): {key}')
+
+    @admin.action(description='Issue new API keys')
+    def rotate_keys(self, request, queryset):
+        for reader in queryset:
+            key = issue_reader_key(reader)
+            messages.success(request, f'API key for {reader} (shown once): {key}')
+
+
+@admin.register(PunctualityPolicy)
+class PunctualityPolicyAdmin(admin.ModelAdmin):
+    list_display = ['name', 'is_active', 'time_zone', 'grace_minutes', 'updated_at']
+    list_filter = ['is_active']
+
+
+@admin.register(Holiday)
+class HolidayAdmin(admin.ModelAdmin):
+    list_display = ['date', 'name']
+    date_hierarchy = 'date'
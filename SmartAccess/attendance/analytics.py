@@ -0,0 +1,259 @@
+"""
+Vectorized attendance analytics over the full entry log.
+
+``load_scans`` streams ``(student_id, timestamp, action, auto_generated,
+local_date)`` columns with ``values_list(...).iterator()`` and packs each
+chunk into NumPy arrays, ordered by student then time. The reports are
+computed on those arrays without Python loops over rows:
+
+* ``arrival_heatmap``: first check-in of each student-day, binned by
+  weekday and campus-local hour.
+* ``dwell_distribution``: percentiles and a histogram of visit lengths
+  (an ``in`` followed by the same student's ``out``). Visits closed by the
+  automatic checkout are left out, since their length is not real.
+* ``attendance_trends``: arrivals, school days, students, late share (by
+  the punctuality policy) and median visit per term, or per month when no
+  terms are defined.
+
+``analytics_report`` computes all three for a date range and caches the
+result per range and policy version; ranges that include today expire
+after a few minutes.
+"""
+
+import zoneinfo
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import EntryLog, Term
+from .punctuality import current_policy
+from SmartAccess.localdates import CAMPUS_TIME_ZONE, campus_localdate
+
+
+LOAD_CHUNK_SIZE = 20000
+
+ANALYTICS_KEY_PREFIX = 'attendance:analytics:'
+# Closed ranges only change when history is edited or imported
+ANALYTICS_TIMEOUT = getattr(settings, 'ATTENDANCE_ANALYTICS_TIMEOUT', 60 * 60 * 24)
+ANALYTICS_LIVE_TIMEOUT = getattr(settings, 'ATTENDANCE_ANALYTICS_LIVE_TIMEOUT', 60 * 5)
+
+DWELL_PERCENTILES = (10, 25, 50, 75, 90, 99)
+DWELL_BIN_MINUTES = 30
+DWELL_MAX_MINUTES = 12 * 60  # Longer visits fall in the last bin
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class ScanArrays:
+    """EntryLog columns as parallel arrays, ordered by student then timestamp."""
+
+    def __init__(self, student, timestamp, is_in, auto, day):
+        self.student = student      # int64 student ids
+        self.timestamp = timestamp  # float64 Unix seconds
+        self.is_in = is_in          # bool, action == 'in'
+        self.auto = auto            # bool, written by the automatic checkout
+        self.day = day              # int32 proleptic ordinal of the campus-local date
+
+    def __len__(self):
+        return len(self.student)
+
+    def seconds_of_day(self):
+        """Campus-local seconds since midnight, using each day's UTC offset at noon."""
+        days, inverse = np.unique(self.day, return_inverse=True)
+        offsets = np.array([
+            CAMPUS_TIME_ZONE.utcoffset(datetime.combine(date.fromordinal(int(day)), time(12))).total_seconds()
+            for day in days
+        ])
+        return (self.timestamp + offsets[inverse]) % SECONDS_PER_DAY
+
+
+def load_scans(start=None, end=None, chunk_size=LOAD_CHUNK_SIZE):
+    """Read the logs of an inclusive local date range into ScanArrays."""
+    rows = EntryLog.objects.between_dates(start, end).filter(local_date__isnull=False)\
+        .order_by('student_id', 'timestamp', 'id')\
+        .values_list('student_id', 'timestamp', 'action', 'auto_generated', 'local_date')\
+        .iterator(chunk_size=chunk_size)
+
+    columns = ([], [], [], [], [])
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        student, timestamp, action, auto, day = zip(*chunk)
+        count = len(chunk)
+        columns[0].append(np.fromiter(student, dtype=np.int64, count=count))
+        columns[1].append(np.fromiter((value.timestamp() for value in timestamp), dtype=np.float64, count=count))
+        columns[2].append(np.fromiter((value == 'in' for value in action), dtype=bool, count=count))
+        columns[3].append(np.fromiter(auto, dtype=bool, count=count))
+        columns[4].append(np.fromiter((value.toordinal() for value in day), dtype=np.int32, count=count))
+
+    dtypes = (np.int64, np.float64, bool, bool, np.int32)
+    return ScanArrays(*[
+        np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+        for parts, dtype in zip(columns, dtypes)
+    ])
+
+
+def arrivals(scans):
+    """Indexes of each student's first check-in per day."""
+    checked_in = np.flatnonzero(scans.is_in)
+    student, day = scans.student[checked_in], scans.day[checked_in]
+    first = np.ones(len(checked_in), dtype=bool)
+    first[1:] = (student[1:] != student[:-1]) | (day[1:] != day[:-1])
+    return checked_in[first]
+
+
+def late_mask(timestamps, days, policy=None):
+    """
+    Vectorized ``punctuality.is_late`` for Unix ``timestamps`` and the
+    ordinals of their local ``days``; the policy is applied once per day.
+    """
+    policy = policy or current_policy()
+    tz = zoneinfo.ZoneInfo(policy['time_zone'])
+    unique_days, inverse = np.unique(days, return_inverse=True)
+
+    offsets = []
+    limits = []
+    for day in map(date.fromordinal, unique_days.tolist()):
+        offsets.append(tz.utcoffset(datetime.combine(day, time(12))).total_seconds())
+        limit = policy['limits'][day.weekday()]
+        limits.append(np.inf if limit is None or day in policy['holidays'] else limit)
+
+    seconds = (timestamps + np.array(offsets)[inverse]) % SECONDS_PER_DAY
+    return seconds >= np.array(limits, dtype=np.float64)[inverse]
+
+
+def visits(scans):
+    """``(check_in_day, minutes)`` arrays of completed, manually closed visits."""
+    if len(scans) < 2:
+        return np.empty(0, dtype=np.int32), np.empty(0)
+    closes = (
+        scans.is_in[:-1] & ~scans.is_in[1:] & ~scans.auto[1:]
+        & (scans.student[:-1] == scans.student[1:])
+    )
+    minutes = (scans.timestamp[1:] - scans.timestamp[:-1])[closes] / 60
+    return scans.day[:-1][closes], minutes
+
+
+def arrival_heatmap(day, seconds):
+    """Arrivals by weekday (rows, Monday first) and hour, plus the mean per day."""
+    weekday = (day - 1) % 7  # Ordinal 1 (0001-01-01) was a Monday
+    hour = (seconds // 3600).astype(np.int64)
+    counts = np.bincount(weekday * 24 + hour, minlength=7 * 24).reshape(7, 24)
+
+    days_per_weekday = np.bincount((np.unique(day) - 1) % 7, minlength=7)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(days_per_weekday[:, None] > 0, counts / days_per_weekday[:, None], 0)
+
+    return {
+        'weekdays': WEEKDAYS,
+        'hours': list(range(24)),
+        'counts': counts.tolist(),
+        'mean_per_day': np.round(mean, 1).tolist(),
+        'days_per_weekday': days_per_weekday.tolist(),
+        'total': int(counts.sum()),
+        'peak': int(counts.max()) if len(day) else 0,
+    }
+
+
+def dwell_distribution(minutes):
+    """Visit length percentiles and histogram, in minutes."""
+    edges = np.arange(0, DWELL_MAX_MINUTES + DWELL_BIN_MINUTES, DWELL_BIN_MINUTES)
+    histogram, _ = np.histogram(np.minimum(minutes, DWELL_MAX_MINUTES), bins=edges)
+    return {
+        'visits': int(len(minutes)),
+        'mean': round(float(minutes.mean()), 1) if len(minutes) else None,
+        'percentiles': {
+            f'p{q}': round(float(value), 1)
+            for q, value in zip(DWELL_PERCENTILES, np.percentile(minutes, DWELL_PERCENTILES))
+        } if len(minutes) else {},
+        'bins': edges[:-1].tolist(),
+        'bin_minutes': DWELL_BIN_MINUTES,
+        'counts': histogram.tolist(),
+    }
+
+
+def _periods(days):
+    """
+    ``(labels, index)`` assigning each unique day in ``days`` to a term, or
+    to a calendar month when no terms are defined; -1 for days outside.
+    """
+    terms = list(Term.objects.order_by('start_date').values_list('name', 'start_date', 'end_date'))
+    if terms:
+        index = np.full(len(days), -1, dtype=np.int64)
+        for position, (_, start_date, end_date) in enumerate(terms):
+            index[(days >= start_date.toordinal()) & (days <= end_date.toordinal())] = position
+        return [name for name, _, _ in terms], index
+
+    months = np.array([
+        value.year * 12 + value.month - 1 for value in map(date.fromordinal, days.tolist())
+    ], dtype=np.int64)
+    unique_months, index = np.unique(months, return_inverse=True)
+    return [f'{month // 12}-{month % 12 + 1:02d}' for month in unique_months], index
+
+
+def attendance_trends(arrival_student, arrival_day, late, visit_day, visit_minutes):
+    """Per-term (or per-month) arrivals, school days, students, late share and median visit."""
+    days, day_index = np.unique(np.concatenate([arrival_day, visit_day]), return_inverse=True)
+    labels, period_of_day = _periods(days)
+    arrival_period = period_of_day[day_index[:len(arrival_day)]]
+    visit_period = period_of_day[day_index[len(arrival_day):]]
+
+    school_day_period = period_of_day[np.isin(days, arrival_day)]
+
+    trends = []
+    for position, label in enumerate(labels):
+        in_period = arrival_period == position
+        count = int(in_period.sum())
+        school_days = int((school_day_period == position).sum())
+        period_minutes = visit_minutes[visit_period == position]
+        trends.append({
+            'period': label,
+            'arrivals': count,
+            'school_days': school_days,
+            'students': int(len(np.unique(arrival_student[in_period]))),
+            'arrivals_per_day': round(count / school_days, 1) if school_days else 0,
+            'late_share': round(float(late[in_period].mean()) * 100, 1) if count else 0,
+            'median_visit_minutes': round(float(np.median(period_minutes)), 1) if len(period_minutes) else None,
+        })
+    return [trend for trend in trends if trend['arrivals'] or trend['median_visit_minutes'] is not None]
+
+
+def compute_analytics(start=None, end=None):
+    scans = load_scans(start, end)
+    first = arrivals(scans)
+    student, day, seconds = scans.student[first], scans.day[first], scans.seconds_of_day()[first]
+    late = late_mask(scans.timestamp[first], day)
+    visit_day, minutes = visits(scans)
+    return {
+        'start': start.isoformat() if start else None,
+        'end': end.isoformat() if end else None,
+        'scans': len(scans),
+        'heatmap': arrival_heatmap(day, seconds),
+        'dwell': dwell_distribution(minutes),
+        'trends': attendance_trends(student, day, late, visit_day, minutes),
+    }
+
+
+def analytics_report(start=None, end=None):
+    """``compute_analytics`` for an inclusive local date range, cached per range."""
+    key = f'{ANALYTICS_KEY_PREFIX}{start or "-"}:{end or "-"}:{current_policy()["version"]}'
+    report = cache.get(key)
+    if report is None:
+        report = compute_analytics(start, end)
+        live = end is None or end >= campus_localdate()
+        cache.set(key, report, ANALYTICS_LIVE_TIMEOUT if live else ANALYTICS_TIMEOUT)
+    return report
+
+
+def default_range():
+    """The full history: the oldest log's date through today."""
+    first = EntryLog.objects.filter(local_date__isnull=False).order_by('local_date')\
+        .values_list('local_date', flat=True).first()
+    today = campus_localdate()
+    return first or today - timedelta(days=30), today
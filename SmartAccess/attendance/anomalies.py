@@ -0,0 +1,131 @@
+"""
+Streaming detection of cloned, shared and misused cards.
+
+Every tap is checked against a few fields kept on the card's presence entry
+(the gate and time of its last accepted scan and the times of its last
+``RAPID_TOGGLE_SCANS`` scans), so each check is O(1) and needs no extra
+cache or database round trip. The same rules run over historical EntryLog
+ranges in ``detect_in_history`` for the ``detect_anomalies`` command.
+
+Rules:
+
+* ``cloned_card``: the card taps at a different gate within
+  ``CLONE_WINDOW`` of its last accepted scan, including taps that were
+  debounced.
+* ``rapid_toggle``: ``RAPID_TOGGLE_SCANS`` accepted scans within
+  ``RAPID_TOGGLE_WINDOW``, e.g. a card passed back over the turnstile.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+
+from .models import ScanAlert
+
+
+CLONE_WINDOW = getattr(settings, 'ATTENDANCE_CLONE_WINDOW', timedelta(minutes=2))
+RAPID_TOGGLE_SCANS = getattr(settings, 'ATTENDANCE_RAPID_TOGGLE_SCANS', 4)
+RAPID_TOGGLE_WINDOW = getattr(settings, 'ATTENDANCE_RAPID_TOGGLE_WINDOW', timedelta(minutes=10))
+
+DETECT_CHUNK_SIZE = 5000
+
+
+def remember_tap(state, timestamp, gate):
+    """Return the detector fields of ``state`` updated for an accepted scan."""
+    recent = list(state.get('recent_taps') or [])[-(RAPID_TOGGLE_SCANS - 1):]
+    recent.append(timestamp)
+    return dict(state, last_gate=gate, recent_taps=recent)
+
+
+def detect(state, timestamp, gate=None, action=None):
+    """
+    Check one tap against the card's state before it.
+
+    ``action`` is the decided action, or None for a debounced tap. Returns a
+    list of ``(kind, message, previous_gate)`` tuples.
+    """
+    alerts = []
+
+    last_gate = state.get('last_gate')
+    last_timestamp = state.get('last_timestamp')
+    if gate and last_gate and gate != last_gate and last_timestamp \
+            and abs(timestamp - last_timestamp) < CLONE_WINDOW:
+        seconds = int(abs(timestamp - last_timestamp).total_seconds())
+        alerts.append(('cloned_card', f'Tapped at {gate} {seconds}s after a scan at {last_gate}', last_gate))
+
+    if action is not None:
+        recent = [tap for tap in state.get('recent_taps') or [] if timestamp - tap <= RAPID_TOGGLE_WINDOW]
+        # Alert once per burst: when the window first fills up
+        if len(recent) + 1 == RAPID_TOGGLE_SCANS:
+            minutes = int(RAPID_TOGGLE_WINDOW.total_seconds() // 60)
+            alerts.append(('rapid_toggle', f'{RAPID_TOGGLE_SCANS} scans within {minutes} minutes', ''))
+
+    return alerts
+
+
+def build_alerts(student_id, card_id, timestamp, gate, alerts, source='live'):
+    return [
+        ScanAlert(
+            kind=kind, student_id=student_id, nfc_uid=card_id or '', occurred_at=timestamp,
+            gate=gate or '', previous_gate=previous_gate or '', message=message, source=source,
+        )
+        for kind, message, previous_gate in alerts
+    ]
+
+
+def save_alerts(alerts):
+    """Insert ScanAlert rows, skipping ones already recorded; returns the number inserted."""
+    if not alerts:
+        return 0
+    existing = set(ScanAlert.objects.filter(
+        student_id__in={alert.student_id for alert in alerts},
+        occurred_at__in={alert.occurred_at for alert in alerts},
+    ).values_list('kind', 'student_id', 'occurred_at'))
+    new = []
+    for alert in alerts:
+        key = (alert.kind, alert.student_id, alert.occurred_at)
+        if key not in existing:
+            existing.add(key)
+            new.append(alert)
+    # A concurrent scan may still have recorded one of them since
+    ScanAlert.objects.bulk_create(new, ignore_conflicts=True)
+    return len(new)
+
+
+def check_scan(state, card_id, timestamp, gate=None, action=None):
+    """Run the rules for one live tap and store any alerts; returns them."""
+    alerts = build_alerts(state['student_id'], card_id, timestamp, gate, detect(state, timestamp, gate, action))
+    save_alerts(alerts)
+    return alerts
+
+
+def detect_in_history(logs, chunk_size=DETECT_CHUNK_SIZE):
+    """
+    Run the rules over an EntryLog queryset in (student, timestamp) order,
+    streaming in chunks. Returns the number of new alerts recorded; ones
+    already recorded (by the scan path or an earlier run) are not counted.
+    """
+    rows = logs.order_by('student_id', 'timestamp', 'id').values_list(
+        'student_id', 'student__nfc_uid', 'timestamp', 'action', 'gate__name'
+    ).iterator(chunk_size=chunk_size)
+
+    found = 0
+    pending = []
+    current_student = None
+    state = {}
+
+    for student_id, card_id, timestamp, action, gate in rows:
+        if student_id != current_student:
+            current_student = student_id
+            state = {'student_id': student_id}
+
+        pending.extend(build_alerts(
+            student_id, card_id, timestamp, gate, detect(state, timestamp, gate, action), source='batch'
+        ))
+        state = dict(remember_tap(state, timestamp, gate), last_timestamp=timestamp)
+
+        if len(pending) >= chunk_size:
+            found += save_alerts(pending)
+            pending = []
+
+    return found + save_alerts(pending)
@@ -0,0 +1,361 @@
+"""
+Gate-reader load test for the scan endpoints.
+
+``seed_campus`` creates a synthetic campus (students with cards and user
+accounts, buses, an event and days of gate history). ``build_trace`` makes a
+morning-rush trace of taps, including duplicate taps and unknown cards, and
+``replay`` sends it through the real views with concurrent workers, timing
+each request and counting its database queries. ``summarize`` turns the
+samples into the per-endpoint report stored by the ``benchmark_scans``
+command, so results can be compared between commits.
+
+All seeded rows are tagged with ``BENCH_PREFIX`` and removed by
+``cleanup_campus``.
+"""
+
+import json
+import math
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .cards import sync_card_registry
+from .models import EntryLog
+from .rollup import rebuild_summaries
+from .visits import rebuild_visits
+from SmartAccess.localdates import campus_localdate
+from events.models import Event, EventCategory, EventRegistration
+from students.models import Student
+from teachers.models import Teacher
+from transportation.models import Bus, Route
+
+
+BENCH_PREFIX = 'BENCH'
+
+ENDPOINT_SCAN = 'nfc_scan_api'
+ENDPOINT_TRANSPORT = 'api_log_transport'
+ENDPOINT_EVENT = 'event_nfc_checkin_api'
+ENDPOINTS = [ENDPOINT_SCAN, ENDPOINT_TRANSPORT, ENDPOINT_EVENT]
+
+ENDPOINT_URL_NAMES = {
+    ENDPOINT_SCAN: 'nfc_scan_api',
+    ENDPOINT_TRANSPORT: 'transportation:api_log_transport',
+    ENDPOINT_EVENT: 'event_nfc_checkin_api',
+}
+
+OUTCOME_OK = 'ok'
+OUTCOME_DEBOUNCED = 'debounced'
+OUTCOME_UNKNOWN = 'unknown_card'
+OUTCOME_ERROR = 'error'
+
+
+def bench_card(index):
+    return f'{BENCH_PREFIX}{index:08X}'
+
+
+def seed_campus(students=1000, days=7, buses=10, batch_size=2000, rng=None):
+    """
+    Create the synthetic campus and its gate history; returns a dict with
+    the card ids, bus ids and event id the trace needs.
+    """
+    rng = rng or random.Random(0)
+
+    users = User.objects.bulk_create([
+        User(username=f'{BENCH_PREFIX.lower()}_{i}', first_name='Bench', last_name=str(i))
+        for i in range(students)
+    ], batch_size=batch_size)
+    if users[0].pk is None:
+        # Backends without RETURNING on bulk inserts
+        users = list(User.objects.filter(username__startswith=f'{BENCH_PREFIX.lower()}_').order_by('id'))
+
+    Student.objects.bulk_create([
+        Student(user=user, name=f'Bench Student {i}', roll_number=f'{BENCH_PREFIX}-{i:06d}', nfc_uid=bench_card(i))
+        for i, user in enumerate(users)
+    ], batch_size=batch_size)
+    sync_card_registry(batch_size)
+    student_ids = list(Student.objects.filter(roll_number__startswith=f'{BENCH_PREFIX}-')
+                       .order_by('id').values_list('id', flat=True))
+
+    route = Route.objects.create(
+        route_name=f'{BENCH_PREFIX} Route', start_location='City', end_location='Campus',
+        total_distance=12.5, estimated_time=timedelta(minutes=40),
+    )
+    Bus.objects.bulk_create([
+        Bus(bus_number=f'{BENCH_PREFIX}-{i}', driver_name='Bench Driver', driver_contact='0000',
+            capacity=60, route=route.route_name)
+        for i in range(buses)
+    ])
+    organizer_user = User.objects.create(username=f'{BENCH_PREFIX.lower()}_organizer')
+    organizer = Teacher.objects.create(user=organizer_user, name='Bench Organizer', department='Bench')
+    category, _ = EventCategory.objects.get_or_create(name=f'{BENCH_PREFIX} Category')
+    now = timezone.now()
+    event = Event.objects.create(
+        title=f'{BENCH_PREFIX} Event', description='Load test event', category=category,
+        organizer=organizer, start_datetime=now, end_datetime=now + timedelta(hours=3),
+        registration_deadline=now, venue='Main Hall', max_capacity=students,
+        registration_fee=Decimal('0'), status='ongoing',
+    )
+    EventRegistration.objects.bulk_create([
+        EventRegistration(event=event, student_id=student_id, status='confirmed') for student_id in student_ids
+    ], batch_size=batch_size)
+
+    # Gate history: one visit per student per weekday-ish day, 85% attendance
+    today = campus_localdate()
+    logs = []
+    for day_offset in range(days, 0, -1):
+        day_start = now - timedelta(days=day_offset)
+        for student_id in student_ids:
+            if rng.random() > 0.85:
+                continue
+            check_in = day_start - timedelta(hours=rng.uniform(0, 2))
+            logs.append(EntryLog(student_id=student_id, timestamp=check_in, action='in'))
+            logs.append(EntryLog(student_id=student_id, timestamp=check_in + timedelta(hours=rng.uniform(2, 8)),
+                                 action='out'))
+        if len(logs) >= batch_size:
+            EntryLog.objects.bulk_create(logs, batch_size=batch_size)
+            logs = []
+    EntryLog.objects.bulk_create(logs, batch_size=batch_size)
+
+    if days:
+        rebuild_summaries(today - timedelta(days=days + 1), today)
+        rebuild_visits(student_ids)
+
+    return load_campus()
+
+
+def load_campus():
+    """The card ids, bus ids, event and staff user of a seeded campus, or None."""
+    cards = list(Student.objects.filter(roll_number__startswith=f'{BENCH_PREFIX}-')
+                 .order_by('id').values_list('nfc_uid', flat=True))
+    event = Event.objects.filter(title=f'{BENCH_PREFIX} Event').first()
+    staff_user = User.objects.filter(username=f'{BENCH_PREFIX.lower()}_organizer').first()
+    if not cards or event is None or staff_user is None:
+        return None
+    return {
+        'cards': cards,
+        'bus_ids': list(Bus.objects.filter(bus_number__startswith=f'{BENCH_PREFIX}-').values_list('id', flat=True)),
+        'event_id': event.pk,
+        'staff_user': staff_user,
+    }
+
+
+def cleanup_campus():
+    """Delete everything ``seed_campus`` created; returns the number of rows removed."""
+    removed = 0
+    removed += Student.objects.filter(roll_number__startswith=f'{BENCH_PREFIX}-').delete()[0]
+    removed += Event.objects.filter(title=f'{BENCH_PREFIX} Event').delete()[0]
+    removed += EventCategory.objects.filter(name=f'{BENCH_PREFIX} Category').delete()[0]
+    removed += Bus.objects.filter(bus_number__startswith=f'{BENCH_PREFIX}-').delete()[0]
+    removed += Route.objects.filter(route_name=f'{BENCH_PREFIX} Route').delete()[0]
+    removed += User.objects.filter(username__startswith=f'{BENCH_PREFIX.lower()}_').delete()[0]
+    return removed
+
+
+def build_trace(campus, scans=None, duplicate_rate=0.05, unknown_rate=0.01,
+                transport_share=0.2, event_share=0.1, rng=None):
+    """
+    Build a morning-rush trace: each entry is ``(endpoint, payload)``.
+
+    Cards arrive in a random order, once each unless ``scans`` exceeds the
+    number of cards; a share of them also board a bus or check in to the
+    event, some taps are immediately repeated (which the gate should
+    debounce) and some come from unknown cards.
+    """
+    rng = rng or random.Random(1)
+    cards = list(campus['cards'])
+    rng.shuffle(cards)
+    trace = []
+
+    for i in range(scans or len(cards)):
+        card = cards[i % len(cards)]
+        if rng.random() < unknown_rate:
+            card = f'{BENCH_PREFIX}-UNKNOWN-{i}'
+        trace.append((ENDPOINT_SCAN, {'card_id': card, 'gate': f'gate-{i % 4 + 1}'}))
+        if rng.random() < duplicate_rate:
+            trace.append((ENDPOINT_SCAN, {'card_id': card, 'gate': f'gate-{i % 4 + 1}'}))
+        if rng.random() < transport_share:
+            trace.append((ENDPOINT_TRANSPORT, {
+                'nfc_uid': card, 'bus_id': rng.choice(campus['bus_ids']), 'action': 'board',
+            }))
+        if rng.random() < event_share:
+            trace.append((ENDPOINT_EVENT, {'card_id': card, 'event_id': campus['event_id']}))
+    return trace
+
+
+def classify(status_code, body):
+    """Map a response to OUTCOME_*."""
+    if status_code >= 500:
+        return OUTCOME_ERROR
+    try:
+        data = json.loads(body)
+    except (TypeError, ValueError):
+        return OUTCOME_ERROR
+    if data.get('success'):
+        return OUTCOME_OK
+
+    message = (data.get('error') or data.get('message') or '').lower()
+    if 'wait before scanning' in message or 'already on board' in message or 'already checked in' in message:
+        return OUTCOME_DEBOUNCED
+    if 'not recognized' in message or 'not found' in message:
+        return OUTCOME_UNKNOWN
+    return OUTCOME_ERROR
+
+
+class _Sender:
+    """Per-thread request sender: Django's test Client in-process, or HTTP against ``base_url``."""
+
+    def __init__(self, base_url=None, staff_user=None):
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.staff_user = staff_user
+        self._local = threading.local()
+        self.paths = {endpoint: reverse(ENDPOINT_URL_NAMES[endpoint]) for endpoint in ENDPOINTS}
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            if self.base_url:
+                import requests
+                client = requests.Session()
+            else:
+                client = Client()
+                if self.staff_user is not None:
+                    # api_log_transport requires a logged-in user
+                    client.force_login(self.staff_user)
+            self._local.client = client
+        return client
+
+    def send(self, endpoint, payload):
+        """Return ``(status_code, body, query_count)``; query_count is None over HTTP."""
+        client = self._client()
+        body = json.dumps(payload)
+        if self.base_url:
+            response = client.post(self.base_url + self.paths[endpoint], data=body,
+                                   headers={'Content-Type': 'application/json'}, timeout=30)
+            return response.status_code, response.content, None
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(self.paths[endpoint], body, content_type='application/json')
+        return response.status_code, response.content, len(queries)
+
+
+def replay(trace, workers=8, base_url=None, staff_user=None):
+    """
+    Send the trace with ``workers`` concurrent workers, in trace order.
+
+    Returns ``(samples, elapsed_seconds)``; each sample is a dict with the
+    endpoint, latency in ms, query count and outcome.
+    """
+    sender = _Sender(base_url, staff_user)
+    samples = [None] * len(trace)
+
+    def run(index):
+        endpoint, payload = trace[index]
+        started = time.perf_counter()
+        try:
+            status_code, body, queries = sender.send(endpoint, payload)
+            outcome = classify(status_code, body)
+        except Exception:
+            queries, outcome = None, OUTCOME_ERROR
+        samples[index] = {
+            'endpoint': endpoint,
+            'latency_ms': (time.perf_counter() - started) * 1000,
+            'queries': queries,
+            'outcome': outcome,
+        }
+        if not base_url:
+            close_old_connections()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run, range(len(trace))))
+    return samples, time.perf_counter() - started
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def _summarize_samples(samples, elapsed):
+    latencies = sorted(sample['latency_ms'] for sample in samples)
+    queries = [sample['queries'] for sample in samples if sample['queries'] is not None]
+    outcomes = {}
+    for sample in samples:
+        outcomes[sample['outcome']] = outcomes.get(sample['outcome'], 0) + 1
+    total = len(samples)
+
+    return {
+        'requests': total,
+        'throughput_rps': round(total / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(latencies[-1], 2),
+            'mean': round(statistics.fmean(latencies), 2),
+        },
+        'queries_per_request': {
+            'mean': round(statistics.fmean(queries), 2),
+            'max': max(queries),
+        } if queries else None,
+        'error_rate': round(outcomes.get(OUTCOME_ERROR, 0) / total, 4),
+        'debounce_rate': round(outcomes.get(OUTCOME_DEBOUNCED, 0) / total, 4),
+        'outcomes': outcomes,
+    }
+
+
+def summarize(samples, elapsed):
+    """Per-endpoint and overall report for a replay."""
+    by_endpoint = {}
+    for sample in samples:
+        by_endpoint.setdefault(sample['endpoint'], []).append(sample)
+
+    return {
+        'elapsed_seconds': round(elapsed, 3),
+        'overall': _summarize_samples(samples, elapsed),
+        'endpoints': {
+            endpoint: _summarize_samples(endpoint_samples, elapsed)
+            for endpoint, endpoint_samples in by_endpoint.items()
+        },
+    }
+
+
+def compare(current, previous):
+    """
+    Lines describing throughput and latency changes from ``previous`` to
+    ``current`` (both as written by the ``benchmark_scans`` command).
+    """
+    lines = []
+    for endpoint, now in current['results']['endpoints'].items():
+        before = previous.get('results', {}).get('endpoints', {}).get(endpoint)
+        if not before:
+            lines.append(f'{endpoint}: no previous result')
+            continue
+
+        def change(new, old):
+            if not old:
+                return 'n/a'
+            return f'{(new - old) / old * 100:+.1f}%'
+
+        lines.append(
+            f"{endpoint}: throughput {before['throughput_rps']} -> {now['throughput_rps']} rps "
+            f"({change(now['throughput_rps'], before['throughput_rps'])}), "
+            f"p95 {before['latency_ms']['p95']} -> {now['latency_ms']['p95']} ms "
+            f"({change(now['latency_ms']['p95'], before['latency_ms']['p95'])}), "
+            f"errors {before['error_rate']:.2%} -> {now['error_rate']:.2%}"
+        )
+    return lines
@@ -0,0 +1,229 @@
+"""
+Per-student, per-term attendance bitmaps.
+
+Each student has one AttendanceBitmap row per term holding two small binary
+fields, one bit per calendar day: ``present`` (checked in that day) and
+``late`` (the day's first check-in was late). A 20-week term is 18 bytes
+per field, so a 500-student class list is under 20 KB and days present,
+days late and attendance rates are popcounts with no EntryLog scan. The
+campus row (no student) marks every day anyone checked in, which gives the
+term's school days for attendance rates.
+
+The scan path sets the bits from ``fold_scan`` on a student's first
+check-in of a day only, so other scans cost nothing. ``rebuild_bitmaps``
+recomputes a term from EntryLog; run it after editing a term's dates. Late
+bits follow the punctuality policy: saving a policy rebuilds every term and
+saving a holiday rebuilds the terms around it (``rebuild_late_terms``, from
+signals), so the bitmaps keep agreeing with ``late_filter``.
+"""
+
+import base64
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AttendanceBitmap, EntryLog, Term
+from .punctuality import is_late
+from SmartAccess.localdates import campus_localdate
+
+
+TERMS_KEY = 'attendance:bitmaps:terms'
+CAMPUS_DAY_KEY_PREFIX = 'attendance:bitmaps:campus:'
+TERMS_TIMEOUT = 60 * 60 * 24
+CAMPUS_DAY_TIMEOUT = 60 * 60 * 48
+
+REBUILD_CHUNK_SIZE = 5000
+
+
+def terms():
+    """All terms as ``(id, start_date, end_date)``, cached until a term changes."""
+    cached = cache.get(TERMS_KEY)
+    if cached is None:
+        cached = list(Term.objects.values_list('id', 'start_date', 'end_date'))
+        cache.set(TERMS_KEY, cached, TERMS_TIMEOUT)
+    return cached
+
+
+def forget_terms():
+    cache.delete(TERMS_KEY)
+
+
+def term_for(day):
+    """``(id, start_date, end_date)`` of the term containing ``day``, or None."""
+    for term in terms():
+        if term[1] <= day <= term[2]:
+            return term
+    return None
+
+
+def current_term():
+    """The term containing today, else the most recent one that started."""
+    today = campus_localdate()
+    return Term.objects.filter(start_date__lte=today).order_by('-start_date').first()
+
+
+def set_bit(data, index):
+    data = bytearray(data)
+    if len(data) <= index // 8:
+        data.extend(bytes(index // 8 + 1 - len(data)))
+    data[index // 8] |= 1 << (index % 8)
+    return bytes(data)
+
+
+def has_bit(data, index):
+    return index // 8 < len(data) and bool(data[index // 8] & (1 << (index % 8)))
+
+
+def count_bits(data, days=None):
+    """Set bits in ``data``, or in its first ``days`` bits."""
+    value = int.from_bytes(data, 'little')
+    if days is not None:
+        value &= (1 << days) - 1
+    return value.bit_count()
+
+
+def bit_days(data, start_date):
+    """The dates whose bits are set."""
+    return [start_date + timedelta(days=index) for index in range(len(data) * 8) if has_bit(data, index)]
+
+
+def _set_day(student_id, term_id, index, late):
+    """Set the day's bits on one bitmap row, creating the row if needed."""
+    rows = AttendanceBitmap.objects.filter(term_id=term_id, student_id=student_id)
+    row = rows.values_list('present', 'late').first()
+    if row is None:
+        try:
+            with transaction.atomic():
+                AttendanceBitmap.objects.create(
+                    term_id=term_id, student_id=student_id,
+                    present=set_bit(b'', index), late=set_bit(b'', index) if late else b'',
+                )
+            return
+        except IntegrityError:
+            # Another scan created the row first
+            row = rows.values_list('present', 'late').first()
+
+    present, late_bits = bytes(row[0]), bytes(row[1])
+    if has_bit(present, index) and (not late or has_bit(late_bits, index)):
+        return
+    rows.update(
+        present=set_bit(present, index),
+        late=set_bit(late_bits, index) if late else late_bits,
+        updated_at=timezone.now(),
+    )
+
+
+def mark_present(student_id, timestamp):
+    """
+    Record a student's first check-in of a day. Called by ``fold_scan``
+    inside the scan transaction.
+    """
+    day = campus_localdate(timestamp)
+    term = term_for(day)
+    if term is None:
+        return
+    index = (day - term[1]).days
+
+    _set_day(student_id, term[0], index, is_late(timestamp))
+    # Once the campus row's bit is committed, later check-ins skip it. The
+    # key is only set after commit so a rolled-back scan cannot leave it
+    # behind without the bit; until then _set_day itself skips a set bit.
+    key = f'{CAMPUS_DAY_KEY_PREFIX}{term[0]}:{index}'
+    if cache.get(key) is None:
+        _set_day(None, term[0], index, False)
+        transaction.on_commit(lambda: cache.set(key, True, CAMPUS_DAY_TIMEOUT))
+
+
+def rebuild_bitmaps(term, chunk_size=REBUILD_CHUNK_SIZE):
+    """Recompute every bitmap of ``term`` from EntryLog; returns the student rows written."""
+    rows = EntryLog.objects.filter(action='in').between_dates(term.start_date, term.end_date)\
+        .order_by('student_id', 'timestamp').values_list('student_id', 'local_date', 'timestamp')\
+        .iterator(chunk_size=chunk_size)
+
+    campus = b''
+    pending = []
+    written = 0
+    current_student = None
+    present = late = b''
+
+    def flush_student():
+        nonlocal written
+        if current_student is not None:
+            pending.append(AttendanceBitmap(term=term, student_id=current_student, present=present, late=late))
+        if len(pending) >= chunk_size:
+            AttendanceBitmap.objects.bulk_create(pending)
+            written += len(pending)
+            pending.clear()
+
+    with transaction.atomic():
+        AttendanceBitmap.objects.filter(term=term).delete()
+
+        for student_id, day, timestamp in rows:
+            if student_id != current_student:
+                flush_student()
+                current_student = student_id
+                present = late = b''
+
+            index = (day - term.start_date).days
+            if has_bit(present, index):
+                continue
+            present = set_bit(present, index)
+            if is_late(timestamp):
+                late = set_bit(late, index)
+            if not has_bit(campus, index):
+                campus = set_bit(campus, index)
+
+        flush_student()
+        pending.append(AttendanceBitmap(term=term, student=None, present=campus))
+        AttendanceBitmap.objects.bulk_create(pending)
+        written += len(pending) - 1
+
+    return written
+
+
+def rebuild_late_terms(dates=None):
+    """Rebuild the terms containing any of ``dates`` (every term if None) after a policy change."""
+    affected = Term.objects.all()
+    if dates is not None:
+        dates = [day for day in dates if day is not None]
+        if not dates:
+            return 0
+        condition = Q()
+        for day in dates:
+            condition |= Q(start_date__lte=day, end_date__gte=day)
+        affected = affected.filter(condition)
+    return sum(rebuild_bitmaps(term) for term in affected)
+
+
+def encode(data):
+    return base64.b64encode(bytes(data)).decode('ascii')
+
+
+def term_bitmaps(term, student_ids):
+    """
+    ``(campus_present, {student_id: (present, late)})`` for many students in
+    one query; students without a row get empty bitmaps.
+    """
+    rows = {
+        student_id: (bytes(present), bytes(late))
+        for student_id, present, late in AttendanceBitmap.objects.filter(
+            Q(student_id__in=student_ids) | Q(student__isnull=True), term=term
+        ).values_list('student_id', 'present', 'late')
+    }
+    campus = rows.pop(None, (b'', b''))[0]
+    return campus, {student_id: rows.get(student_id, (b'', b'')) for student_id in student_ids}
+
+
+def bitmap_stats(present, late, campus, days=None):
+    """Days present, days late, school days and attendance rate from the bits alone."""
+    school_days = count_bits(campus, days)
+    days_present = count_bits(present, days)
+    return {
+        'days_present': days_present,
+        'days_late': count_bits(late, days),
+        'school_days': school_days,
+        'attendance_rate': round(days_present / school_days * 100, 1) if school_days else 0,
+    }
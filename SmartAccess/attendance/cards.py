@@ -0,0 +1,224 @@
+"""
+The card registry: which person an NFC UID belongs to, and whether the card
+is still valid.
+
+``resolve_card(uid)`` returns a small dict (``uid``, ``kind``, ``status``,
+``student_id``, ``user_id``, ``teacher_id``, ``name``, ``roll_number``) or
+None for an unknown card. Lookups go through two layers:
+
+* a process-local LRU whose entries live for a few seconds, so a burst of
+  taps at one reader costs no network round trip at all;
+* the shared cache, filled from one query on a miss and cleared by signals
+  whenever a Card (or a student's card) changes. Unknown UIDs are cached
+  too, so random cards do not reach the database either.
+
+Signals clear the local LRU of the process that made the change; other
+processes see it once their LRU entry expires (``CARD_LRU_TTL``).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Card
+from students.models import Student
+
+
+CARD_KEY_PREFIX = 'attendance:card:'
+CARD_TIMEOUT = getattr(settings, 'ATTENDANCE_CARD_TIMEOUT', 60 * 60 * 24)
+CARD_LRU_SIZE = getattr(settings, 'ATTENDANCE_CARD_LRU_SIZE', 10000)
+CARD_LRU_TTL = getattr(settings, 'ATTENDANCE_CARD_LRU_TTL', 5)
+
+# Cached in place of a card so unknown UIDs are not looked up again
+UNKNOWN_CARD = 'unknown'
+
+CARD_FIELDS = (
+    'uid', 'kind', 'status', 'student_id', 'user_id',
+    'student__name', 'student__roll_number',
+    'user__teacher_profile__id', 'user__teacher_profile__name',
+    'user__first_name', 'user__last_name', 'user__username',
+)
+
+
+class _LRU:
+    """A small thread-safe LRU whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_local = _LRU(CARD_LRU_SIZE, CARD_LRU_TTL)
+
+
+def card_key(uid):
+    return f'{CARD_KEY_PREFIX}{uid}'
+
+
+def _principal(row):
+    if row['kind'] == 'student':
+        name = row['student__name']
+    else:
+        full_name = f"{row['user__first_name'] or ''} {row['user__last_name'] or ''}".strip()
+        name = row['user__teacher_profile__name'] or full_name or row['user__username']
+    return {
+        'uid': row['uid'],
+        'kind': row['kind'],
+        'status': row['status'],
+        'student_id': row['student_id'],
+        'user_id': row['user_id'],
+        'teacher_id': row['user__teacher_profile__id'],
+        'name': name,
+        'roll_number': row['student__roll_number'],
+    }
+
+
+def load_cards(uids):
+    """Registry entries for ``uids`` from the database, in one query."""
+    return {row['uid']: _principal(row) for row in Card.objects.filter(uid__in=uids).values(*CARD_FIELDS)}
+
+
+def resolve_cards(uids):
+    """``{uid: entry}`` for the known cards among ``uids``; unknown UIDs are left out."""
+    uids = {uid for uid in uids if uid}
+    found = {}
+    for uid in uids:
+        entry = _local.get(uid)
+        if entry is not None:
+            found[uid] = entry
+
+    missing = uids - found.keys()
+    if missing:
+        cached = cache.get_many([card_key(uid) for uid in missing])
+        for uid in missing:
+            if card_key(uid) in cached:
+                found[uid] = cached[card_key(uid)]
+                _local.set(uid, found[uid])
+
+    missing -= found.keys()
+    if missing:
+        loaded = load_cards(missing)
+        entries = {uid: loaded.get(uid, UNKNOWN_CARD) for uid in missing}
+        cache.set_many({card_key(uid): entry for uid, entry in entries.items()}, CARD_TIMEOUT)
+        for uid, entry in entries.items():
+            _local.set(uid, entry)
+        found.update(entries)
+
+    return {uid: entry for uid, entry in found.items() if entry != UNKNOWN_CARD}
+
+
+def resolve_card(uid):
+    """The registry entry for a card UID, or None if the card is unknown."""
+    if not uid:
+        return None
+    entry = _local.get(uid)
+    if entry is None:
+        entry = cache.get(card_key(uid))
+        if entry is None:
+            entry = load_cards([uid]).get(uid, UNKNOWN_CARD)
+            cache.set(card_key(uid), entry, CARD_TIMEOUT)
+        _local.set(uid, entry)
+    return None if entry == UNKNOWN_CARD else entry
+
+
+async def aresolve_card(uid):
+    if not uid:
+        return None
+    entry = _local.get(uid)
+    if entry is None:
+        entry = await cache.aget(card_key(uid))
+        if entry is None:
+            return await sync_to_async(resolve_card)(uid)
+        _local.set(uid, entry)
+    return None if entry == UNKNOWN_CARD else entry
+
+
+def card_error(card, kind=None):
+    """
+    Why ``card`` cannot be used (for a ``kind`` of principal, if given), or
+    None if it can.
+    """
+    if card is None:
+        return 'Card not recognized'
+    if card['status'] != 'active':
+        return f"Card has been reported {card['status']}" if card['status'] == 'lost' else 'Card has been revoked'
+    if kind is not None and card['kind'] != kind:
+        return f'Card does not belong to a {kind}'
+    return None
+
+
+def forget_cards(*uids):
+    uids = [uid for uid in uids if uid]
+    if uids:
+        cache.delete_many([card_key(uid) for uid in uids])
+        _local.delete(*uids)
+
+
+def sync_student_card(student, previous_uid):
+    """
+    Mirror a change of ``student.nfc_uid`` into the registry: the new UID
+    becomes an active student card, the previous one is revoked.
+    """
+    if previous_uid and previous_uid != student.nfc_uid:
+        for card in Card.objects.filter(uid=previous_uid, student=student, status='active'):
+            card.status = 'revoked'
+            card.save(update_fields=['status', 'updated_at'])
+    if not student.nfc_uid:
+        return
+
+    card = Card.objects.filter(uid=student.nfc_uid).first()
+    if card is None:
+        Card.objects.create(uid=student.nfc_uid, kind='student', student=student, user_id=student.user_id)
+    elif (card.kind, card.student_id, card.user_id, card.status) != ('student', student.pk, student.user_id, 'active'):
+        card.kind, card.student, card.user_id, card.status = 'student', student, student.user_id, 'active'
+        card.save()
+
+
+def sync_card_registry(batch_size=1000):
+    """
+    Create missing student cards from Student.nfc_uid, e.g. after an
+    upgrade or a bulk import; returns the number created.
+    """
+    existing = set(Card.objects.values_list('uid', flat=True))
+    cards = [
+        Card(uid=uid, kind='student', student_id=student_id, user_id=user_id)
+        for student_id, uid, user_id in Student.objects.filter(nfc_uid__isnull=False).exclude(nfc_uid='')
+        .values_list('id', 'nfc_uid', 'user_id')
+        if uid not in existing
+    ]
+    Card.objects.bulk_create(cards, batch_size=batch_size)
+    forget_cards(*[card.uid for card in cards])
+    return len(cards)
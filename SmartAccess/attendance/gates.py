@@ -0,0 +1,160 @@
+"""
+Gate and reader registry for the scan endpoints.
+
+Readers send their API key in the ``X-Reader-Key`` header; the key is
+hashed and resolved to the reader's gate through a cache entry, so an
+authenticated scan costs one cache read. The registry of active gates
+(name to id) is cached as a single entry and used to stamp EntryLog rows
+with their gate. Signals drop both kinds of entries when gates or readers
+change.
+
+Requests without a key may still name a gate in the payload, unless
+``ATTENDANCE_REQUIRE_READER_KEY`` is set. Endpoints that hand out card
+data (the roster) always require a reader key or a teacher or admin login
+(``reader_or_staff_required``).
+"""
+
+import hashlib
+import secrets
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+from .models import Gate, Reader
+from authentication.decorators import is_teacher
+
+
+READER_KEY_HEADER = 'X-Reader-Key'
+
+REQUIRE_READER_KEY = getattr(settings, 'ATTENDANCE_REQUIRE_READER_KEY', False)
+
+REGISTRY_KEY = 'attendance:gates:registry'
+READER_KEY_PREFIX = 'attendance:gates:reader:'
+REGISTRY_TIMEOUT = 60 * 60 * 24
+
+# Cached in place of a reader for unknown keys, so bad keys do not hit the database
+UNKNOWN_READER = 'unknown'
+
+
+class ReaderAuthError(Exception):
+    """The request carried a missing, unknown or revoked reader key."""
+
+
+def hash_key(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def reader_key(key_hash):
+    return f'{READER_KEY_PREFIX}{key_hash}'
+
+
+def issue_reader_key(reader):
+    """Give ``reader`` a new API key and return it; only its hash is stored."""
+    key = secrets.token_urlsafe(32)
+    reader.key_hash = hash_key(key)
+    reader.key_prefix = key[:8]
+    reader.save()
+    return key
+
+
+def gate_registry():
+    """``{gate name: gate id}`` of active gates, loaded once per cache timeout."""
+    registry = cache.get(REGISTRY_KEY)
+    if registry is None:
+        registry = dict(Gate.objects.filter(is_active=True).values_list('name', 'id'))
+        cache.set(REGISTRY_KEY, registry, REGISTRY_TIMEOUT)
+    return registry
+
+
+def gate_id(name):
+    """Id of the active gate called ``name``, or None for unregistered gates."""
+    return gate_registry().get(name) if name else None
+
+
+async def agate_id(name):
+    if not name:
+        return None
+    registry = await cache.aget(REGISTRY_KEY)
+    if registry is None:
+        registry = await sync_to_async(gate_registry)()
+    return registry.get(name)
+
+
+def load_reader(key_hash):
+    reader = Reader.objects.filter(key_hash=key_hash, is_active=True, gate__is_active=True)\
+        .values('id', 'name', 'gate_id', 'gate__name').first()
+    if reader is None:
+        return None
+    return {
+        'reader_id': reader['id'],
+        'reader': reader['name'],
+        'gate_id': reader['gate_id'],
+        'gate': reader['gate__name'],
+    }
+
+
+def authenticate_reader(key):
+    """Return ``{'reader_id', 'reader', 'gate_id', 'gate'}`` for a key, or None."""
+    if not key:
+        return None
+    key_hash = hash_key(key)
+    reader = cache.get(reader_key(key_hash))
+    if reader is None:
+        reader = load_reader(key_hash) or UNKNOWN_READER
+        cache.set(reader_key(key_hash), reader, REGISTRY_TIMEOUT)
+    return None if reader == UNKNOWN_READER else reader
+
+
+async def aauthenticate_reader(key):
+    """Async ``authenticate_reader``; only a cache miss touches the database."""
+    if not key:
+        return None
+    reader = await cache.aget(reader_key(hash_key(key)))
+    if reader is None:
+        return await sync_to_async(authenticate_reader)(key)
+    return None if reader == UNKNOWN_READER else reader
+
+
+def _scan_gate(reader, key, payload_gate):
+    if reader is not None:
+        return reader['gate']
+    if key:
+        raise ReaderAuthError('Unknown or revoked reader key')
+    if REQUIRE_READER_KEY:
+        raise ReaderAuthError(f'{READER_KEY_HEADER} header required')
+    return payload_gate
+
+
+def scan_gate(request, payload_gate=None):
+    """
+    The gate a scan request came from: the authenticated reader's gate, or
+    the payload's gate name for keyless requests. Raises ReaderAuthError.
+    """
+    key = request.headers.get(READER_KEY_HEADER)
+    return _scan_gate(authenticate_reader(key), key, payload_gate)
+
+
+async def ascan_gate(request, payload_gate=None):
+    key = request.headers.get(READER_KEY_HEADER)
+    return _scan_gate(await aauthenticate_reader(key), key, payload_gate)
+
+
+def forget_gates(key_hashes=()):
+    """Drop the cached registry and the cached readers with the given key hashes."""
+    cache.delete_many([REGISTRY_KEY, *[reader_key(key_hash) for key_hash in key_hashes if key_hash]])
+
+
+def reader_or_staff_required(view):
+    """Allow requests carrying a valid reader key, or from a teacher or admin; 401 otherwise."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not is_teacher(request.user) and authenticate_reader(request.headers.get(READER_KEY_HEADER)) is None:
+            return JsonResponse({
+                'success': False,
+                'error': f'A valid {READER_KEY_HEADER} header or a teacher login is required',
+            }, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,139 @@
+"""
+Idempotency keys for the reader scan endpoints.
+
+A reader that retries a request (e.g. after a timeout) sends the same
+``Idempotency-Key`` header. The first request claims the key with an atomic
+``cache.add``; its response is stored under the key together with a hash of
+the request, and retries get that response back (marked
+``Idempotent-Replayed: true``) without running the view again. A retry that
+arrives while the first request is still running gets 409, and a request
+that reuses a key with a different method, path or body gets 422.
+
+Only the view's decision (accepted, debounced or rejected) is stored: an
+exception or a 5xx response, e.g. the database being locked, releases the
+key so that the retry runs the view again instead of replaying the failure.
+
+Keys are scoped per reader key, so readers cannot collide; requests without
+a reader key are scoped by client address and the payload's gate instead.
+"""
+
+import hashlib
+import json
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+from .gates import READER_KEY_HEADER, hash_key
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_PREFIX = 'attendance:idempotency:'
+IDEMPOTENCY_TIMEOUT = getattr(settings, 'ATTENDANCE_IDEMPOTENCY_TIMEOUT', 60 * 60 * 24)
+
+# Bounds how long a crashed request blocks its key
+IN_PROGRESS_TIMEOUT = 60
+
+MAX_KEY_LENGTH = 255
+
+
+def _anonymous_scope(request):
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+    gate = data.get('gate') if isinstance(data, dict) else None
+    client = f"{request.META.get('REMOTE_ADDR', '')}|{gate if isinstance(gate, str) else ''}"
+    return f'anonymous:{hash_key(client)[:16]}'
+
+
+def idempotency_key(request):
+    """Cache key for the request's Idempotency-Key header, or None without one."""
+    key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return None
+    reader = request.headers.get(READER_KEY_HEADER)
+    scope = hash_key(reader)[:16] if reader else _anonymous_scope(request)
+    return f'{IDEMPOTENCY_KEY_PREFIX}{scope}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def request_fingerprint(request):
+    """What a retry must repeat exactly to get the stored response."""
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _in_progress(fingerprint):
+    return {'in_progress': True, 'request': fingerprint}
+
+
+def _stored(response, fingerprint):
+    return {
+        'status': response.status_code,
+        'content': response.content,
+        'content_type': response.get('Content-Type'),
+        'request': fingerprint,
+    }
+
+
+def _replay(stored, fingerprint):
+    if stored is not None and stored.get('request') != fingerprint:
+        return JsonResponse({
+            'success': False,
+            'error': f'This {IDEMPOTENCY_HEADER} was already used for a different request',
+        }, status=422)
+    if stored is None or stored.get('in_progress'):
+        return JsonResponse({
+            'success': False,
+            'error': f'A request with this {IDEMPOTENCY_HEADER} is still being processed',
+        }, status=409)
+    response = HttpResponse(stored['content'], status=stored['status'], content_type=stored['content_type'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Replay stored responses for repeated Idempotency-Keys (sync or async views)."""
+    if iscoroutinefunction(view):
+        async def wrapper(request, *args, **kwargs):
+            key = idempotency_key(request)
+            if key is None:
+                return await view(request, *args, **kwargs)
+            fingerprint = request_fingerprint(request)
+            if not await cache.aadd(key, _in_progress(fingerprint), IN_PROGRESS_TIMEOUT):
+                return _replay(await cache.aget(key), fingerprint)
+            try:
+                response = await view(request, *args, **kwargs)
+            except Exception:
+                await cache.adelete(key)
+                raise
+            if response.status_code < 500:
+                await cache.aset(key, _stored(response, fingerprint), IDEMPOTENCY_TIMEOUT)
+            else:
+                await cache.adelete(key)
+            return response
+
+        markcoroutinefunction(wrapper)
+    else:
+        def wrapper(request, *args, **kwargs):
+            key = idempotency_key(request)
+            if key is None:
+                return view(request, *args, **kwargs)
+            fingerprint = request_fingerprint(request)
+            if not cache.add(key, _in_progress(fingerprint), IN_PROGRESS_TIMEOUT):
+                return _replay(cache.get(key), fingerprint)
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                cache.delete(key)
+                raise
+            if response.status_code < 500:
+                cache.set(key, _stored(response, fingerprint), IDEMPOTENCY_TIMEOUT)
+            else:
+                cache.delete(key)
+            return response
+
+    return wraps(view)(wrapper)
@@ -0,0 +1,283 @@
+"""
+Bulk import of gate reader log files recovered after an outage.
+
+``read_scan_file`` streams CSV or JSONL (optionally gzipped) rows of card
+UID and timestamp; rows with a missing UID or an unparseable timestamp are
+counted as invalid. ``import_scan_files`` works through the files in chunks
+of ``IMPORT_CHUNK_ROWS`` rows, so memory stays flat however large the logs
+are. Each chunk's UIDs are resolved through the card registry (only active
+student cards count, as at the gate), its taps are grouped per student and
+``import_scans`` merges them into the student's existing EntryLog
+timeline: taps within ``SCAN_DEBOUNCE`` of an existing row or of another
+imported tap are dropped, and in/out actions are recomputed from the last
+row before the import onward, flipping existing rows where the new taps
+change the sequence. Later chunks merge against the rows earlier chunks
+inserted. New rows go in with large ``bulk_create`` batches, one
+transaction per chunk of students.
+"""
+
+import csv
+import gzip
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from .cards import card_error, load_cards
+from .models import EntryLog
+from .services import SCAN_DEBOUNCE, parse_scanned_at
+from students.models import Student
+
+
+CARD_FIELDS = ('card_id', 'nfc_uid', 'uid', 'card')
+TIME_FIELDS = ('scanned_at', 'timestamp', 'time')
+
+IMPORT_CHUNK_ROWS = 50000
+IMPORT_CHUNK_STUDENTS = 500
+IMPORT_BATCH_SIZE = 5000
+CARD_LOOKUP_BATCH = 5000
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def _file_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'jsonl' if name.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def _pick(row, fields):
+    for field in fields:
+        value = row.get(field)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def parse_timestamp(value):
+    """
+    ISO 8601 strings (naive ones in the current timezone) or Unix epoch
+    seconds; None for anything else, including out-of-range values.
+    """
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        if isinstance(value, str) and value.replace('.', '', 1).isdigit():
+            return datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+        return parse_scanned_at(value)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def read_scan_file(path, file_format=None):
+    """Yield ``(card_id, scanned_at)`` per row; either is None for an unusable row."""
+    file_format = file_format or _file_format(path)
+    with _open(path) as handle:
+        if file_format == 'jsonl':
+            rows = (_json_row(line) for line in handle if line.strip())
+        else:
+            rows = csv.DictReader(handle)
+        for row in rows:
+            if not isinstance(row, dict):
+                yield None, None
+                continue
+            card_id = _pick(row, CARD_FIELDS)
+            yield (str(card_id).strip() if card_id is not None else None,
+                   parse_timestamp(_pick(row, TIME_FIELDS)))
+
+
+def _json_row(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.invalid = 0
+        self.unknown_cards = 0
+        self.duplicates = 0  # Within the debounce window of an existing row
+        self.debounced = 0   # Within the debounce window of another imported tap
+        self.inserted = 0
+        self.flipped = 0     # Existing rows whose action changed
+        self.students = set()
+        self.first_timestamp = None
+        self.last_timestamp = None
+
+
+def iter_scan_chunks(paths, file_format=None, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Yield the rows of every file as lists of at most ``chunk_rows`` ``(card_id, scanned_at)`` pairs."""
+    chunk = []
+    for path in paths:
+        for row in read_scan_file(path, file_format):
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def collect_scans(rows, stats):
+    """
+    Group ``(card_id, scanned_at)`` rows into ``{student_id: [timestamp, ...]}``,
+    resolving their UIDs through the card registry.
+    """
+    rows = list(rows)
+    uids = sorted({card_id for card_id, _ in rows if card_id})
+    cards = {}
+    # Keep each IN list under the database's parameter limit
+    for start in range(0, len(uids), CARD_LOOKUP_BATCH):
+        cards.update(load_cards(uids[start:start + CARD_LOOKUP_BATCH]))
+    taps = {}
+    for card_id, scanned_at in rows:
+        stats.read += 1
+        if not card_id or scanned_at is None:
+            stats.invalid += 1
+            continue
+        card = cards.get(card_id)
+        if card_error(card, 'student'):
+            stats.unknown_cards += 1
+            continue
+        taps.setdefault(card['student_id'], []).append(scanned_at)
+        if stats.first_timestamp is None or scanned_at < stats.first_timestamp:
+            stats.first_timestamp = scanned_at
+        if stats.last_timestamp is None or scanned_at > stats.last_timestamp:
+            stats.last_timestamp = scanned_at
+    return taps
+
+
+def merge_timeline(student_id, existing, imported, anchor_action, stats):
+    """
+    Merge one student's imported taps into their existing rows.
+
+    ``existing`` is a timestamp-ordered list of EntryLog rows from the
+    import window onward, ``imported`` a list of timestamps and
+    ``anchor_action`` the action of the last row before the window. Returns
+    ``(new_logs, flipped_logs)``.
+    """
+    events = [(log.timestamp, 0, log) for log in existing]
+    events.extend((timestamp, 1, None) for timestamp in sorted(set(imported)))
+    stats.debounced += len(imported) - len(set(imported))
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    # Timestamp of the next existing row after each position, for look-ahead
+    next_existing = [None] * len(events)
+    upcoming = None
+    for index in range(len(events) - 1, -1, -1):
+        next_existing[index] = upcoming
+        if events[index][2] is not None:
+            upcoming = events[index][0]
+
+    new_logs = []
+    flipped = []
+    action = anchor_action
+    previous = None  # (timestamp, is_existing) of the last kept row
+
+    for index, (timestamp, _, log) in enumerate(events):
+        if log is None:
+            if previous and timestamp - previous[0] < SCAN_DEBOUNCE:
+                if previous[1]:
+                    stats.duplicates += 1
+                else:
+                    stats.debounced += 1
+                continue
+            if next_existing[index] and next_existing[index] - timestamp < SCAN_DEBOUNCE:
+                stats.duplicates += 1
+                continue
+
+        if log is not None and log.auto_generated:
+            # Automatic checkouts stay checkouts
+            new_action = 'out'
+        else:
+            new_action = 'out' if action == 'in' else 'in'
+
+        if log is None:
+            new_logs.append(EntryLog(student_id=student_id, timestamp=timestamp, action=new_action))
+        elif log.action != new_action:
+            log.action = new_action
+            flipped.append(log)
+
+        action = new_action
+        previous = (timestamp, log is not None)
+
+    return new_logs, flipped
+
+
+def import_scans(taps, stats, dry_run=False, chunk_students=IMPORT_CHUNK_STUDENTS, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Merge ``taps`` from ``collect_scans`` into EntryLog.
+
+    Returns the ids of students whose timeline changed.
+    """
+    changed = []
+    student_ids = sorted(taps)
+    stats.students.update(student_ids)
+
+    for start in range(0, len(student_ids), chunk_students):
+        chunk = student_ids[start:start + chunk_students]
+        # Reach back one debounce window so a tap next to an existing row is caught
+        window_start = min(min(taps[student_id]) for student_id in chunk) - SCAN_DEBOUNCE
+
+        before = EntryLog.objects.filter(student=OuterRef('pk'), timestamp__lt=window_start)\
+            .order_by('-timestamp', '-id')
+        anchors = dict(Student.objects.filter(id__in=chunk).annotate(
+            last_action=Subquery(before.values('action')[:1])
+        ).values_list('id', 'last_action'))
+
+        existing = {}
+        for log in EntryLog.objects.filter(student_id__in=chunk, timestamp__gte=window_start)\
+                .order_by('student_id', 'timestamp', 'id').only('id', 'student_id', 'timestamp', 'action', 'auto_generated'):
+            existing.setdefault(log.student_id, []).append(log)
+
+        new_logs = []
+        flipped = []
+        for student_id in chunk:
+            student_new, student_flipped = merge_timeline(
+                student_id, existing.get(student_id, []), taps[student_id], anchors.get(student_id), stats
+            )
+            new_logs.extend(student_new)
+            flipped.extend(student_flipped)
+            if student_new or student_flipped:
+                changed.append(student_id)
+
+        stats.inserted += len(new_logs)
+        stats.flipped += len(flipped)
+        if dry_run:
+            continue
+
+        with transaction.atomic():
+            EntryLog.objects.bulk_create(new_logs, batch_size=batch_size)
+            EntryLog.objects.bulk_update(flipped, ['action'], batch_size=batch_size)
+
+    return changed
+
+
+def import_scan_files(paths, stats, file_format=None, dry_run=False, chunk_rows=IMPORT_CHUNK_ROWS,
+                      chunk_students=IMPORT_CHUNK_STUDENTS, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Read and merge the log files chunk by chunk; returns the sorted ids of
+    students whose timeline changed.
+    """
+    changed = set()
+    for rows in iter_scan_chunks(paths, file_format, chunk_rows):
+        taps = collect_scans(rows, stats)
+        changed.update(import_scans(taps, stats, dry_run=dry_run, chunk_students=chunk_students, batch_size=batch_size))
+    return sorted(changed)
+
+
+def latest_actions(student_ids, chunk_size=IMPORT_CHUNK_STUDENTS):
+    """``{student_id: action}`` of each student's latest EntryLog."""
+    actions = {}
+    latest = EntryLog.objects.filter(student=OuterRef('pk')).order_by('-timestamp', '-id')
+    for start in range(0, len(student_ids), chunk_size):
+        actions.update(Student.objects.filter(id__in=student_ids[start:start + chunk_size]).annotate(
+            last_action=Subquery(latest.values('action')[:1])
+        ).values_list('id', 'last_action'))
+    return actions
@@ -0,0 +1,312 @@
+"""
+Cache-backed fan-out of accepted gate scans for live dashboards.
+
+Publishing a scan costs one ``incr`` of a sequence counter and one ``set`` of
+the event under its sequence number. Subscribers (the SSE and long-poll
+views) remember the last id they delivered and read newer events by id, so
+any number of open dashboards across all worker processes share the single
+publish instead of re-querying EntryLog. Events expire after
+``FEED_EVENT_TIMEOUT`` seconds; the newest ``FEED_BACKLOG`` double as the
+dashboards' "recent activity" list.
+
+Within a process one ``FeedWatcher`` per event loop polls the sequence
+counter for all open streams and wakes them when it moves. Publishes from
+the same process wake it at once; otherwise it polls every
+``FEED_POLL_INTERVAL`` seconds while events arrive and backs off to
+``FEED_IDLE_POLL_INTERVAL`` when the feed is quiet.
+
+The streams are async and must be served by an ASGI server (``asgi.py``,
+e.g. ``uvicorn SmartAccess.asgi:application``). Under WSGI, Django would
+consume the whole stream before sending it, holding a worker for
+``FEED_STREAM_SECONDS``; the SSE view detects this and answers with the
+pending events only, so browsers fall back to reconnecting every
+``FEED_WSGI_RETRY_SECONDS``.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import EntryLog
+from SmartAccess.localdates import campus_localtime
+
+
+FEED_SEQUENCE_KEY = 'attendance:feed:seq'
+FEED_EVENT_KEY_PREFIX = 'attendance:feed:event:'
+
+FEED_EVENT_TIMEOUT = getattr(settings, 'ATTENDANCE_FEED_EVENT_TIMEOUT', 60 * 10)
+FEED_BACKLOG = getattr(settings, 'ATTENDANCE_FEED_BACKLOG', 50)
+
+# How often the watcher looks for new events (backing off to the idle
+# interval while none arrive), and how long one SSE response stays open
+# before the browser reconnects with Last-Event-ID
+FEED_POLL_INTERVAL = getattr(settings, 'ATTENDANCE_FEED_POLL_INTERVAL', 1.0)
+FEED_IDLE_POLL_INTERVAL = getattr(settings, 'ATTENDANCE_FEED_IDLE_POLL_INTERVAL', 5.0)
+FEED_STREAM_SECONDS = getattr(settings, 'ATTENDANCE_FEED_STREAM_SECONDS', 300)
+FEED_HEARTBEAT_SECONDS = 15
+# Reconnect delay for browsers served by a WSGI worker
+FEED_WSGI_RETRY_SECONDS = getattr(settings, 'ATTENDANCE_FEED_WSGI_RETRY_SECONDS', 5)
+
+
+def event_key(event_id):
+    return f'{FEED_EVENT_KEY_PREFIX}{event_id}'
+
+
+def scan_event(state, action, timestamp, gate=None):
+    """Build a feed event from a presence entry and an accepted scan."""
+    return {
+        'student_id': state['student_id'],
+        'name': state['name'],
+        'roll_number': state.get('roll_number'),
+        'action': action,
+        'gate': gate,
+        'timestamp': timestamp,
+    }
+
+
+def publish(events):
+    """Append events to the feed; returns the id of the last one."""
+    events = list(events)
+    if not events:
+        return None
+    try:
+        last_id = cache.incr(FEED_SEQUENCE_KEY, len(events))
+    except ValueError:
+        cache.add(FEED_SEQUENCE_KEY, 0, None)
+        last_id = cache.incr(FEED_SEQUENCE_KEY, len(events))
+
+    first_id = last_id - len(events) + 1
+    cache.set_many({
+        event_key(event_id): dict(event, id=event_id)
+        for event_id, event in enumerate(events, start=first_id)
+    }, FEED_EVENT_TIMEOUT)
+    notify_watchers()
+    return last_id
+
+
+def latest_id():
+    return cache.get(FEED_SEQUENCE_KEY) or 0
+
+
+def read_events(after, limit=FEED_BACKLOG, skip_gaps=False):
+    """
+    Return ``(events, cursor)`` for events newer than id ``after``.
+
+    Publishers bump the sequence before storing the event, so a missing id
+    may still be in flight; reading stops there and the caller retries from
+    ``cursor``. A caller that finds the same gap again passes ``skip_gaps``
+    to step over events that expired or were never stored.
+    """
+    head = latest_id()
+    after = max(after, head - limit)
+    if head <= after:
+        return [], head
+
+    ids = range(after + 1, head + 1)
+    found = cache.get_many([event_key(event_id) for event_id in ids])
+
+    events = []
+    cursor = after
+    for event_id in ids:
+        event = found.get(event_key(event_id))
+        if event is None:
+            if not skip_gaps:
+                break
+            cursor = event_id
+            continue
+        events.append(event)
+        cursor = event_id
+    return events, cursor
+
+
+def recent_events(limit=15):
+    """
+    The newest ``limit`` scans, newest first, for the dashboards' activity
+    lists. Falls back to EntryLog while the feed is empty (e.g. after a
+    cache flush).
+    """
+    head = latest_id()
+    if head:
+        found = cache.get_many([event_key(event_id) for event_id in range(head, max(0, head - limit), -1)])
+        events = [found[event_key(event_id)] for event_id in range(head, max(0, head - limit), -1)
+                  if event_key(event_id) in found]
+        if events:
+            return events
+
+    return [
+        {
+            'id': None,
+            'student_id': log['student_id'],
+            'name': log['student__name'],
+            'roll_number': log['student__roll_number'],
+            'action': log['action'],
+            'gate': log['gate__name'],
+            'timestamp': log['timestamp'],
+        }
+        for log in EntryLog.objects.order_by('-timestamp').values(
+            'student_id', 'student__name', 'student__roll_number', 'action', 'gate__name', 'timestamp'
+        )[:limit]
+    ]
+
+
+class FeedWatcher:
+    """Polls the feed's sequence counter once for every stream on one event loop."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.head = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self._poke = asyncio.Event()
+        self._task = None
+
+    async def wait(self, after, timeout):
+        """Wait up to ``timeout`` seconds for the head to pass ``after``; returns the head."""
+        self.subscribers += 1
+        if self._task is None or self._task.done():
+            self._task = self.loop.create_task(self._run())
+        try:
+            deadline = time.monotonic() + timeout
+            while self.head is None or self.head <= after:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                changed = self._changed
+                try:
+                    await asyncio.wait_for(changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            return self.head or 0
+        finally:
+            self.subscribers -= 1
+
+    def poke(self):
+        self._poke.set()
+
+    async def _run(self):
+        interval = FEED_POLL_INTERVAL
+        while self.subscribers:
+            head = await cache.aget(FEED_SEQUENCE_KEY) or 0
+            if head != self.head:
+                self.head = head
+                interval = FEED_POLL_INTERVAL
+                # Wake everyone waiting on the old event; later waiters get a fresh one
+                self._changed.set()
+                self._changed = asyncio.Event()
+            else:
+                interval = min(interval * 2, FEED_IDLE_POLL_INTERVAL)
+            self._poke.clear()
+            try:
+                await asyncio.wait_for(self._poke.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+_watchers = weakref.WeakKeyDictionary()
+_watchers_lock = threading.Lock()
+
+
+def feed_watcher():
+    """The watcher for the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _watchers_lock:
+        watcher = _watchers.get(loop)
+        if watcher is None:
+            watcher = _watchers[loop] = FeedWatcher(loop)
+        return watcher
+
+
+def notify_watchers():
+    """Wake this process's watchers after a publish instead of waiting for their next poll."""
+    with _watchers_lock:
+        watchers = list(_watchers.values())
+    for watcher in watchers:
+        if watcher.subscribers and not watcher.loop.is_closed():
+            watcher.loop.call_soon_threadsafe(watcher.poke)
+
+
+def serialize_event(event):
+    local = campus_localtime(event['timestamp'])
+    return dict(event, timestamp=event['timestamp'].isoformat(), time=local.strftime('%H:%M:%S'))
+
+
+def _sse(event):
+    return f"id: {event['id']}\nevent: scan\ndata: {json.dumps(serialize_event(event))}\n\n"
+
+
+def sse_events(events):
+    return ''.join(_sse(event) for event in events)
+
+
+def sse_retry(seconds):
+    return f'retry: {int(seconds * 1000)}\n\n'
+
+
+def pending_stream(after=None):
+    """
+    The whole SSE body for a server that cannot stream: events newer than
+    ``after`` and the cursor to resume from, with a longer reconnect delay.
+    """
+    events, cursor = read_events(after if after is not None else latest_id())
+    # An id-only block moves the browser's Last-Event-ID without an event
+    return f'{sse_retry(FEED_WSGI_RETRY_SECONDS)}{sse_events(events)}id: {cursor}\n\n'
+
+
+async def event_stream(after=None, duration=FEED_STREAM_SECONDS):
+    """
+    Async generator of Server-Sent Events for scans newer than ``after``
+    (only new scans when None). Ends after ``duration`` seconds; browsers
+    reconnect automatically and resume from the Last-Event-ID they saw.
+    """
+    aread_events = sync_to_async(read_events, thread_sensitive=False)
+    watcher = feed_watcher()
+
+    if after is None:
+        after = await cache.aget(FEED_SEQUENCE_KEY) or 0
+    yield sse_retry(FEED_POLL_INTERVAL)
+
+    deadline = time.monotonic() + duration
+    last_sent = time.monotonic()
+    stalled_at = None
+    while time.monotonic() < deadline:
+        wait = min(deadline, last_sent + FEED_HEARTBEAT_SECONDS) - time.monotonic()
+        head = await watcher.wait(after, max(wait, 0))
+        if head > after:
+            events, cursor = await aread_events(after, skip_gaps=stalled_at == after)
+            stalled_at = after if cursor == after else None
+            after = cursor
+            if events:
+                yield sse_events(events)
+                last_sent = time.monotonic()
+            elif stalled_at is not None:
+                # The next event is still being stored
+                await asyncio.sleep(FEED_POLL_INTERVAL)
+        if time.monotonic() - last_sent >= FEED_HEARTBEAT_SECONDS:
+            # Comment line keeps proxies from closing an idle stream
+            yield ': keep-alive\n\n'
+            last_sent = time.monotonic()
+
+
+async def wait_for_events(after, timeout=25):
+    """Long-poll: wait up to ``timeout`` seconds for events newer than ``after``."""
+    watcher = feed_watcher()
+    deadline = time.monotonic() + timeout
+    stalled = False
+    while True:
+        head = await watcher.wait(after, max(deadline - time.monotonic(), 0))
+        if head > after:
+            events, cursor = await sync_to_async(read_events, thread_sensitive=False)(
+                after, skip_gaps=stalled
+            )
+            if events or time.monotonic() >= deadline:
+                return events, cursor
+            stalled = True
+            await asyncio.sleep(FEED_POLL_INTERVAL)
+        elif time.monotonic() >= deadline:
+            return [], after
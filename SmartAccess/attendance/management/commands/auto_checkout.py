@@ -1,41 +1,100 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
 from django.utils import timezone
 from attendance.models import EntryLog
+from attendance import livefeed, occupancy
+from attendance.presence import forget_presence, get_presences
+from attendance.services import fold_checkouts
+from SmartAccess.localdates import CAMPUS_TIME_ZONE, campus_localdate, campus_localtime
+from students.models import Student
 from datetime import time
-from django.core.mail import send_mail
+from django.core.mail import send_mass_mail
+import time as clock
 
 class Command(BaseCommand):
     help = 'Auto checkout students who forgot to scan out'
 
-    def handle(self, *args, **kwargs):
-        today = timezone.now().date()
-        evening_cutoff = timezone.make_aware(timezone.datetime.combine(today, time(18, 0)))  # 6:00 PM
-
-        # Get all latest logs for each student
-        latest_logs = {}
-        for log in EntryLog.objects.filter(timestamp__date=today).order_by('student', '-timestamp'):
-            if log.student_id not in latest_logs:
-                latest_logs[log.student_id] = log
-
-        count = 0
-        for student_id, log in latest_logs.items():
-            if log.action == 'in':
-                # Create checkout log
-                EntryLog.objects.create(
-                    student=log.student,
-                    timestamp=evening_cutoff,
-                    action='out',
-                    auto_generated=True  # Add this field to EntryLog model
-                )
-                
-                # Send notification
-                send_mail(
-                    'Automatic Checkout Notification',
-                    'You were automatically checked out at 6:00 PM',
-                    'noreply@smartaccess.com',
-                    [log.student.user.email],
-                    fail_silently=True,
-                )
-                count += 1
-
-        self.stdout.write(self.style.SUCCESS(f'Auto-checked out {count} students at 6:00 PM.'))
\ No newline at end of file
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report which students would be checked out',
+        )
+
+    def handle(self, *args, **options):
+        started = clock.monotonic()
+        today = campus_localdate()
+        evening_cutoff = timezone.make_aware(
+            timezone.datetime.combine(today, time(18, 0)), CAMPUS_TIME_ZONE
+        )  # 6:00 PM
+
+        # One query: today's logs that are their student's latest and are check-ins
+        todays_logs = EntryLog.objects.on_date(today)
+        latest_today = todays_logs.filter(student=OuterRef('student')).order_by('-timestamp', '-id')
+        still_inside = list(
+            todays_logs.filter(
+                id=Subquery(latest_today.values('id')[:1]),
+                action='in',
+                timestamp__lt=evening_cutoff,
+            ).values_list('student_id', 'timestamp', 'student__nfc_uid', 'student__user__email',
+                          'student__name', 'student__roll_number')
+        )
+        found = clock.monotonic()
+
+        self.stdout.write(f'Found {len(still_inside)} students still checked in ({found - started:.2f}s).')
+
+        if options['dry_run']:
+            for student_id, timestamp, *_ in still_inside:
+                self.stdout.write(f'- student {student_id}: checked in at {campus_localtime(timestamp):%H:%M}')
+            self.stdout.write(self.style.WARNING('Dry run: no changes made.'))
+            return
+
+        if not still_inside:
+            self.stdout.write(self.style.SUCCESS('Auto-checked out 0 students at 6:00 PM.'))
+            return
+
+        student_ids = [row[0] for row in still_inside]
+        # Entry gates live in the presence entries, so read them before dropping those
+        card_ids = [row[2] for row in still_inside]
+        states = get_presences(nfc_uid for nfc_uid in card_ids if nfc_uid)
+        with transaction.atomic():
+            # Create checkout logs
+            EntryLog.objects.bulk_create([
+                EntryLog(student_id=student_id, timestamp=evening_cutoff, action='out', auto_generated=True)
+                for student_id in student_ids
+            ], batch_size=1000)
+            Student.objects.filter(id__in=student_ids).update(is_in_university=False)
+            fold_checkouts([(row[0], row[1]) for row in still_inside], evening_cutoff)
+        forget_presence(*card_ids)
+        occupancy.apply_changes(
+            ('out', states.get(nfc_uid, {}).get('gate')) for nfc_uid in card_ids
+        )
+        livefeed.publish(
+            livefeed.scan_event(
+                {'student_id': student_id, 'name': name, 'roll_number': roll_number},
+                'out', evening_cutoff,
+            )
+            for student_id, _, _, _, name, roll_number in still_inside
+        )
+        written = clock.monotonic()
+
+        # Send notifications over a single connection
+        notifications = [
+            (
+                'Automatic Checkout Notification',
+                'You were automatically checked out at 6:00 PM',
+                'noreply@smartaccess.com',
+                [email],
+            )
+            for _, _, _, email, _, _ in still_inside if email
+        ]
+        sent = send_mass_mail(notifications, fail_silently=True) if notifications else 0
+        mailed = clock.monotonic()
+
+        self.stdout.write(
+            f'Wrote checkouts in {written - found:.2f}s, sent {sent} notifications in {mailed - written:.2f}s.'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Auto-checked out {len(student_ids)} students at 6:00 PM in {mailed - started:.2f}s.'
+        ))
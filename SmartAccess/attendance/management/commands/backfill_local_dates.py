@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from attendance.models import EntryLog
+from events.models import EventAttendance
+from transportation.models import TransportLog
+from SmartAccess.localdates import campus_localtime
+import time
+
+
+class Command(BaseCommand):
+    help = 'Fill the stored local date/hour columns of scan and log tables in chunks'
+
+    models = [EntryLog, TransportLog, EventAttendance]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute every row, e.g. after changing CAMPUS_TIME_ZONE',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        for model in self.models:
+            started = time.monotonic()
+            field = model.LOCAL_DATE_FIELD
+            rows = model.objects.all() if options['all'] else model.objects.filter(local_date__isnull=True)
+
+            updated = 0
+            last_id = 0
+            while True:
+                # Walk the primary key so every chunk is an index range scan
+                chunk = list(
+                    rows.filter(id__gt=last_id).order_by('id').values_list('id', field)[:chunk_size]
+                )
+                if not chunk:
+                    break
+
+                objs = []
+                for pk, value in chunk:
+                    local = campus_localtime(value)
+                    objs.append(model(id=pk, local_date=local.date(), local_hour=local.hour))
+                model.objects.bulk_update(objs, ['local_date', 'local_hour'])
+
+                updated += len(objs)
+                last_id = chunk[-1][0]
+
+            self.stdout.write(
+                f'{model.__name__}: filled {updated} rows in {time.monotonic() - started:.1f}s'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Local date backfill complete.'))
@@ -0,0 +1,128 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from attendance.benchmark import (
+    ENDPOINTS, build_trace, cleanup_campus, compare, load_campus, replay, seed_campus, summarize,
+)
+from pathlib import Path
+import json
+import random
+import subprocess
+import time
+
+
+class Command(BaseCommand):
+    help = 'Seed a synthetic campus and replay a morning-rush scan trace against the scan endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000, help='Students (with cards) to seed')
+        parser.add_argument('--days', type=int, default=7, help='Days of gate history to seed')
+        parser.add_argument('--buses', type=int, default=10)
+        parser.add_argument(
+            '--scans', type=int,
+            help='Gate taps in the replayed trace (default: one per student; a card tapped again '
+                 'within 30 seconds, including by a previous run, is debounced)',
+        )
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent workers')
+        parser.add_argument('--duplicate-rate', type=float, default=0.05)
+        parser.add_argument('--unknown-rate', type=float, default=0.01)
+        parser.add_argument('--transport-share', type=float, default=0.2)
+        parser.add_argument('--event-share', type=float, default=0.1)
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for data and trace')
+        parser.add_argument('--base-url', help='Replay over HTTP against a running server instead of in-process')
+        parser.add_argument('--reseed', action='store_true', help='Drop and recreate the synthetic campus')
+        parser.add_argument('--cleanup', action='store_true', help='Only delete the synthetic campus')
+        parser.add_argument('--output', help='Results file (default: benchmark_results/<time>-<commit>.json)')
+        parser.add_argument('--compare', help='Previous results file to compare against')
+        parser.add_argument('--force', action='store_true', help='Allow running with DEBUG off')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('This writes synthetic data to the database; use --force outside DEBUG.')
+
+        if options['cleanup'] or options['reseed']:
+            removed = cleanup_campus()
+            call_command('reconcile_occupancy', stdout=self.stdout)
+            self.stdout.write(f'Removed {removed} synthetic rows.')
+            if options['cleanup']:
+                return
+
+        rng = random.Random(options['seed'])
+
+        campus = load_campus()
+        if campus is None:
+            started = time.monotonic()
+            campus = seed_campus(options['students'], options['days'], options['buses'], rng=rng)
+            self.stdout.write(
+                f"Seeded {len(campus['cards'])} students and {options['days']} days of history "
+                f"in {time.monotonic() - started:.1f}s."
+            )
+        else:
+            self.stdout.write(f"Reusing synthetic campus of {len(campus['cards'])} students (--reseed to rebuild).")
+
+        trace = [
+            item for item in build_trace(
+                campus,
+                scans=options['scans'],
+                duplicate_rate=options['duplicate_rate'],
+                unknown_rate=options['unknown_rate'],
+                transport_share=options['transport_share'],
+                event_share=options['event_share'],
+                rng=rng,
+            )
+            if item[0] in options['endpoints']
+        ]
+        self.stdout.write(f"Replaying {len(trace)} requests with {options['workers']} workers...")
+
+        samples, elapsed = replay(
+            trace, workers=options['workers'], base_url=options['base_url'], staff_user=campus['staff_user'],
+        )
+        results = summarize(samples, elapsed)
+
+        report = {
+            'commit': self._commit(),
+            'recorded_at': timezone.now().isoformat(),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'config': {
+                key: options[key] for key in (
+                    'students', 'days', 'scans', 'workers', 'duplicate_rate', 'unknown_rate',
+                    'transport_share', 'event_share', 'endpoints', 'seed', 'base_url',
+                )
+            },
+            'results': results,
+        }
+
+        for endpoint, summary in results['endpoints'].items():
+            latency = summary['latency_ms']
+            queries = summary['queries_per_request']
+            self.stdout.write(
+                f"{endpoint}: {summary['requests']} requests, {summary['throughput_rps']} rps, "
+                f"p50/p95/p99 {latency['p50']}/{latency['p95']}/{latency['p99']} ms, "
+                f"{queries['mean'] if queries else '-'} queries/request, "
+                f"errors {summary['error_rate']:.2%}, debounced {summary['debounce_rate']:.2%}"
+            )
+
+        output = Path(options['output'] or (
+            Path(settings.BASE_DIR) / 'benchmark_results'
+            / f"{timezone.now():%Y%m%d-%H%M%S}-{report['commit'] or 'nogit'}.json"
+        ))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+
+        if options['compare']:
+            previous = json.loads(Path(options['compare']).read_text())
+            self.stdout.write(f"Compared with {previous.get('commit')} ({options['compare']}):")
+            for line in compare(report, previous):
+                self.stdout.write(f'  {line}')
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from attendance.gates import issue_reader_key
+from attendance.models import Gate, Reader
+
+
+class Command(BaseCommand):
+    help = 'Register a gate reader (creating its gate if needed) and print its API key'
+
+    def add_arguments(self, parser):
+        parser.add_argument('gate', help='Gate name, e.g. "North Gate"')
+        parser.add_argument('name', help='Reader name, unique within the gate')
+        parser.add_argument('--location', default='', help='Location of a newly created gate')
+        parser.add_argument('--rotate', action='store_true', help='Issue a new key for an existing reader')
+
+    def handle(self, *args, **options):
+        gate, created = Gate.objects.get_or_create(name=options['gate'], defaults={'location': options['location']})
+        if created:
+            self.stdout.write(f'Created gate {gate.name}.')
+
+        reader = Reader.objects.filter(gate=gate, name=options['name']).first()
+        if reader is not None and not options['rotate']:
+            raise CommandError(f'Reader {reader} already exists; use --rotate to issue a new key.')
+
+        key = issue_reader_key(reader or Reader(gate=gate, name=options['name']))
+        self.stdout.write(self.style.SUCCESS(f'Reader key (shown once): {key}'))
+        self.stdout.write('Send it in the X-Reader-Key header of scan requests.')
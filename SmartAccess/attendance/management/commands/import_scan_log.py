@@ -0,0 +1,88 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from attendance.bitmaps import rebuild_bitmaps
+from attendance.imports import IMPORT_CHUNK_ROWS, ImportStats, import_scan_files, latest_actions
+from attendance.models import Term
+from attendance.presence import forget_presence
+from attendance.rollup import rebuild_summaries
+from attendance.visits import rebuild_visits
+from SmartAccess.localdates import campus_localdate
+from students.models import Student
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Import gate reader log files (CSV/JSONL, optionally gzipped) into the entry log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Log files with a card UID and a timestamp per row')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Override detection from the file extension')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be imported without writing')
+        parser.add_argument('--chunk-rows', type=int, default=IMPORT_CHUNK_ROWS, help='Rows read and merged at a time')
+        parser.add_argument('--chunk-students', type=int, default=500, help='Students merged per transaction')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument(
+            '--skip-derived',
+            action='store_true',
+            help='Do not rebuild rollups, visits, bitmaps and presence afterwards (run the rebuild commands later)',
+        )
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            if not os.path.exists(path):
+                raise CommandError(f'{path} does not exist')
+
+        stats = ImportStats()
+        started = time.monotonic()
+        changed = import_scan_files(
+            options['paths'], stats,
+            file_format=options['format'],
+            dry_run=options['dry_run'],
+            chunk_rows=options['chunk_rows'],
+            chunk_students=options['chunk_students'],
+            batch_size=options['batch_size'],
+        )
+        merged = time.monotonic()
+        self.stdout.write(
+            f'Read {stats.read} rows in {merged - started:.1f}s ({stats.read / max(merged - started, 1e-6):.0f} rows/s): '
+            f'{stats.invalid} invalid, {stats.unknown_cards} unknown cards, {len(stats.students)} students.'
+        )
+        self.stdout.write(
+            f'Merged {stats.inserted} new rows, {stats.flipped} existing rows re-toggled, '
+            f'{stats.duplicates} already present, {stats.debounced} debounced.'
+        )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run: no changes made.'))
+            return
+
+        if changed and not options['skip_derived']:
+            self.refresh_derived(changed, stats)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats.inserted} scans for {len(changed)} students in {elapsed:.1f}s '
+            f'({stats.read / max(elapsed, 1e-6):.0f} rows/s overall).'
+        ))
+
+    def refresh_derived(self, changed, stats):
+        started = time.monotonic()
+
+        # Imported rows can re-toggle everything after them, so rebuild through today
+        first_date = campus_localdate(stats.first_timestamp)
+        rebuild_summaries(first_date, campus_localdate())
+        for start in range(0, len(changed), 500):
+            rebuild_visits(changed[start:start + 500])
+        for term in Term.objects.filter(end_date__gte=first_date):
+            rebuild_bitmaps(term)
+
+        actions = latest_actions(changed)
+        for is_in in (True, False):
+            Student.objects.filter(
+                id__in=[student_id for student_id, action in actions.items() if (action == 'in') is is_in]
+            ).update(is_in_university=is_in)
+        forget_presence(*Student.objects.filter(id__in=changed).values_list('nfc_uid', flat=True))
+        call_command('reconcile_occupancy', stdout=self.stdout)
+
+        self.stdout.write(f'Rebuilt rollups, visits, bitmaps and presence in {time.monotonic() - started:.1f}s.')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from attendance.bitmaps import current_term, rebuild_bitmaps
+from attendance.models import Term
+import time
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-term attendance bitmaps from raw entry logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--term', help='Term name (defaults to the current term)')
+        parser.add_argument('--all', action='store_true', help='Rebuild every term')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['all']:
+            terms = list(Term.objects.order_by('start_date'))
+        elif options['term']:
+            terms = list(Term.objects.filter(name=options['term']))
+            if not terms:
+                raise CommandError(f"No term named {options['term']!r}")
+        else:
+            terms = [term for term in [current_term()] if term is not None]
+
+        if not terms:
+            self.stdout.write('No terms to rebuild.')
+            return
+
+        for term in terms:
+            started = time.monotonic()
+            written = rebuild_bitmaps(term, chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt {written} bitmaps for {term.name} ({term.start_date} to {term.end_date}) '
+                f'in {time.monotonic() - started:.1f}s.'
+            ))
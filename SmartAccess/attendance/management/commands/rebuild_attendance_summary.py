@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from attendance.models import EntryLog
+from attendance.rollup import rebuild_summaries
+from SmartAccess.localdates import campus_localdate
+import time
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair the daily attendance rollup from raw entry logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First date to rebuild (YYYY-MM-DD). Defaults to the oldest log.')
+        parser.add_argument('--end', help='Last date to rebuild (YYYY-MM-DD). Defaults to today.')
+
+    def handle(self, *args, **options):
+        start_date = self.parse_option(options, 'start')
+        end_date = self.parse_option(options, 'end') or campus_localdate()
+
+        if start_date is None:
+            first_log = EntryLog.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+            if first_log is None:
+                self.stdout.write('No entry logs to summarise.')
+                return
+            start_date = campus_localdate(first_log)
+
+        if start_date > end_date:
+            raise CommandError('--start must not be after --end')
+
+        started = time.monotonic()
+        written = rebuild_summaries(start_date, end_date)
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {written} student day summaries for {start_date} to {end_date} in {elapsed:.1f}s.'
+        ))
+
+    def parse_option(self, options, name):
+        if not options[name]:
+            return None
+        value = parse_date(options[name])
+        if value is None:
+            raise CommandError(f'--{name} must be a date in YYYY-MM-DD format')
+        return value
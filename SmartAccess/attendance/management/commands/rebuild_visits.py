@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from attendance.visits import rebuild_visits
+import time
+
+
+class Command(BaseCommand):
+    help = 'Rebuild visit intervals and per-student visit totals from raw entry logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student', type=int, action='append', dest='students',
+                            help='Only rebuild this student id (repeatable). Defaults to all students.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = rebuild_visits(options['students'])
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} visits in {elapsed:.1f}s.'))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.core.cache import cache
+from attendance.occupancy import (
+    GATES_KEY, OCCUPANCY_KEY, gate_key, inside_students, store_occupancy,
+)
+from attendance.presence import get_presences
+import time
+
+
+class Command(BaseCommand):
+    help = 'Reconcile the cached occupancy counters against the latest EntryLog per student (run periodically from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drift, do not correct the counters',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        card_ids = list(inside_students().values_list('nfc_uid', flat=True))
+        inside = len(card_ids)
+
+        # The entry gate is only known from the presence entries of students inside
+        by_gate = {}
+        states = get_presences(card_id for card_id in card_ids if card_id)
+        for state in states.values():
+            if state.get('gate'):
+                by_gate[state['gate']] = by_gate.get(state['gate'], 0) + 1
+
+        gates = sorted(set(cache.get(GATES_KEY) or []) | set(by_gate))
+        cached = cache.get_many([OCCUPANCY_KEY, *[gate_key(gate) for gate in gates]])
+
+        drift = (cached.get(OCCUPANCY_KEY) or 0) - inside
+        self.stdout.write(
+            f'Campus: counter {cached.get(OCCUPANCY_KEY)}, actual {inside}, drift {drift:+d}'
+        )
+        for gate in gates:
+            counted = cached.get(gate_key(gate)) or 0
+            actual = by_gate.get(gate, 0)
+            if counted != actual:
+                self.stdout.write(f'Gate {gate}: counter {counted}, actual {actual}, drift {counted - actual:+d}')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run: counters left unchanged.'))
+            return
+
+        store_occupancy(inside, by_gate)
+        self.stdout.write(self.style.SUCCESS(
+            f'Occupancy reconciled: {inside} inside ({time.monotonic() - started:.2f}s).'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from attendance.cards import sync_card_registry
+import time
+
+
+class Command(BaseCommand):
+    help = 'Register a card for every Student.nfc_uid missing from the card registry (run once after upgrading)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Cards per bulk insert')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        created = sync_card_registry(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Registered {created} student cards ({time.monotonic() - started:.2f}s).'
+        ))
@@ -1,12 +1,342 @@
+import zoneinfo
+from datetime import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 from students.models import Student
+from SmartAccess.localdates import LocalDateBucketed
+
+class Gate(models.Model):
+    """A campus entrance; scans record the gate whose reader produced them."""
+    name = models.CharField(max_length=64, unique=True)
+    location = models.CharField(max_length=255, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class Reader(models.Model):
+    """
+    An NFC reader mounted at a gate. Readers authenticate with an API key;
+    only its SHA-256 hash is stored (see ``attendance.gates.issue_reader_key``).
+    """
+    gate = models.ForeignKey(Gate, on_delete=models.CASCADE, related_name='readers')
+    name = models.CharField(max_length=100)
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    key_prefix = models.CharField(max_length=8, blank=True, editable=False)  # Shown to tell keys apart
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['gate__name', 'name']
+
+    def __str__(self):
+        return f"{self.gate.name} / {self.name}"
 
-class EntryLog(models.Model):
+
+class EntryLog(LocalDateBucketed):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(default=timezone.now, db_index=True)
     action = models.CharField(max_length=3, choices=[('in', 'In'), ('out', 'Out')])
     auto_generated = models.BooleanField(default=False)  # Add this field
+    gate = models.ForeignKey(Gate, on_delete=models.SET_NULL, null=True, blank=True, related_name='entry_logs')
+
+    class Meta(LocalDateBucketed.Meta):
+        indexes = [
+            *LocalDateBucketed.Meta.indexes,
+            # Per-student timelines: latest-log lookups and sessionized reports
+            models.Index(fields=['student', 'timestamp']),
+        ]
 
     def __str__(self):
         return f"{self.student.roll_number} - {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')} - {self.action}"
+
+
+class DailyAttendanceSummary(models.Model):
+    """
+    Per-day attendance rollup maintained incrementally by the scan path.
+
+    Rows with a student hold that student's day; the row with no student is
+    the campus-wide total for the day. A visit is credited to the day it
+    started on.
+    """
+    date = models.DateField()
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, null=True, blank=True, related_name='daily_summaries')
+
+    first_in = models.DateTimeField(null=True, blank=True)
+    last_out = models.DateTimeField(null=True, blank=True)
+    last_in = models.DateTimeField(null=True, blank=True)  # Start of the visit still open, if any
+    total_seconds = models.PositiveIntegerField(default=0)
+    is_late = models.BooleanField(default=False)
+    check_in_count = models.PositiveIntegerField(default=0)
+    check_out_count = models.PositiveIntegerField(default=0)
+
+    # Campus-wide rows only
+    students_present = models.PositiveIntegerField(default=0)
+    late_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'student'], name='unique_daily_summary_per_student'),
+            models.UniqueConstraint(fields=['date'], condition=models.Q(student__isnull=True),
+                                    name='unique_daily_summary_campus'),
+        ]
+        indexes = [
+            models.Index(fields=['student', 'date']),
+        ]
+
+    def __str__(self):
+        who = self.student.roll_number if self.student_id else 'campus'
+        return f"{who} - {self.date} - {self.check_in_count} in"
+
+    @property
+    def on_time_count(self):
+        return self.students_present - self.late_count
+
+
+class Visit(models.Model):
+    """A check-in/check-out interval, opened and closed by the scan path."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='visits')
+    check_in = models.DateTimeField()
+    check_out = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-check_in']
+        indexes = [
+            models.Index(fields=['student', 'check_in']),
+        ]
+
+    def __str__(self):
+        return f"{self.student.roll_number} - {self.check_in.strftime('%Y-%m-%d %H:%M')}"
+
+
+class VisitStats(models.Model):
+    """Running per-student visit totals, so detail pages need no log scan."""
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='visit_stats')
+    total_visits = models.PositiveIntegerField(default=0)
+    completed_visits = models.PositiveIntegerField(default=0)
+    total_seconds = models.PositiveBigIntegerField(default=0)  # Completed visits only
+
+    def __str__(self):
+        return f"{self.student.roll_number} - {self.total_visits} visits"
+
+
+class RosterChange(models.Model):
+    """
+    One change to the card roster; the highest id is the roster version that
+    gate readers sync against. Written by signals when Student.nfc_uid changes.
+    """
+    ACTION_CHOICES = [
+        ('assign', 'Assign'),
+        ('revoke', 'Revoke'),
+    ]
+
+    nfc_uid = models.CharField(max_length=50, db_index=True)
+    student = models.ForeignKey(Student, on_delete=models.SET_NULL, null=True, blank=True, related_name='roster_changes')
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"v{self.id} {self.action} {self.nfc_uid}"
+
+
+class Card(models.Model):
+    """
+    One NFC card and the person it belongs to. Student cards mirror
+    Student.nfc_uid (kept in sync by signals); teacher and staff cards are
+    issued here directly.
+    """
+    KIND_CHOICES = [
+        ('student', 'Student'),
+        ('teacher', 'Teacher'),
+        ('staff', 'Staff'),
+    ]
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('lost', 'Lost'),
+        ('revoked', 'Revoked'),
+    ]
+
+    uid = models.CharField(max_length=50, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, null=True, blank=True, related_name='cards')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='cards')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    issued_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def clean(self):
+        if self.kind == 'student' and not self.student_id:
+            raise ValidationError({'student': 'Student cards must belong to a student.'})
+        if self.kind != 'student' and not self.user_id:
+            raise ValidationError({'user': 'Teacher and staff cards must belong to a user.'})
+
+    def __str__(self):
+        return f"{self.uid} ({self.kind}, {self.status})"
+
+
+class ScanAlert(models.Model):
+    """A scan pattern that suggests a cloned, shared or misused card."""
+    KIND_CHOICES = [
+        ('cloned_card', 'Cloned Card'),
+        ('rapid_toggle', 'Rapid In/Out'),
+    ]
+    SOURCE_CHOICES = [
+        ('live', 'Live'),
+        ('batch', 'Batch'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='scan_alerts')
+    nfc_uid = models.CharField(max_length=50, blank=True)
+    occurred_at = models.DateTimeField()
+    gate = models.CharField(max_length=64, blank=True)
+    previous_gate = models.CharField(max_length=64, blank=True)
+    message = models.CharField(max_length=255)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='live')
+    is_resolved = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-occurred_at']
+        constraints = [
+            # Re-running the batch detector over a range must not duplicate alerts
+            models.UniqueConstraint(fields=['kind', 'student', 'occurred_at'], name='unique_scan_alert'),
+        ]
+        indexes = [
+            models.Index(fields=['is_resolved', 'occurred_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} - {self.student.roll_number} at {self.occurred_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class GateThroughput(models.Model):
+    """
+    Taps per gate per minute, flushed from the cache counters by the
+    ``flush_gate_throughput`` command. ``taps`` also counts out-of-order
+    batch uploads, so it can exceed the sum of the other columns.
+    """
+    gate = models.ForeignKey(Gate, on_delete=models.CASCADE, related_name='throughput')
+    minute = models.DateTimeField()
+    taps = models.PositiveIntegerField(default=0)
+    accepted = models.PositiveIntegerField(default=0)
+    debounced = models.PositiveIntegerField(default=0)
+    unknown_card = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['minute', 'gate']
+        constraints = [
+            models.UniqueConstraint(fields=['gate', 'minute'], name='unique_gate_throughput_minute'),
+        ]
+        indexes = [
+            models.Index(fields=['minute']),
+        ]
+
+    def __str__(self):
+        return f"{self.gate_id} - {self.minute:%Y-%m-%d %H:%M} - {self.taps} taps"
+
+
+class Term(models.Model):
+    """An academic term; attendance bitmaps have one bit per calendar day of it."""
+    name = models.CharField(max_length=100, unique=True)
+    start_date = models.DateField()
+    end_date = models.DateField()
+
+    class Meta:
+        ordering = ['-start_date']
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def days(self):
+        return (self.end_date - self.start_date).days + 1
+
+
+class AttendanceBitmap(models.Model):
+    """
+    Days present (and days late) in one term, one bit per calendar day: bit
+    ``n`` (byte ``n // 8``, mask ``1 << n % 8``) is ``start_date + n`` days.
+    The row with no student marks the days anyone was present, i.e. the
+    term's school days. Maintained by the scan path; see attendance.bitmaps.
+    """
+    term = models.ForeignKey(Term, on_delete=models.CASCADE, related_name='attendance_bitmaps')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, null=True, blank=True, related_name='attendance_bitmaps')
+    present = models.BinaryField(default=bytes)
+    late = models.BinaryField(default=bytes)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'student'], name='unique_attendance_bitmap_per_student'),
+            models.UniqueConstraint(fields=['term'], condition=models.Q(student__isnull=True),
+                                    name='unique_attendance_bitmap_campus'),
+        ]
+
+    def __str__(self):
+        who = self.student.roll_number if self.student_id else 'campus'
+        return f"{who} - {self.term.name}"
+
+
+def default_policy_time_zone():
+    return getattr(settings, 'CAMPUS_TIME_ZONE', settings.TIME_ZONE)
+
+
+class PunctualityPolicy(models.Model):
+    """
+    When a day's first check-in counts as late: at or after that weekday's
+    cutoff plus the grace minutes, in ``time_zone``. Weekdays without a
+    cutoff and Holiday dates are never late. The newest active policy
+    applies; see attendance.punctuality.
+    """
+    name = models.CharField(max_length=100)
+    is_active = models.BooleanField(default=True)
+    time_zone = models.CharField(max_length=64, default=default_policy_time_zone)
+    grace_minutes = models.PositiveSmallIntegerField(default=0)
+    monday_cutoff = models.TimeField(null=True, blank=True, default=time(9, 0))
+    tuesday_cutoff = models.TimeField(null=True, blank=True, default=time(9, 0))
+    wednesday_cutoff = models.TimeField(null=True, blank=True, default=time(9, 0))
+    thursday_cutoff = models.TimeField(null=True, blank=True, default=time(9, 0))
+    friday_cutoff = models.TimeField(null=True, blank=True, default=time(9, 0))
+    saturday_cutoff = models.TimeField(null=True, blank=True)
+    sunday_cutoff = models.TimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    CUTOFF_FIELDS = [
+        'monday_cutoff', 'tuesday_cutoff', 'wednesday_cutoff', 'thursday_cutoff',
+        'friday_cutoff', 'saturday_cutoff', 'sunday_cutoff',
+    ]
+
+    class Meta:
+        verbose_name_plural = 'punctuality policies'
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        try:
+            zoneinfo.ZoneInfo(self.time_zone)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise ValidationError({'time_zone': f'Unknown time zone {self.time_zone!r}'})
+
+
+class Holiday(models.Model):
+    """A campus-local date on which no check-in counts as late."""
+    date = models.DateField(unique=True)
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.date} - {self.name}"
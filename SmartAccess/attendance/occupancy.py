@@ -0,0 +1,145 @@
+"""
+Live campus occupancy counters kept in the cache.
+
+The scan path adjusts one campus-wide counter, plus a counter for the gate
+each student entered through, with atomic ``incr``/``decr`` as check-ins and
+check-outs are accepted. Dashboards and lobby displays read these keys
+instead of counting the students table. The entry gate is remembered in the
+student's presence entry so the matching check-out decrements the same gate.
+
+Counters can drift when rows are edited outside the scan path or the cache
+is flushed; the ``reconcile_occupancy`` command recomputes them from the
+latest EntryLog per student.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from .models import EntryLog
+from students.models import Student
+
+
+OCCUPANCY_KEY = 'attendance:occupancy:campus'
+GATE_KEY_PREFIX = 'attendance:occupancy:gate:'
+GATES_KEY = 'attendance:occupancy:gates'
+
+
+def gate_key(gate):
+    return f'{GATE_KEY_PREFIX}{gate}'
+
+
+def inside_students():
+    """Students whose latest EntryLog is a check-in, as the source of truth."""
+    latest = EntryLog.objects.filter(student=OuterRef('pk')).order_by('-timestamp', '-id')
+    return Student.objects.annotate(
+        last_action=Subquery(latest.values('action')[:1])
+    ).filter(last_action='in')
+
+
+def count_inside():
+    return inside_students().count()
+
+
+def _adjust(key, delta, seed):
+    """
+    Atomically add ``delta`` to a counter, creating it from ``seed()`` if
+    missing. The seed is expected to already include this change.
+    """
+    if not delta:
+        return cache.get(key)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        value = max(0, seed())
+        if cache.add(key, value, None):
+            if key.startswith(GATE_KEY_PREFIX):
+                _register_gate(key[len(GATE_KEY_PREFIX):])
+            return value
+        # Another worker seeded it first
+        return cache.incr(key, delta)
+
+
+def _register_gate(gate):
+    gates = cache.get(GATES_KEY) or []
+    if gate not in gates:
+        cache.set(GATES_KEY, sorted([*gates, gate]), None)
+
+
+def apply_changes(changes):
+    """
+    Apply accepted scans to the counters.
+
+    ``changes`` is an iterable of ``(action, gate)`` pairs where ``gate`` is
+    the entry gate for a check-in and the gate recorded at check-in for a
+    check-out (None when unknown).
+    """
+    campus = 0
+    gates = {}
+    for action, gate in changes:
+        delta = 1 if action == 'in' else -1
+        campus += delta
+        if gate:
+            gates[gate] = gates.get(gate, 0) + delta
+
+    _adjust(OCCUPANCY_KEY, campus, count_inside)
+    for gate, delta in gates.items():
+        _adjust(gate_key(gate), delta, lambda: delta)
+
+
+def apply_scan(action, gate=None):
+    apply_changes([(action, gate)])
+
+
+async def aapply_scan(action, gate=None):
+    """
+    Async ``apply_scan``; only seeding a missing campus counter hits the
+    database. The scan's row is handed to the write-behind queue after this
+    call, so the seed adds the scan itself to the rows already in the table.
+    """
+    delta = 1 if action == 'in' else -1
+    try:
+        await cache.aincr(OCCUPANCY_KEY, delta)
+    except ValueError:
+        await sync_to_async(_adjust)(OCCUPANCY_KEY, delta, lambda: count_inside() + delta)
+    if gate:
+        try:
+            await cache.aincr(gate_key(gate), delta)
+        except ValueError:
+            await sync_to_async(_adjust)(gate_key(gate), delta, lambda: delta)
+
+
+def campus_occupancy():
+    """Current number of students inside, seeding the counter on a cache miss."""
+    value = cache.get(OCCUPANCY_KEY)
+    if value is None:
+        value = count_inside()
+        cache.add(OCCUPANCY_KEY, value, None)
+    return max(0, value)
+
+
+def occupancy_snapshot():
+    """Campus and per-gate counts in one cache round trip."""
+    gates = cache.get(GATES_KEY) or []
+    values = cache.get_many([OCCUPANCY_KEY, *[gate_key(gate) for gate in gates]])
+    inside = values.get(OCCUPANCY_KEY)
+    if inside is None:
+        inside = campus_occupancy()
+
+    by_gate = {gate: max(0, values.get(gate_key(gate)) or 0) for gate in gates}
+    return {
+        'inside': max(0, inside),
+        'gates': by_gate,
+        # Students who entered before gates were tracked or whose entry gate was lost
+        'unattributed': max(0, inside - sum(by_gate.values())),
+    }
+
+
+def store_occupancy(inside, by_gate):
+    """Overwrite the counters with reconciled values."""
+    gates = sorted(set(cache.get(GATES_KEY) or []) | set(by_gate))
+    cache.set_many({
+        OCCUPANCY_KEY: inside,
+        **{gate_key(gate): by_gate.get(gate, 0) for gate in gates},
+    }, None)
+    cache.set(GATES_KEY, gates, None)
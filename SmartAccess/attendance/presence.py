@@ -0,0 +1,152 @@
+"""
+Cache-backed presence state for the gate scan path.
+
+Each assigned NFC card has one cache entry holding the student it belongs
+to, the last action recorded for it and the gate of an open check-in. The
+scan path reads this entry instead of querying Student and EntryLog, and
+writes it through after every accepted scan. On a cache miss the entry is
+rebuilt once, resolving the card through the card registry (lost and
+revoked cards have no entry).
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from .anomalies import remember_tap
+from .cards import card_error, resolve_card, resolve_cards
+from .models import EntryLog
+from students.models import Student
+
+
+PRESENCE_KEY_PREFIX = 'attendance:presence:'
+
+# Entries are rebuilt from the database on a miss, so the timeout only bounds
+# how long an idle card keeps its slot in the cache.
+PRESENCE_TIMEOUT = getattr(settings, 'ATTENDANCE_PRESENCE_TIMEOUT', 60 * 60 * 24)
+
+
+def presence_key(card_id):
+    return f'{PRESENCE_KEY_PREFIX}{card_id}'
+
+
+def load_presence(card_id):
+    """Build the presence entry for a card (None unless it is an active student card)."""
+    card = resolve_card(card_id)
+    if card_error(card, 'student'):
+        return None
+
+    last_log = EntryLog.objects.filter(student_id=card['student_id'])\
+        .order_by('-timestamp').values('action', 'timestamp').first()
+
+    return {
+        'student_id': card['student_id'],
+        'name': card['name'],
+        'roll_number': card['roll_number'],
+        'last_action': last_log['action'] if last_log else None,
+        'last_timestamp': last_log['timestamp'] if last_log else None,
+        'gate': None,
+    }
+
+
+def get_presence(card_id):
+    """Return the presence entry for a card, loading it on a cache miss."""
+    state = cache.get(presence_key(card_id))
+    if state is None:
+        state = load_presence(card_id)
+        if state is not None:
+            cache.set(presence_key(card_id), state, PRESENCE_TIMEOUT)
+    return state
+
+
+async def aget_presence(card_id):
+    """Async variant of ``get_presence``; only a cache miss touches the database."""
+    state = await cache.aget(presence_key(card_id))
+    if state is None:
+        state = await sync_to_async(get_presence)(card_id)
+    return state
+
+
+def get_presences(card_ids):
+    """
+    Return presence entries for many cards at once, keyed by card id.
+
+    Cache misses are loaded together in a single query; unknown cards are
+    absent from the result.
+    """
+    card_ids = set(card_ids)
+    cached = cache.get_many([presence_key(card_id) for card_id in card_ids])
+    states = {
+        card_id: cached[presence_key(card_id)]
+        for card_id in card_ids if presence_key(card_id) in cached
+    }
+
+    missing = card_ids - states.keys()
+    cards = {
+        card['student_id']: card for card in resolve_cards(missing).values()
+        if card_error(card, 'student') is None
+    }
+    if cards:
+        latest = EntryLog.objects.filter(student=OuterRef('pk')).order_by('-timestamp')
+        last = {
+            row['id']: row for row in Student.objects.filter(id__in=cards).annotate(
+                last_action=Subquery(latest.values('action')[:1]),
+                last_timestamp=Subquery(latest.values('timestamp')[:1]),
+            ).values('id', 'last_action', 'last_timestamp')
+        }
+
+        loaded = {}
+        for student_id, card in cards.items():
+            log = last.get(student_id, {})
+            loaded[card['uid']] = {
+                'student_id': student_id,
+                'name': card['name'],
+                'roll_number': card['roll_number'],
+                'last_action': log.get('last_action'),
+                'last_timestamp': log.get('last_timestamp'),
+                'gate': None,
+            }
+        set_presences(loaded)
+        states.update(loaded)
+
+    return states
+
+
+def set_presence(card_id, state):
+    cache.set(presence_key(card_id), state, PRESENCE_TIMEOUT)
+
+
+def set_presences(states):
+    if states:
+        cache.set_many({presence_key(card_id): state for card_id, state in states.items()}, PRESENCE_TIMEOUT)
+
+
+def scanned_state(state, action, timestamp, gate=None):
+    """
+    The presence entry after an accepted scan; check-ins remember their gate
+    and the anomaly detector's fields are brought up to date.
+    """
+    state = remember_tap(state, timestamp, gate)
+    return dict(state, last_action=action, last_timestamp=timestamp,
+                gate=gate if action == 'in' else None)
+
+
+def record_presence(card_id, state, action, timestamp, gate=None):
+    """Write an accepted scan through to the cached presence entry."""
+    state = scanned_state(state, action, timestamp, gate)
+    set_presence(card_id, state)
+    return state
+
+
+async def arecord_presence(card_id, state, action, timestamp, gate=None):
+    state = scanned_state(state, action, timestamp, gate)
+    await cache.aset(presence_key(card_id), state, PRESENCE_TIMEOUT)
+    return state
+
+
+def forget_presence(*card_ids):
+    """Drop cached entries, e.g. after a card is reassigned or logs are edited."""
+    keys = [presence_key(card_id) for card_id in card_ids if card_id]
+    if keys:
+        cache.delete_many(keys)
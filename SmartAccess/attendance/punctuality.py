@@ -0,0 +1,128 @@
+"""
+The punctuality policy: which check-ins count as late.
+
+The newest active PunctualityPolicy and the Holiday dates are loaded into
+one cached dict (invalidated by signals), so ops can change cutoffs, grace
+minutes, the time zone or holidays without a deploy. The same rule is
+available three ways:
+
+* ``late_expression(field)``: a SQL expression classifying a datetime
+  column, for ``annotate()`` and aggregate filters, so dashboards count
+  late arrivals for any date range in the query they already run.
+* ``is_late(timestamp)``: for the scan path's rollup and bitmaps.
+* ``analytics.late_mask``: vectorized over NumPy arrays, from
+  ``current_policy()``.
+
+Without a policy row, check-ins at or after ``ATTENDANCE_LATE_CUTOFF``
+(9:00) on any day are late, as before.
+"""
+
+import hashlib
+import zoneinfo
+from datetime import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, IntegerField, Q, Value, When
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay, ExtractMinute, ExtractSecond, TruncDate
+from django.db.models.lookups import Exact, GreaterThanOrEqual, In
+from django.utils import timezone
+
+from .models import Holiday, PunctualityPolicy
+from SmartAccess.localdates import CAMPUS_TIME_ZONE
+
+
+# Fallback cutoff used when no policy has been configured
+LATE_CUTOFF = getattr(settings, 'ATTENDANCE_LATE_CUTOFF', time(9, 0))
+
+POLICY_KEY = 'attendance:punctuality:policy'
+POLICY_TIMEOUT = 60 * 60 * 24
+
+
+def _seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def load_policy():
+    """
+    ``{'time_zone', 'limits', 'holidays', 'version'}``: ``limits`` holds,
+    Monday first, the second of the local day from which a first check-in
+    is late (cutoff plus grace), or None for days without a cutoff.
+    """
+    policy = PunctualityPolicy.objects.filter(is_active=True).order_by('-updated_at', '-id').first()
+    if policy is None:
+        time_zone = CAMPUS_TIME_ZONE.key
+        limits = [_seconds(LATE_CUTOFF)] * 7
+    else:
+        time_zone = policy.time_zone
+        limits = [
+            _seconds(cutoff) + policy.grace_minutes * 60 if cutoff is not None else None
+            for cutoff in (getattr(policy, field) for field in PunctualityPolicy.CUTOFF_FIELDS)
+        ]
+    holidays = frozenset(Holiday.objects.values_list('date', flat=True))
+    version = hashlib.md5(repr((time_zone, limits, sorted(holidays))).encode()).hexdigest()[:12]
+    return {'time_zone': time_zone, 'limits': limits, 'holidays': holidays, 'version': version}
+
+
+def current_policy():
+    policy = cache.get(POLICY_KEY)
+    if policy is None:
+        policy = load_policy()
+        cache.set(POLICY_KEY, policy, POLICY_TIMEOUT)
+    return policy
+
+
+def forget_policy():
+    cache.delete(POLICY_KEY)
+
+
+def is_late(timestamp, policy=None):
+    """Whether a first check-in at ``timestamp`` is late under the policy."""
+    policy = policy or current_policy()
+    local = timezone.localtime(timestamp, zoneinfo.ZoneInfo(policy['time_zone']))
+    limit = policy['limits'][local.weekday()]
+    if limit is None or local.date() in policy['holidays']:
+        return False
+    return _seconds(local) >= limit
+
+
+def late_expression(field, policy=None):
+    """
+    Boolean SQL expression: is the datetime column ``field`` a late
+    check-in? Evaluated in the policy's time zone, per weekday and with
+    holidays excluded, in the same query as the rest of the ``annotate()``
+    or aggregate that uses it.
+    """
+    policy = policy or current_policy()
+    tz = zoneinfo.ZoneInfo(policy['time_zone'])
+
+    weekday_limits = [
+        When(Exact(ExtractIsoWeekDay(field, tzinfo=tz), weekday), then=Value(limit))
+        for weekday, limit in enumerate(policy['limits'], start=1) if limit is not None
+    ]
+    if not weekday_limits:
+        return Value(False, output_field=BooleanField())
+
+    seconds = (
+        ExtractHour(field, tzinfo=tz) * 3600
+        + ExtractMinute(field, tzinfo=tz) * 60
+        + ExtractSecond(field, tzinfo=tz)
+    )
+    limit = Case(*weekday_limits, default=Value(None), output_field=IntegerField())
+
+    whens = []
+    if policy['holidays']:
+        whens.append(When(In(TruncDate(field, tzinfo=tz), sorted(policy['holidays'])), then=Value(False)))
+    whens.append(When(GreaterThanOrEqual(seconds, limit), then=Value(True)))
+    return Case(*whens, default=Value(False), output_field=BooleanField())
+
+
+def annotate_punctuality(queryset, field='timestamp', name='late'):
+    """Annotate each row with ``name``: whether ``field`` is a late check-in."""
+    return queryset.annotate(**{name: late_expression(field)})
+
+
+def late_filter(field, policy=None):
+    """``late_expression`` as a Q, for ``filter()`` and ``Count(filter=...)``."""
+    return Q(late_expression(field, policy))
+
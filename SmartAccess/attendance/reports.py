@@ -0,0 +1,125 @@
+"""
+Sessionized attendance reporting.
+
+Logs are read once, ordered by (student, timestamp), and each ``in`` is paired
+with the following ``out`` of the same student. Rows are streamed from the
+database in chunks and written through xlsxwriter's ``constant_memory`` mode,
+so memory use stays flat no matter how much history is exported.
+"""
+
+import tempfile
+
+import xlsxwriter
+
+from SmartAccess.localdates import campus_localtime, local_date_q
+
+
+REPORT_CHUNK_SIZE = 2000
+
+REPORT_HEADERS = ['Date', 'Student Name', 'Roll Number', 'Check In', 'Check Out', 'Duration', 'Status']
+
+STATUS_COMPLETE = 'Complete'
+STATUS_NO_CHECK_OUT = 'No Check Out'
+STATUS_NO_CHECK_IN = 'No Check In'
+
+
+def filter_report_logs(logs, start_date=None, end_date=None, student_id=None):
+    """Restrict logs to an inclusive local date range and/or a single student."""
+    if start_date or end_date:
+        logs = logs.filter(local_date_q(start=start_date, end=end_date))
+    if student_id:
+        logs = logs.filter(student_id=student_id)
+    return logs
+
+
+def iter_sessions(rows):
+    """
+    Pair in/out rows into sessions in a single pass.
+
+    ``rows`` yields ``(student_id, name, roll_number, timestamp, action)``
+    ordered by student then timestamp. Yields dicts with ``check_in`` and
+    ``check_out`` (either may be None for an unpaired scan) and a status.
+    """
+    current_student = None
+    open_session = None
+
+    for student_id, name, roll_number, timestamp, action in rows:
+        if student_id != current_student:
+            if open_session:
+                yield open_session
+            current_student = student_id
+            open_session = None
+
+        if action == 'in':
+            if open_session:
+                yield open_session
+            open_session = {
+                'student_id': student_id,
+                'name': name,
+                'roll_number': roll_number,
+                'check_in': timestamp,
+                'check_out': None,
+                'status': STATUS_NO_CHECK_OUT,
+            }
+        elif open_session:
+            open_session.update(check_out=timestamp, status=STATUS_COMPLETE)
+            yield open_session
+            open_session = None
+        else:
+            yield {
+                'student_id': student_id,
+                'name': name,
+                'roll_number': roll_number,
+                'check_in': None,
+                'check_out': timestamp,
+                'status': STATUS_NO_CHECK_IN,
+            }
+
+    if open_session:
+        yield open_session
+
+
+def format_duration(seconds):
+    hours, remainder = divmod(int(seconds), 3600)
+    return f"{hours}h {remainder // 60}m"
+
+
+def build_attendance_workbook(logs, chunk_size=REPORT_CHUNK_SIZE):
+    """
+    Write the sessionized report for ``logs`` to a temporary file.
+
+    Returns the open file positioned at the start; it is deleted when closed.
+    """
+    rows = logs.order_by('student_id', 'timestamp').values_list(
+        'student_id', 'student__name', 'student__roll_number', 'timestamp', 'action'
+    ).iterator(chunk_size=chunk_size)
+
+    output = tempfile.TemporaryFile()
+    # constant_memory flushes each row to disk as soon as the next one starts
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet()
+    worksheet.write_row(0, 0, REPORT_HEADERS)
+
+    row = 1
+    for session in iter_sessions(rows):
+        check_in = session['check_in'] and campus_localtime(session['check_in'])
+        check_out = session['check_out'] and campus_localtime(session['check_out'])
+        duration = ''
+        if check_in and check_out:
+            duration = format_duration((check_out - check_in).total_seconds())
+
+        worksheet.write_row(row, 0, [
+            (check_in or check_out).strftime('%Y-%m-%d'),
+            session['name'],
+            session['roll_number'],
+            check_in.strftime('%H:%M') if check_in else '',
+            check_out.strftime('%H:%M') if check_out else '',
+            duration,
+            session['status'],
+        ])
+        row += 1
+
+    workbook.close()
+    output.seek(0)
+    return output
+
@@ -0,0 +1,201 @@
+"""
+Incremental maintenance of DailyAttendanceSummary.
+
+``apply_scan`` is called by the scan path for every EntryLog it writes and
+keeps the student's row and the campus row for the day up to date with
+single-row UPDATEs. ``rebuild_summaries`` recomputes a date range from the
+raw log, for backfills and repairs.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import DailyAttendanceSummary, EntryLog
+from .punctuality import is_late
+from .reports import iter_sessions
+from SmartAccess.localdates import CAMPUS_TIME_ZONE, campus_localdate
+
+
+REBUILD_CHUNK_SIZE = 2000
+
+
+def _upsert(day, student_id, increments, values=None, defaults=None):
+    """
+    Add ``increments`` to (and set ``values`` on) the summary row, creating
+    it with ``defaults`` if missing. Returns True if the row was created.
+    """
+    values = values or {}
+    rows = DailyAttendanceSummary.objects.filter(date=day, student_id=student_id)
+    updates = {field: F(field) + amount for field, amount in increments.items()}
+
+    if rows.update(**updates, **values):
+        return False
+    try:
+        with transaction.atomic():
+            DailyAttendanceSummary.objects.create(
+                date=day, student_id=student_id, **increments, **values, **(defaults or {})
+            )
+        return True
+    except IntegrityError:
+        # Another scan created the row first
+        rows.update(**updates, **values)
+        return False
+
+
+def apply_scan(student_id, action, timestamp, session_start=None):
+    """
+    Fold one recorded scan into the daily rollup.
+
+    ``session_start`` is the timestamp of the check-in that a check-out
+    closes, when the caller already knows it; otherwise it is read from the
+    open summary row. Returns True for the student's first check-in of the
+    day.
+    """
+    if action == 'in':
+        day = campus_localdate(timestamp)
+        late = is_late(timestamp)
+        created = _upsert(day, student_id, {'check_in_count': 1}, {'last_in': timestamp},
+                          defaults={'first_in': timestamp, 'is_late': late})
+        _upsert(day, None, {
+            'check_in_count': 1,
+            'students_present': int(created),
+            'late_count': int(created and late),
+        })
+        return created
+
+    if session_start is None:
+        session_start = DailyAttendanceSummary.objects.filter(
+            student_id=student_id,
+            last_in__isnull=False,
+            date__lte=campus_localdate(timestamp),
+        ).order_by('-date').values_list('last_in', flat=True).first()
+
+    if session_start is None:
+        # A check-out without a matching check-in counts on its own day
+        day, seconds = campus_localdate(timestamp), 0
+    else:
+        day = campus_localdate(session_start)
+        seconds = max(0, int((timestamp - session_start).total_seconds()))
+
+    _upsert(day, student_id, {'check_out_count': 1, 'total_seconds': seconds},
+            {'last_out': timestamp, 'last_in': None})
+    _upsert(day, None, {'check_out_count': 1, 'total_seconds': seconds})
+
+
+def apply_checkouts(checkouts, timestamp, chunk_size=500):
+    """
+    Set-based ``apply_scan`` for many check-outs at the same ``timestamp``.
+
+    ``checkouts`` is a list of ``(student_id, session_start)`` pairs; each
+    chunk is folded in with one UPDATE plus one campus-row update per day.
+    """
+    by_day = {}
+    for student_id, session_start in checkouts:
+        seconds = max(0, int((timestamp - session_start).total_seconds()))
+        by_day.setdefault(campus_localdate(session_start), []).append((student_id, seconds))
+
+    for day, items in by_day.items():
+        for i in range(0, len(items), chunk_size):
+            chunk = items[i:i + chunk_size]
+            DailyAttendanceSummary.objects.filter(
+                date=day, student_id__in=[student_id for student_id, _ in chunk]
+            ).update(
+                last_out=timestamp,
+                last_in=None,
+                check_out_count=F('check_out_count') + 1,
+                total_seconds=F('total_seconds') + Case(
+                    *[When(student_id=student_id, then=Value(seconds)) for student_id, seconds in chunk],
+                    default=Value(0), output_field=IntegerField()
+                ),
+            )
+        _upsert(day, None, {
+            'check_out_count': len(items),
+            'total_seconds': sum(seconds for _, seconds in items),
+        })
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min), CAMPUS_TIME_ZONE)
+
+
+def rebuild_summaries(start_date, end_date, chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    Recompute summary rows for ``start_date``..``end_date`` (inclusive) from
+    EntryLog. Returns the number of student rows written.
+    """
+    # Start a day early so visits that began before the range pair correctly
+    rows = EntryLog.objects.filter(
+        timestamp__gte=_local_midnight(start_date - timedelta(days=1)),
+        timestamp__lt=_local_midnight(end_date + timedelta(days=1)),
+    ).order_by('student_id', 'timestamp').values_list(
+        'student_id', 'timestamp', 'action'
+    ).iterator(chunk_size=chunk_size)
+    rows = ((student_id, None, None, timestamp, action) for student_id, timestamp, action in rows)
+
+    campus = {}
+    pending = []
+    written = 0
+    current_student = None
+    student_rows = {}
+
+    def flush_student():
+        nonlocal written
+        for summary in student_rows.values():
+            if start_date <= summary.date <= end_date:
+                pending.append(summary)
+                totals = campus.setdefault(summary.date, DailyAttendanceSummary(date=summary.date))
+                totals.check_in_count += summary.check_in_count
+                totals.check_out_count += summary.check_out_count
+                totals.total_seconds += summary.total_seconds
+                if summary.check_in_count:
+                    totals.students_present += 1
+                    totals.late_count += int(summary.is_late)
+        student_rows.clear()
+        if len(pending) >= chunk_size:
+            DailyAttendanceSummary.objects.bulk_create(pending)
+            written += len(pending)
+            pending.clear()
+
+    with transaction.atomic():
+        DailyAttendanceSummary.objects.filter(date__gte=start_date, date__lte=end_date).delete()
+
+        open_row = None
+        for session in iter_sessions(rows):
+            if session['student_id'] != current_student:
+                flush_student()
+                current_student = session['student_id']
+                open_row = None
+
+            check_in, check_out = session['check_in'], session['check_out']
+            day = campus_localdate(check_in or check_out)
+            summary = student_rows.get(day)
+            if summary is None:
+                summary = student_rows[day] = DailyAttendanceSummary(date=day, student_id=current_student)
+
+            if open_row is not None:
+                open_row.last_in = None
+                open_row = None
+
+            if check_in:
+                summary.check_in_count += 1
+                if summary.first_in is None:
+                    summary.first_in = check_in
+                    summary.is_late = is_late(check_in)
+            if check_out:
+                summary.check_out_count += 1
+                summary.last_out = check_out
+                if check_in:
+                    summary.total_seconds += int((check_out - check_in).total_seconds())
+            else:
+                summary.last_in = check_in
+                open_row = summary
+
+        flush_student()
+        pending.extend(campus.values())
+        DailyAttendanceSummary.objects.bulk_create(pending)
+        written += len(pending) - len(campus)
+
+    return written
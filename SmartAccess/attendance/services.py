@@ -0,0 +1,426 @@
+"""
+Gate scan processing shared by the attendance views.
+
+``record_scan`` decides the debounce and in/out toggle from the cached
+presence state and claims the card's debounce window with an atomic
+``cache.add``, so two concurrent taps cannot both be accepted. It then
+persists the scan as one EntryLog insert plus a targeted update of
+``Student.is_in_university``. Accepted scans also adjust the cached
+occupancy counters and are published to the live gate feed.
+Every tap, debounced or not, is checked by the anomaly detector and counted
+in its gate's per-minute throughput counters.
+"""
+
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import EntryLog
+from . import anomalies, bitmaps, gates, livefeed, occupancy, rollup, throughput, visits
+from .presence import (
+    get_presence, get_presences, record_presence, scanned_state, set_presences,
+    aget_presence, arecord_presence,
+)
+from students.models import Student
+
+
+# Taps of the same card closer together than this are treated as duplicates
+SCAN_DEBOUNCE = timedelta(seconds=30)
+
+DEBOUNCE_KEY_PREFIX = 'attendance:debounce:'
+# Bounds how long a crashed takeover blocks a card's claim
+CLAIM_TAKEOVER_TIMEOUT = 5
+
+SCAN_ACCEPTED = 'accepted'
+SCAN_DEBOUNCED = 'debounced'
+SCAN_UNKNOWN_CARD = 'unknown_card'
+SCAN_OUT_OF_ORDER = 'out_of_order'
+SCAN_INVALID = 'invalid'
+
+# Upper bound on the number of scans a reader may upload in one batch
+SCAN_BATCH_LIMIT = getattr(settings, 'ATTENDANCE_SCAN_BATCH_LIMIT', 1000)
+
+# How far ahead of the server clock a reader's scanned_at may be. A later
+# timestamp would become the card's last scan and debounce every live tap.
+SCAN_CLOCK_SKEW = timedelta(seconds=getattr(settings, 'ATTENDANCE_SCAN_CLOCK_SKEW', 60))
+
+CARD_ID_MAX_LENGTH = 50
+
+
+def next_action(state, now):
+    """Return the action for a scan at ``now``, or None if it is a duplicate."""
+    last_timestamp = state['last_timestamp']
+    if last_timestamp and now - last_timestamp < SCAN_DEBOUNCE:
+        return None
+    return 'out' if state['last_action'] == 'in' else 'in'
+
+
+def debounce_key(card_id):
+    return f'{DEBOUNCE_KEY_PREFIX}{card_id}'
+
+
+def _claim_timeout():
+    return int(SCAN_DEBOUNCE.total_seconds())
+
+
+def _claim_held(claimed_at, now):
+    return claimed_at is not None and abs(now - claimed_at) < SCAN_DEBOUNCE
+
+
+def claim_scan(card_id, now):
+    """
+    Atomically claim a card's debounce window (set-if-absent, expiring after
+    SCAN_DEBOUNCE). Returns False if a concurrent tap of the card holds it.
+
+    A claim left by a tap with a distant explicit timestamp is taken over
+    under a short ``cache.add`` lock, re-checked once the lock is held, so
+    only one of several concurrent taps can replace it.
+    """
+    key = debounce_key(card_id)
+    if cache.add(key, now, _claim_timeout()):
+        return True
+    if _claim_held(cache.get(key), now):
+        return False
+    if not cache.add(f'{key}:takeover', True, CLAIM_TAKEOVER_TIMEOUT):
+        return False
+    try:
+        if _claim_held(cache.get(key), now):
+            return False
+        cache.set(key, now, _claim_timeout())
+        return True
+    finally:
+        cache.delete(f'{key}:takeover')
+
+
+async def aclaim_scan(card_id, now):
+    key = debounce_key(card_id)
+    if await cache.aadd(key, now, _claim_timeout()):
+        return True
+    if _claim_held(await cache.aget(key), now):
+        return False
+    if not await cache.aadd(f'{key}:takeover', True, CLAIM_TAKEOVER_TIMEOUT):
+        return False
+    try:
+        if _claim_held(await cache.aget(key), now):
+            return False
+        await cache.aset(key, now, _claim_timeout())
+        return True
+    finally:
+        await cache.adelete(f'{key}:takeover')
+
+
+def release_scan(card_id):
+    """Give the window back when a claimed scan could not be recorded."""
+    cache.delete(debounce_key(card_id))
+
+
+def scan_message(name, action):
+    return f"{name} checked {action}"
+
+
+def fold_scan(student_id, action, timestamp, session_start=None):
+    """
+    Update the tables derived from EntryLog for one recorded scan.
+
+    ``session_start`` is the check-in a check-out closes, if the caller
+    knows it. Must run inside the transaction that inserts the log.
+    """
+    first_of_day = rollup.apply_scan(student_id, action, timestamp, session_start)
+    visits.apply_scan(student_id, action, timestamp, session_start)
+    if first_of_day:
+        bitmaps.mark_present(student_id, timestamp)
+
+
+def fold_checkouts(checkouts, timestamp):
+    """
+    Set-based ``fold_scan`` for many check-outs recorded at one timestamp.
+
+    ``checkouts`` is a list of ``(student_id, session_start)`` pairs.
+    """
+    rollup.apply_checkouts(checkouts, timestamp)
+    visits.apply_checkouts(checkouts, timestamp)
+
+
+def clean_gate(value):
+    """Gate names come from reader payloads; anything but a short string is ignored."""
+    if isinstance(value, str) and 0 < len(value.strip()) <= 64:
+        return value.strip()
+    return None
+
+
+def occupancy_gate(state, action, gate):
+    """The gate counter a scan moves: the entry gate, or the one it was entered by."""
+    return gate if action == 'in' else state.get('gate')
+
+
+def record_scan(card_id, now=None, gate=None):
+    """
+    Process one card tap at ``gate`` (optional) and return a result dict.
+
+    ``status`` is one of SCAN_ACCEPTED, SCAN_DEBOUNCED or SCAN_UNKNOWN_CARD.
+    Accepted scans also carry the student, the decided action and the log id.
+    """
+    now = now or timezone.now()
+    gate = clean_gate(gate)
+    gate_id = gates.gate_id(gate)
+
+    state = get_presence(card_id)
+    if state is None:
+        throughput.count_tap(gate_id, SCAN_UNKNOWN_CARD, now)
+        return {'status': SCAN_UNKNOWN_CARD, 'card_id': card_id}
+
+    action = next_action(state, now)
+    if action is not None and not claim_scan(card_id, now):
+        action = None
+    anomalies.check_scan(state, card_id, now, gate, action)
+    if action is None:
+        throughput.count_tap(gate_id, SCAN_DEBOUNCED, now)
+        return {
+            'status': SCAN_DEBOUNCED,
+            'card_id': card_id,
+            'student_id': state['student_id'],
+            'name': state['name'],
+        }
+
+    session_start = state['last_timestamp'] if action == 'out' else None
+    try:
+        with transaction.atomic():
+            log = EntryLog.objects.create(student_id=state['student_id'], timestamp=now, action=action, gate_id=gate_id)
+            Student.objects.filter(id=state['student_id']).update(is_in_university=(action == 'in'))
+            fold_scan(state['student_id'], action, now, session_start)
+    except Exception:
+        release_scan(card_id)
+        raise
+    record_presence(card_id, state, action, now, gate)
+    occupancy.apply_scan(action, occupancy_gate(state, action, gate))
+    throughput.count_tap(gate_id, SCAN_ACCEPTED, now)
+    livefeed.publish([livefeed.scan_event(state, action, now, gate)])
+
+    return {
+        'status': SCAN_ACCEPTED,
+        'card_id': card_id,
+        'student_id': state['student_id'],
+        'name': state['name'],
+        'action': action,
+        'timestamp': now,
+        'log_id': log.id,
+        'message': scan_message(state['name'], action),
+    }
+
+
+async def arecord_scan(card_id, now=None, gate=None):
+    """
+    Async variant of ``record_scan`` for the ASGI gate endpoint.
+
+    The decision is made from the cached presence state and the EntryLog row
+    is handed to the write-behind queue, so the reader gets its answer
+    without waiting for the database.
+    """
+    from .writebehind import enqueue_scan
+
+    now = now or timezone.now()
+    gate = clean_gate(gate)
+    gate_id = await gates.agate_id(gate)
+
+    state = await aget_presence(card_id)
+    if state is None:
+        await throughput.acount_tap(gate_id, SCAN_UNKNOWN_CARD, now)
+        return {'status': SCAN_UNKNOWN_CARD, 'card_id': card_id}
+
+    action = next_action(state, now)
+    if action is not None and not await aclaim_scan(card_id, now):
+        action = None
+    found = anomalies.detect(state, now, gate, action)
+    if found:
+        await sync_to_async(anomalies.save_alerts)(
+            anomalies.build_alerts(state['student_id'], card_id, now, gate, found)
+        )
+    if action is None:
+        await throughput.acount_tap(gate_id, SCAN_DEBOUNCED, now)
+        return {
+            'status': SCAN_DEBOUNCED,
+            'card_id': card_id,
+            'student_id': state['student_id'],
+            'name': state['name'],
+        }
+
+    await arecord_presence(card_id, state, action, now, gate)
+    await occupancy.aapply_scan(action, occupancy_gate(state, action, gate))
+    await throughput.acount_tap(gate_id, SCAN_ACCEPTED, now)
+    enqueue_scan(state['student_id'], action, now, gate_id)
+    await sync_to_async(livefeed.publish, thread_sensitive=False)(
+        [livefeed.scan_event(state, action, now, gate)]
+    )
+
+    return {
+        'status': SCAN_ACCEPTED,
+        'card_id': card_id,
+        'student_id': state['student_id'],
+        'name': state['name'],
+        'action': action,
+        'timestamp': now,
+        'message': scan_message(state['name'], action),
+    }
+
+
+def persist_scans(logs):
+    """
+    Write already-decided EntryLog rows in one transaction.
+
+    ``logs`` must be in timestamp order; each student's final action decides
+    its ``is_in_university`` flag, applied with at most two UPDATEs. Derived
+    tables are updated in the same transaction.
+    """
+    inside = {log.student_id: log.action == 'in' for log in logs}
+    with transaction.atomic():
+        EntryLog.objects.bulk_create(logs)
+        for is_in in (True, False):
+            student_ids = [sid for sid, flag in inside.items() if flag is is_in]
+            if student_ids:
+                Student.objects.filter(id__in=student_ids).update(is_in_university=is_in)
+
+        checked_in = {}
+        for log in logs:
+            fold_scan(log.student_id, log.action, log.timestamp, checked_in.pop(log.student_id, None))
+            if log.action == 'in':
+                checked_in[log.student_id] = log.timestamp
+    return logs
+
+
+def parse_scanned_at(value):
+    """
+    Parse a reader timestamp (ISO 8601); naive values use the current
+    timezone. Returns None for anything that is not a valid timestamp.
+    """
+    try:
+        scanned_at = parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        # Well-formed but impossible, e.g. month 13
+        return None
+    if scanned_at is not None and timezone.is_naive(scanned_at):
+        scanned_at = timezone.make_aware(scanned_at)
+    return scanned_at
+
+
+def clean_card_id(value):
+    """Card ids come from reader payloads; anything but a short string is rejected."""
+    if isinstance(value, str) and 0 < len(value.strip()) <= CARD_ID_MAX_LENGTH:
+        return value.strip()
+    return None
+
+
+def _invalid(index, error):
+    return {'index': index, 'status': SCAN_INVALID, 'error': error}
+
+
+def record_scan_batch(records, gate=None):
+    """
+    Process an ordered batch of buffered reader scans.
+
+    Each record is a dict with ``card_id``, ``scanned_at`` (ISO 8601) and an
+    optional ``gate``; ``gate``, when given (the uploading reader's gate),
+    overrides the records' own. Scans are applied per card in timestamp
+    order with the same debounce, in/out toggle and debounce claim as
+    ``record_scan``, and every accepted scan is written with a single
+    ``bulk_create`` inside one transaction. Scans older than the card's last
+    recorded action cannot be placed in the toggle sequence and are reported
+    as SCAN_OUT_OF_ORDER without being saved. Malformed records, and scans
+    more than SCAN_CLOCK_SKEW in the future, are reported as SCAN_INVALID.
+
+    Returns one result dict per input record, in input order.
+    """
+    results = [None] * len(records)
+    pending = []
+    latest = timezone.now() + SCAN_CLOCK_SKEW
+
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            results[index] = _invalid(index, 'Each scan must be an object')
+            continue
+        card_id = clean_card_id(record.get('card_id'))
+        if card_id is None:
+            results[index] = _invalid(index, 'card_id must be a non-empty string')
+            continue
+        scanned_at = parse_scanned_at(record.get('scanned_at'))
+        if scanned_at is None:
+            results[index] = _invalid(index, 'scanned_at must be a valid ISO 8601 timestamp')
+            continue
+        if scanned_at > latest:
+            results[index] = _invalid(index, 'scanned_at is in the future')
+            continue
+        pending.append((scanned_at, index, card_id, clean_gate(gate or record.get('gate'))))
+
+    # Stable sort keeps the reader's order for identical timestamps
+    pending.sort(key=lambda item: (item[0], item[1]))
+
+    states = get_presences(card_id for _, _, card_id, _ in pending)
+    registry = gates.gate_registry() if any(item[3] for item in pending) else {}
+    changed = {}
+    logs = []
+    accepted = []
+    moves = []
+    events = []
+    alerts = []
+    taps = []
+
+    for scanned_at, index, card_id, gate in pending:
+        result = {'index': index, 'card_id': card_id, 'gate': gate,
+                  'scanned_at': scanned_at}
+        results[index] = result
+        gate_id = registry.get(gate)
+        taps.append((gate_id, result, scanned_at))
+
+        state = states.get(card_id)
+        if state is None:
+            result['status'] = SCAN_UNKNOWN_CARD
+            continue
+
+        result.update(student_id=state['student_id'], name=state['name'])
+
+        last_timestamp = state['last_timestamp']
+        if last_timestamp and scanned_at < last_timestamp:
+            result['status'] = SCAN_OUT_OF_ORDER
+            continue
+
+        action = next_action(state, scanned_at)
+        if action is not None and not claim_scan(card_id, scanned_at):
+            # A live tap of the card got there first
+            action = None
+        alerts.extend(anomalies.build_alerts(
+            state['student_id'], card_id, scanned_at, gate, anomalies.detect(state, scanned_at, gate, action)
+        ))
+        if action is None:
+            result['status'] = SCAN_DEBOUNCED
+            continue
+
+        moves.append((action, occupancy_gate(state, action, gate)))
+        events.append(livefeed.scan_event(state, action, scanned_at, gate))
+        state = scanned_state(state, action, scanned_at, gate)
+        states[card_id] = changed[card_id] = state
+
+        logs.append(EntryLog(student_id=state['student_id'], timestamp=scanned_at, action=action, gate_id=gate_id))
+        accepted.append(result)
+        result.update(status=SCAN_ACCEPTED, action=action,
+                      message=scan_message(state['name'], action))
+
+    anomalies.save_alerts(alerts)
+    throughput.count_taps((gate_id, result['status'], scanned_at) for gate_id, result, scanned_at in taps)
+    if logs:
+        try:
+            persist_scans(logs)
+        except Exception:
+            for card_id in changed:
+                release_scan(card_id)
+            raise
+        for result, log in zip(accepted, logs):
+            result['log_id'] = log.pk
+        set_presences(changed)
+        occupancy.apply_changes(moves)
+        livefeed.publish(events)
+
+    return results
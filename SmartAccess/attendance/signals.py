@@ -0,0 +1,113 @@
+"""
+Keep the cached presence state consistent with changes made outside the
+scan path (card assignment, removal, student edits and deletion), mirror
+student cards into the card registry, log card changes to the reader roster,
+and drop cached cards, gates, readers, terms and the punctuality policy when
+they change (rebuilding the attendance bitmaps' late bits for the latter).
+"""
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .bitmaps import forget_terms, rebuild_late_terms
+from .cards import forget_cards, sync_student_card
+from .gates import forget_gates
+from .models import Card, Gate, Holiday, PunctualityPolicy, Reader, Term
+from .punctuality import forget_policy
+from .presence import forget_presence
+from .roster import record_card_change
+from students.models import Student
+
+
+@receiver(pre_save, sender=Student)
+def remember_previous_card(sender, instance, **kwargs):
+    instance._previous_nfc_uid = None
+    if instance.pk:
+        instance._previous_nfc_uid = Student.objects.filter(pk=instance.pk)\
+            .values_list('nfc_uid', flat=True).first()
+
+
+@receiver(post_save, sender=Student)
+def invalidate_presence_on_save(sender, instance, **kwargs):
+    previous_uid = getattr(instance, '_previous_nfc_uid', None)
+    forget_presence(instance.nfc_uid, previous_uid)
+    record_card_change(instance.pk, previous_uid, instance.nfc_uid or None)
+    sync_student_card(instance, previous_uid)
+
+
+@receiver(post_delete, sender=Student)
+def invalidate_presence_on_delete(sender, instance, **kwargs):
+    forget_presence(instance.nfc_uid)
+    record_card_change(None, instance.nfc_uid, None)
+
+
+@receiver(pre_save, sender=Card)
+def remember_previous_uid(sender, instance, **kwargs):
+    instance._previous_uid = None
+    if instance.pk:
+        instance._previous_uid = Card.objects.filter(pk=instance.pk).values_list('uid', flat=True).first()
+
+
+@receiver(post_save, sender=Card)
+def invalidate_card_on_save(sender, instance, **kwargs):
+    previous_uid = getattr(instance, '_previous_uid', None)
+    forget_cards(instance.uid, previous_uid)
+    forget_presence(instance.uid, previous_uid)
+    if instance.kind == 'student' and instance.status != 'active' and instance.student_id:
+        # A lost or revoked card is no longer the student's card
+        if Student.objects.filter(pk=instance.student_id, nfc_uid=instance.uid).update(nfc_uid=None):
+            record_card_change(instance.student_id, instance.uid, None)
+
+
+@receiver(post_delete, sender=Card)
+def invalidate_card_on_delete(sender, instance, **kwargs):
+    forget_cards(instance.uid)
+    forget_presence(instance.uid)
+
+
+@receiver(post_save, sender=Gate)
+@receiver(post_delete, sender=Gate)
+def invalidate_gate(sender, instance, **kwargs):
+    # Cached readers carry the gate's name and status
+    forget_gates(Reader.objects.filter(gate_id=instance.pk).values_list('key_hash', flat=True))
+
+
+@receiver(pre_save, sender=Reader)
+def remember_previous_key(sender, instance, **kwargs):
+    instance._previous_key_hash = None
+    if instance.pk:
+        instance._previous_key_hash = Reader.objects.filter(pk=instance.pk)\
+            .values_list('key_hash', flat=True).first()
+
+
+@receiver(post_save, sender=Reader)
+@receiver(post_delete, sender=Reader)
+def invalidate_reader(sender, instance, **kwargs):
+    forget_gates([instance.key_hash, getattr(instance, '_previous_key_hash', None)])
+
+
+@receiver(post_save, sender=Term)
+@receiver(post_delete, sender=Term)
+def invalidate_terms(sender, instance, **kwargs):
+    forget_terms()
+
+
+@receiver(pre_save, sender=Holiday)
+def remember_previous_date(sender, instance, **kwargs):
+    instance._previous_date = None
+    if instance.pk:
+        instance._previous_date = Holiday.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+
+
+@receiver(post_save, sender=PunctualityPolicy)
+@receiver(post_delete, sender=PunctualityPolicy)
+@receiver(post_save, sender=Holiday)
+@receiver(post_delete, sender=Holiday)
+def invalidate_policy(sender, instance, **kwargs):
+    forget_policy()
+    # Late bits were set under the old policy; rebuild once the change is visible
+    dates = None
+    if sender is Holiday:
+        dates = [instance.date, getattr(instance, '_previous_date', None)]
+    transaction.on_commit(lambda: rebuild_late_terms(dates))
@@ -1,3 +1,931 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import zoneinfo
+from datetime import date, datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import Group, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from SmartAccess.localdates import CAMPUS_TIME_ZONE, campus_localdate
+from SmartAccess.pagination import encode_cursor, keyset_paginate
+from SmartAccess.testing import TEST_CACHES, CachedTestCase
+from attendance import benchmark, bitmaps, livefeed, occupancy, throughput
+from attendance.analytics import late_mask, load_scans
+from attendance.anomalies import RAPID_TOGGLE_SCANS, detect_in_history
+from attendance.gates import issue_reader_key
+from attendance.imports import ImportStats, import_scan_files
+from attendance.models import (
+    AttendanceBitmap, Card, DailyAttendanceSummary, EntryLog, Gate, GateThroughput, Holiday, PunctualityPolicy,
+    Reader, ScanAlert, Term, Visit, VisitStats,
+)
+from attendance.punctuality import current_policy, is_late, late_filter
+from attendance.reports import REPORT_HEADERS, build_attendance_workbook
+from attendance.rollup import rebuild_summaries
+from attendance.services import (
+    SCAN_ACCEPTED, SCAN_BATCH_LIMIT, SCAN_CLOCK_SKEW, SCAN_DEBOUNCED, SCAN_INVALID, SCAN_OUT_OF_ORDER,
+    SCAN_UNKNOWN_CARD, arecord_scan, claim_scan, debounce_key, record_scan, record_scan_batch,
+)
+from attendance.visits import rebuild_visits, visit_summary
+from attendance.writebehind import WriteBehindQueue, write_behind
+from students.models import Student
+
+
+class ScanTestCase(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = Student.objects.create(name='Ayesha Khan', roll_number='CS-001', nfc_uid='A1B2C3D4')
+
+    def post_json(self, url, payload, **headers):
+        return self.client.post(url, json.dumps(payload), content_type='application/json', headers=headers)
+
+
+class RecordScanTests(ScanTestCase):
+    def test_taps_toggle_in_and_out(self):
+        now = timezone.now()
+        first = record_scan('A1B2C3D4', now=now)
+        second = record_scan('A1B2C3D4', now=now + timedelta(minutes=5))
+
+        self.assertEqual((first['status'], first['action']), (SCAN_ACCEPTED, 'in'))
+        self.assertEqual((second['status'], second['action']), (SCAN_ACCEPTED, 'out'))
+        self.assertEqual(list(EntryLog.objects.order_by('timestamp').values_list('action', flat=True)), ['in', 'out'])
+        self.student.refresh_from_db()
+        self.assertFalse(self.student.is_in_university)
+
+    def test_repeated_tap_is_debounced(self):
+        now = timezone.now()
+        record_scan('A1B2C3D4', now=now)
+        result = record_scan('A1B2C3D4', now=now + timedelta(seconds=5))
+
+        self.assertEqual(result['status'], SCAN_DEBOUNCED)
+        self.assertEqual(EntryLog.objects.count(), 1)
+
+    def test_unknown_card(self):
+        self.assertEqual(record_scan('FFFFFFFF')['status'], SCAN_UNKNOWN_CARD)
+        self.assertFalse(EntryLog.objects.exists())
+
+
+class NfcScanApiTests(ScanTestCase):
+    def test_scan_checks_in(self):
+        response = self.post_json(reverse('nfc_scan_api'), {'card_id': 'A1B2C3D4'})
+
+        self.assertEqual(response.json(), {'success': True, 'message': 'Ayesha Khan checked in'})
+        self.student.refresh_from_db()
+        self.assertTrue(self.student.is_in_university)
+
+    def test_missing_card_id(self):
+        response = self.post_json(reverse('nfc_scan_api'), {})
+        self.assertEqual(response.json(), {'success': False, 'error': 'No card_id provided'})
+
+
+class BatchScanApiTests(ScanTestCase):
+    def post_batch(self, scans):
+        return self.post_json(reverse('nfc_scan_batch_api'), {'scans': scans})
+
+    def test_scans_are_applied_in_timestamp_order(self):
+        start = timezone.now() - timedelta(hours=2)
+        response = self.post_batch([
+            {'card_id': 'A1B2C3D4', 'scanned_at': (start + timedelta(hours=1)).isoformat()},
+            {'card_id': 'A1B2C3D4', 'scanned_at': start.isoformat()},
+            {'card_id': 'A1B2C3D4', 'scanned_at': (start + timedelta(seconds=10)).isoformat()},
+        ])
+
+        data = response.json()
+        self.assertEqual(data['accepted'], 2)
+        self.assertEqual([(r['status'], r.get('action')) for r in data['results']], [
+            (SCAN_ACCEPTED, 'out'), (SCAN_ACCEPTED, 'in'), (SCAN_DEBOUNCED, None),
+        ])
+        self.assertEqual(EntryLog.objects.count(), 2)
+
+    def test_malformed_records_are_reported_per_record(self):
+        now = timezone.now()
+        response = self.post_batch([
+            {'card_id': 'A1B2C3D4', 'scanned_at': '2026-13-45T08:00:00'},
+            {'card_id': ['A1B2C3D4'], 'scanned_at': now.isoformat()},
+            {'card_id': 'A1B2C3D4', 'scanned_at': 12345},
+            'A1B2C3D4',
+            {'card_id': 'A1B2C3D4', 'scanned_at': now.isoformat()},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, [SCAN_INVALID] * 4 + [SCAN_ACCEPTED])
+
+    def test_future_scans_are_rejected(self):
+        future = timezone.now() + timedelta(hours=1)
+        response = self.post_batch([{'card_id': 'A1B2C3D4', 'scanned_at': future.isoformat()}])
+
+        result = response.json()['results'][0]
+        self.assertEqual((result['status'], result['error']), (SCAN_INVALID, 'scanned_at is in the future'))
+        self.assertFalse(EntryLog.objects.exists())
+        # The live path is not blocked by the rejected scan
+        self.assertEqual(record_scan('A1B2C3D4')['status'], SCAN_ACCEPTED)
+
+    def test_batch_respects_a_live_debounce_claim(self):
+        now = timezone.now()
+        self.assertTrue(claim_scan('A1B2C3D4', now))
+
+        response = self.post_batch([{'card_id': 'A1B2C3D4', 'scanned_at': now.isoformat()}])
+
+        self.assertEqual(response.json()['results'][0]['status'], SCAN_DEBOUNCED)
+        self.assertFalse(EntryLog.objects.exists())
+
+    def test_batch_claims_the_debounce_window(self):
+        now = timezone.now()
+        self.post_batch([{'card_id': 'A1B2C3D4', 'scanned_at': now.isoformat()}])
+        self.assertFalse(claim_scan('A1B2C3D4', now + timedelta(seconds=1)))
+
+    def test_clock_skew_is_tolerated_up_to_the_limit(self):
+        now = timezone.now()
+        results = record_scan_batch([
+            {'card_id': 'A1B2C3D4', 'scanned_at': (now + SCAN_CLOCK_SKEW - timedelta(seconds=5)).isoformat()},
+            {'card_id': 'A1B2C3D4', 'scanned_at': (now + SCAN_CLOCK_SKEW + timedelta(seconds=5)).isoformat()},
+        ])
+
+        self.assertEqual([result['status'] for result in results], [SCAN_ACCEPTED, SCAN_INVALID])
+        self.assertEqual(EntryLog.objects.count(), 1)
+
+    def test_scans_older_than_the_last_action_are_out_of_order(self):
+        now = timezone.now()
+        record_scan('A1B2C3D4', now=now - timedelta(minutes=5))
+
+        results = record_scan_batch([
+            {'card_id': 'A1B2C3D4', 'scanned_at': (now - timedelta(hours=1)).isoformat()},
+            {'card_id': 'A1B2C3D4', 'scanned_at': now.isoformat()},
+        ])
+
+        self.assertEqual([(r['status'], r.get('action')) for r in results], [
+            (SCAN_OUT_OF_ORDER, None), (SCAN_ACCEPTED, 'out'),
+        ])
+        self.assertEqual(list(EntryLog.objects.order_by('timestamp').values_list('action', flat=True)), ['in', 'out'])
+
+    def test_debounce_claims_inside_a_batch(self):
+        Student.objects.create(name='Bilal Shah', roll_number='CS-002', nfc_uid='E5F6A7B8')
+        start = timezone.now() - timedelta(hours=1)
+        scans = [
+            ('A1B2C3D4', start),
+            ('E5F6A7B8', start + timedelta(seconds=1)),
+            ('A1B2C3D4', start + timedelta(seconds=10)),
+            ('A1B2C3D4', start + timedelta(seconds=45)),
+        ]
+
+        results = record_scan_batch([{'card_id': card_id, 'scanned_at': at.isoformat()} for card_id, at in scans])
+
+        self.assertEqual([(r['status'], r.get('action')) for r in results], [
+            (SCAN_ACCEPTED, 'in'), (SCAN_ACCEPTED, 'in'), (SCAN_DEBOUNCED, None), (SCAN_ACCEPTED, 'out'),
+        ])
+        # Each card's window is now held by its last accepted scan
+        self.assertFalse(claim_scan('A1B2C3D4', start + timedelta(seconds=50)))
+        self.assertFalse(claim_scan('E5F6A7B8', start + timedelta(seconds=5)))
+
+    def test_failed_batch_releases_its_claims(self):
+        now = timezone.now()
+        with mock.patch('attendance.services.persist_scans', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                record_scan_batch([{'card_id': 'A1B2C3D4', 'scanned_at': now.isoformat()}])
+
+        self.assertFalse(EntryLog.objects.exists())
+        self.assertEqual(record_scan('A1B2C3D4', now=now + timedelta(seconds=1))['status'], SCAN_ACCEPTED)
+
+    def test_empty_and_oversized_batches(self):
+        self.assertEqual(self.post_batch([]).status_code, 400)
+        scans = [{'card_id': 'A1B2C3D4', 'scanned_at': timezone.now().isoformat()}] * (SCAN_BATCH_LIMIT + 1)
+        self.assertEqual(self.post_batch(scans).status_code, 413)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class WriteBehindTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = Student.objects.create(name='Ayesha Khan', roll_number='CS-001', nfc_uid='A1B2C3D4')
+        # Flush by hand instead of from the worker thread
+        patcher = mock.patch.object(WriteBehindQueue, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def log(self, minutes, action='in'):
+        return EntryLog(student_id=self.student.id, action=action,
+                        timestamp=timezone.now() - timedelta(minutes=minutes))
+
+    def test_bad_row_is_dead_lettered_and_the_rest_are_saved(self):
+        queue = WriteBehindQueue(batch_size=10)
+        queue.put(self.log(30, 'in'))
+        queue.put(self.log(20, action=None))
+        queue.put(self.log(10, 'out'))
+
+        with self.assertLogs('attendance.writebehind.deadletter') as logs:
+            with self.assertLogs('attendance.writebehind', 'ERROR'):
+                self.assertEqual(queue.flush(), 2)
+
+        self.assertEqual(list(EntryLog.objects.order_by('timestamp').values_list('action', flat=True)), ['in', 'out'])
+        stats = queue.stats()
+        self.assertEqual((stats['queue_depth'], stats['failed_flushes'], stats['dead_lettered']), (0, 1, 1))
+        self.assertEqual(json.loads(logs.records[0].getMessage())['student_id'], self.student.id)
+        # Nothing is left to retry
+        self.assertEqual(queue.flush(), 0)
+        self.assertEqual(queue.stats()['failed_flushes'], 1)
+
+    def test_transient_errors_requeue_the_batch(self):
+        queue = WriteBehindQueue(batch_size=10)
+        queue.put(self.log(10))
+
+        with mock.patch('attendance.services.persist_scans', side_effect=OperationalError('database is locked')):
+            with self.assertLogs('attendance.writebehind', 'ERROR'):
+                self.assertEqual(queue.flush(), 0)
+
+        self.assertEqual((queue.stats()['queue_depth'], queue.stats()['dead_lettered']), (1, 0))
+        self.assertEqual(queue.flush(), 1)
+        self.assertEqual(EntryLog.objects.count(), 1)
+
+    def test_async_scan_seeds_a_cold_occupancy_counter(self):
+        other = Student.objects.create(name='Bilal Shah', roll_number='CS-002', nfc_uid='B1B2B3B4')
+        EntryLog.objects.create(student=other, timestamp=timezone.now() - timedelta(hours=1), action='in')
+        cache.delete(occupancy.OCCUPANCY_KEY)
+
+        result = async_to_sync(arecord_scan)('A1B2C3D4')
+
+        self.assertEqual(result['action'], 'in')
+        # The scan is still queued, yet counted
+        self.assertFalse(EntryLog.objects.filter(student=self.student).exists())
+        self.assertEqual(cache.get(occupancy.OCCUPANCY_KEY), 2)
+        write_behind.flush()
+        self.assertEqual(occupancy.count_inside(), 2)
+
+    def test_full_queue_drops_and_counts_scans(self):
+        queue = WriteBehindQueue(batch_size=10, max_queue=2)
+        self.assertTrue(queue.put(self.log(3)))
+        self.assertTrue(queue.put(self.log(2)))
+        with self.assertLogs('attendance.writebehind.deadletter'):
+            self.assertFalse(queue.put(self.log(1)))
+
+        self.assertEqual((queue.stats()['queue_depth'], queue.stats()['dropped']), (2, 1))
+
+
+class RosterApiAccessTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        Student.objects.create(name='Ayesha Khan', roll_number='CS-001', nfc_uid='A1B2C3D4')
+        gate = Gate.objects.create(name='Main Gate')
+        self.key = issue_reader_key(Reader.objects.create(gate=gate, name='Main Gate reader 1'))
+
+    def test_anonymous_requests_are_refused(self):
+        self.assertEqual(self.client.get(reverse('roster_snapshot_api')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('roster_delta_api'), {'since': 0}).status_code, 401)
+
+    def test_unknown_reader_key_is_refused(self):
+        response = self.client.get(reverse('roster_snapshot_api'), headers={'X-Reader-Key': 'not-a-key'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_non_staff_users_are_refused(self):
+        self.client.force_login(User.objects.create_user('student', password='pw'))
+        self.assertEqual(self.client.get(reverse('roster_snapshot_api')).status_code, 401)
+
+    def test_reader_key_gets_the_roster(self):
+        response = self.client.get(reverse('roster_snapshot_api'), headers={'X-Reader-Key': self.key})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'SAR1'))
+
+        delta = self.client.get(reverse('roster_delta_api'), {'since': 0}, headers={'X-Reader-Key': self.key})
+        self.assertEqual(delta.status_code, 200)
+
+    def test_teachers_and_admins_get_the_roster(self):
+        teacher = User.objects.create_user('teacher', password='pw')
+        teacher.groups.add(Group.objects.get_or_create(name='Teachers')[0])
+        for user in (teacher, User.objects.create_superuser('admin', password='pw')):
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(reverse('roster_snapshot_api')).status_code, 200)
+
+
+class ScanLogImportTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = Student.objects.create(name='Ayesha Khan', roll_number='CS-001', nfc_uid='A1B2C3D4')
+        lost = Student.objects.create(name='Bilal Shah', roll_number='CS-002', nfc_uid='B1B2B3B4')
+        Card.objects.filter(uid=lost.nfc_uid).update(status='lost')
+
+        handle = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='')
+        self.addCleanup(os.remove, handle.name)
+        with handle:
+            handle.write(
+                'card_id,scanned_at\n'
+                'A1B2C3D4,2026-03-02T08:00:00+00:00\n'
+                'A1B2C3D4,2026-13-45T08:00:00\n'
+                'A1B2C3D4,99999999999999\n'
+                'A1B2C3D4,not a time\n'
+                ',2026-03-02T09:00:00+00:00\n'
+                'FFFFFFFF,2026-03-02T09:00:00+00:00\n'
+                'B1B2B3B4,2026-03-02T09:00:00+00:00\n'
+                'A1B2C3D4,1772442000\n'
+            )
+        self.path = handle.name
+
+    def test_malformed_rows_are_counted_and_skipped(self):
+        stats = ImportStats()
+        changed = import_scan_files([self.path], stats, chunk_rows=3)
+
+        self.assertEqual(changed, [self.student.id])
+        self.assertEqual((stats.read, stats.invalid, stats.unknown_cards, stats.inserted), (8, 4, 2, 2))
+        self.assertEqual(list(EntryLog.objects.order_by('timestamp').values_list('action', flat=True)), ['in', 'out'])
+
+    def test_command_imports_the_file(self):
+        out = io.StringIO()
+        call_command('import_scan_log', self.path, stdout=out)
+
+        self.assertIn('4 invalid, 2 unknown cards, 1 students', out.getvalue())
+        self.assertEqual(EntryLog.objects.count(), 2)
+
+
+class AttendanceBitmapTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = campus_localdate()
+        self.term = Term.objects.create(name='Spring', start_date=self.today - timedelta(days=10),
+                                        end_date=self.today + timedelta(days=10))
+        self.first = Student.objects.create(name='Ayesha Khan', roll_number='CS-001')
+        self.second = Student.objects.create(name='Bilal Shah', roll_number='CS-002')
+
+    def campus_bits(self):
+        row = AttendanceBitmap.objects.filter(term=self.term, student__isnull=True).first()
+        return bytes(row.present) if row else b''
+
+    def test_rolled_back_scan_does_not_block_the_campus_bit(self):
+        now = timezone.now()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                bitmaps.mark_present(self.first.id, now)
+                raise RuntimeError('scan insert failed')
+
+        self.assertEqual(self.campus_bits(), b'')
+        with self.captureOnCommitCallbacks(execute=True):
+            bitmaps.mark_present(self.second.id, now)
+
+        self.assertTrue(bitmaps.has_bit(self.campus_bits(), 10))
+        self.assertEqual(cache.get(f'{bitmaps.CAMPUS_DAY_KEY_PREFIX}{self.term.id}:10'), True)
+
+    def test_policy_changes_rebuild_the_late_bits(self):
+        # 08:30 campus time today: on time under the default 9:00 cutoff
+        arrival = timezone.make_aware(datetime.combine(self.today, time(8, 30)), CAMPUS_TIME_ZONE)
+        EntryLog.objects.create(student=self.first, timestamp=arrival, action='in')
+        bitmaps.rebuild_bitmaps(self.term)
+
+        def late_bit():
+            row = AttendanceBitmap.objects.get(term=self.term, student=self.first)
+            return bitmaps.has_bit(bytes(row.late), 10)
+
+        self.assertFalse(late_bit())
+        with self.captureOnCommitCallbacks(execute=True):
+            policy = PunctualityPolicy.objects.create(name='Early', **{
+                field: time(8, 0) for field in PunctualityPolicy.CUTOFF_FIELDS
+            })
+        self.assertTrue(late_bit())
+        self.assertEqual(
+            late_bit(),
+            EntryLog.objects.filter(student=self.first).filter(late_filter('timestamp')).exists(),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Holiday.objects.create(date=self.today, name='Founders Day')
+        self.assertFalse(late_bit())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            policy.delete()
+            Holiday.objects.all().delete()
+        self.assertFalse(late_bit())
+
+
+class IdempotencyKeyTests(ScanTestCase):
+    def setUp(self):
+        super().setUp()
+        Student.objects.create(name='Bilal Shah', roll_number='CS-002', nfc_uid='B1B2B3B4')
+
+    def scan(self, card_id, key='retry-1', **extra):
+        return self.client.post(reverse('nfc_scan_api'), json.dumps({'card_id': card_id}),
+                                content_type='application/json', headers={'Idempotency-Key': key}, **extra)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.scan('A1B2C3D4')
+        retry = self.scan('A1B2C3D4')
+
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(EntryLog.objects.count(), 1)
+
+    def test_reused_key_with_a_different_body_is_rejected(self):
+        self.scan('A1B2C3D4')
+        response = self.scan('B1B2B3B4')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(EntryLog.objects.count(), 1)
+
+    def test_keyless_readers_do_not_share_keys(self):
+        self.scan('A1B2C3D4', REMOTE_ADDR='10.0.0.1')
+        response = self.scan('B1B2B3B4', REMOTE_ADDR='10.0.0.2')
+
+        self.assertEqual(response.json()['message'], 'Bilal Shah checked in')
+        self.assertEqual(EntryLog.objects.count(), 2)
+
+    def test_unexpected_failure_is_not_stored(self):
+        with mock.patch('attendance.views.record_scan', side_effect=OperationalError('database is locked')):
+            with self.assertLogs('attendance.views', 'ERROR'):
+                failed = self.scan('A1B2C3D4')
+        retry = self.scan('A1B2C3D4')
+
+        self.assertEqual(failed.status_code, 500)
+        self.assertEqual(retry.status_code, 200)
+        self.assertTrue(retry.json()['success'])
+        self.assertFalse(retry.has_header('Idempotent-Replayed'))
+        self.assertEqual(EntryLog.objects.count(), 1)
+
+
+class DebounceClaimTests(CachedTestCase):
+    def test_distant_claim_is_taken_over_once(self):
+        now = timezone.now()
+        self.assertTrue(claim_scan('A1B2C3D4', now - timedelta(hours=1)))
+
+        self.assertTrue(claim_scan('A1B2C3D4', now))
+        self.assertFalse(claim_scan('A1B2C3D4', now + timedelta(seconds=1)))
+
+    def test_takeover_in_progress_wins(self):
+        now = timezone.now()
+        claim_scan('A1B2C3D4', now - timedelta(hours=1))
+        cache.add(f'{debounce_key("A1B2C3D4")}:takeover', True)
+
+        self.assertFalse(claim_scan('A1B2C3D4', now))
+
+
+class ScanAlertTests(ScanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user('teacher')
+        self.teacher.groups.add(Group.objects.get_or_create(name='Teachers')[0])
+
+    def test_rapid_toggles_are_recorded_once(self):
+        start = timezone.now() - timedelta(hours=1)
+        EntryLog.objects.bulk_create([
+            EntryLog(student=self.student, timestamp=start + timedelta(minutes=i), action=('in', 'out')[i % 2])
+            for i in range(RAPID_TOGGLE_SCANS)
+        ])
+
+        self.assertEqual(detect_in_history(EntryLog.objects.all()), 1)
+        self.assertEqual(detect_in_history(EntryLog.objects.all()), 0)
+        self.assertEqual(ScanAlert.objects.get().kind, 'rapid_toggle')
+
+    def test_alerts_are_for_teachers_only(self):
+        alert = ScanAlert.objects.create(kind='rapid_toggle', student=self.student, occurred_at=timezone.now())
+        student_user = User.objects.create_user('student')
+        self.student.user = student_user
+        self.student.save()
+
+        self.client.force_login(student_user)
+        self.assertRedirects(self.client.get(reverse('scan_alerts')), reverse('dashboard_redirect'),
+                             fetch_redirect_response=False)
+        self.client.post(reverse('resolve_scan_alert', args=[alert.pk]))
+        alert.refresh_from_db()
+        self.assertFalse(alert.is_resolved)
+
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get(reverse('scan_alerts')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('resolve_scan_alert', args=[alert.pk])).status_code, 405)
+        self.client.post(reverse('resolve_scan_alert', args=[alert.pk]))
+        alert.refresh_from_db()
+        self.assertTrue(alert.is_resolved)
+
+
+class LocalDateBucketTests(ScanTestCase):
+    def test_hour_filters_use_the_date_hour_index(self):
+        today = campus_localdate()
+        record_scan('A1B2C3D4')
+
+        logs = EntryLog.objects.on_date(today).from_hour(0).before_hour(24)
+        self.assertEqual(logs.count(), 1)
+        self.assertIn('entrylog_date_hour_idx', logs.explain())
+
+
+class LiveFeedTests(CachedTestCase):
+    def event(self, name):
+        return {'student_id': 1, 'name': name, 'roll_number': 'CS-001', 'action': 'in', 'gate': None,
+                'timestamp': timezone.now()}
+
+    async def test_one_poll_wakes_every_subscriber(self):
+        with mock.patch.object(livefeed.cache, 'aget', wraps=livefeed.cache.aget) as aget:
+            waiters = [asyncio.ensure_future(livefeed.wait_for_events(0, timeout=5)) for _ in range(20)]
+            await asyncio.sleep(0.05)
+            await sync_to_async(livefeed.publish)([self.event('Ayesha Khan')])
+            results = await asyncio.gather(*waiters)
+
+        self.assertTrue(all([event['name'] for event in events] == ['Ayesha Khan'] for events, _ in results))
+        # The watcher's polls, not one per subscriber
+        self.assertLessEqual(aget.call_count, 3)
+
+    async def test_polling_backs_off_while_idle(self):
+        with mock.patch.object(livefeed, 'FEED_POLL_INTERVAL', 0.01), \
+                mock.patch.object(livefeed, 'FEED_IDLE_POLL_INTERVAL', 0.16), \
+                mock.patch.object(livefeed.cache, 'aget', wraps=livefeed.cache.aget) as aget:
+            events, cursor = await livefeed.wait_for_events(0, timeout=0.6)
+
+        self.assertEqual((events, cursor), ([], 0))
+        # 0.01, 0.02, 0.04, 0.08, then 0.16 s apart instead of 60 polls
+        self.assertLess(aget.call_count, 10)
+
+    def test_wsgi_request_gets_pending_events_and_a_cursor(self):
+        first = livefeed.publish([self.event('Ayesha Khan')])
+        livefeed.publish([self.event('Bilal Shah')])
+        self.client.force_login(User.objects.create_user('teacher'))
+
+        response = self.client.get(reverse('live_gate_feed'), headers={'Last-Event-ID': str(first)})
+
+        body = response.content.decode()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn(f'retry: {livefeed.FEED_WSGI_RETRY_SECONDS * 1000}', body)
+        self.assertNotIn('Ayesha Khan', body)
+        self.assertIn('Bilal Shah', body)
+        self.assertTrue(body.endswith(f'id: {first + 1}\n\n'))
+
+
+class RollupTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.yesterday, self.today = date(2026, 3, 2), date(2026, 3, 3)
+        for index, name in enumerate(['Ayesha Khan', 'Bilal Shah', 'Sana Tariq']):
+            Student.objects.create(name=name, roll_number=f'CS-00{index + 1}', nfc_uid=f'CARD{index + 1}')
+
+    def at(self, day, hour, minute=0, second=0):
+        return datetime.combine(day, time(hour, minute, second), tzinfo=CAMPUS_TIME_ZONE)
+
+    def summaries(self):
+        return list(DailyAttendanceSummary.objects.order_by('date', 'student_id').values(
+            'date', 'student_id', 'first_in', 'last_out', 'last_in', 'total_seconds', 'is_late',
+            'check_in_count', 'check_out_count', 'students_present', 'late_count',
+        ))
+
+    def test_incremental_rollup_matches_a_rebuild(self):
+        scans = [
+            ('CARD1', self.at(self.yesterday, 8)),
+            ('CARD1', self.at(self.yesterday, 8, 0, 10)),
+            ('CARD1', self.at(self.yesterday, 12)),
+            ('CARD1', self.at(self.yesterday, 13)),
+            ('CARD1', self.at(self.yesterday, 17)),
+            ('CARD2', self.at(self.yesterday, 22)),
+            ('CARD2', self.at(self.today, 1)),
+            ('CARD1', self.at(self.today, 8, 15)),
+            ('CARD2', self.at(self.today, 9, 30)),
+            ('CARD3', self.at(self.today, 7, 50)),
+            ('CARD3', self.at(self.today, 7, 50, 5)),
+        ]
+        statuses = [record_scan(card_id, now=now)['status'] for card_id, now in sorted(scans, key=lambda scan: scan[1])]
+        self.assertEqual(statuses.count(SCAN_DEBOUNCED), 2)
+
+        with mock.patch('attendance.management.commands.auto_checkout.campus_localdate', return_value=self.today):
+            call_command('auto_checkout', stdout=io.StringIO())
+        self.assertEqual(EntryLog.objects.filter(auto_generated=True).count(), 3)
+
+        incremental = self.summaries()
+        rebuild_summaries(self.yesterday, self.today)
+
+        self.assertTrue(incremental)
+        self.assertEqual(self.summaries(), incremental)
+
+
+class VisitTests(ScanTestCase):
+    def at(self, day, hour, minute=0):
+        return datetime.combine(day, time(hour, minute), tzinfo=CAMPUS_TIME_ZONE)
+
+    def visits(self):
+        return list(Visit.objects.order_by('check_in').values_list('check_in', 'check_out', 'duration_seconds'))
+
+    def test_scans_open_and_close_visits(self):
+        day = date(2026, 3, 2)
+        record_scan('A1B2C3D4', now=self.at(day, 8))
+        self.assertEqual(self.visits(), [(self.at(day, 8), None, None)])
+
+        record_scan('A1B2C3D4', now=self.at(day, 9, 30))
+        self.assertEqual(self.visits(), [(self.at(day, 8), self.at(day, 9, 30), 5400)])
+        stats = VisitStats.objects.get(student=self.student)
+        self.assertEqual((stats.total_visits, stats.completed_visits, stats.total_seconds), (1, 1, 5400))
+
+    def test_summary_spans_midnight_and_auto_checkout(self):
+        day, next_day = date(2026, 3, 2), date(2026, 3, 3)
+        record_scan('A1B2C3D4', now=self.at(day, 22))
+        record_scan('A1B2C3D4', now=self.at(next_day, 1))
+        record_scan('A1B2C3D4', now=self.at(next_day, 8))
+        with mock.patch('attendance.management.commands.auto_checkout.campus_localdate', return_value=next_day):
+            call_command('auto_checkout', stdout=io.StringIO())
+
+        self.assertEqual(self.visits(), [
+            (self.at(day, 22), self.at(next_day, 1), 3 * 3600),
+            (self.at(next_day, 8), self.at(next_day, 18), 10 * 3600),
+        ])
+        self.assertEqual(visit_summary(self.student), {
+            'total_visits': 2, 'total_seconds': 13 * 3600, 'average_seconds': 6.5 * 3600,
+        })
+
+        incremental = self.visits()
+        rebuild_visits()
+        self.assertEqual(self.visits(), incremental)
+
+    def test_open_visit_counts_up_to_now(self):
+        day = date(2026, 3, 2)
+        record_scan('A1B2C3D4', now=self.at(day, 8))
+        record_scan('A1B2C3D4', now=self.at(day, 9))
+        record_scan('A1B2C3D4', now=self.at(day, 10))
+
+        with mock.patch('attendance.visits.timezone.now', return_value=self.at(day, 12)):
+            summary = visit_summary(self.student)
+
+        self.assertEqual(summary, {'total_visits': 2, 'total_seconds': 3 * 3600, 'average_seconds': 1.5 * 3600})
+
+
+class AutoCheckoutTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = date(2026, 3, 2)
+        user = User.objects.create_user('ayesha', email='ayesha@example.com')
+        self.inside = Student.objects.create(name='Ayesha Khan', roll_number='CS-001', nfc_uid='CARD1', user=user)
+        self.left = Student.objects.create(name='Bilal Shah', roll_number='CS-002', nfc_uid='CARD2')
+        self.late = Student.objects.create(name='Sana Tariq', roll_number='CS-003', nfc_uid='CARD3')
+        for card_id, hour in [('CARD1', 8), ('CARD2', 9), ('CARD2', 12), ('CARD3', 19)]:
+            record_scan(card_id, now=self.at(hour))
+
+    def at(self, hour):
+        return datetime.combine(self.day, time(hour), tzinfo=CAMPUS_TIME_ZONE)
+
+    def run_command(self, *args):
+        out = io.StringIO()
+        with mock.patch('attendance.management.commands.auto_checkout.campus_localdate', return_value=self.day):
+            call_command('auto_checkout', *args, stdout=out)
+        return out.getvalue()
+
+    def test_checks_out_students_still_inside_before_the_cutoff(self):
+        output = self.run_command()
+
+        checkouts = EntryLog.objects.filter(auto_generated=True)
+        self.assertEqual(
+            list(checkouts.values_list('student_id', 'action', 'timestamp')),
+            [(self.inside.id, 'out', self.at(18))],
+        )
+        flags = dict(Student.objects.values_list('id', 'is_in_university'))
+        self.assertEqual(flags, {self.inside.id: False, self.left.id: False, self.late.id: True})
+        self.assertEqual([message.to for message in mail.outbox], [['ayesha@example.com']])
+        self.assertIn('Auto-checked out 1 students', output)
+
+        # A second run finds nobody left to check out
+        self.run_command()
+        self.assertEqual(checkouts.count(), 1)
+
+    def test_dry_run_writes_nothing(self):
+        logs = list(EntryLog.objects.order_by('id').values_list('id', flat=True))
+        summaries = list(DailyAttendanceSummary.objects.order_by('id').values())
+
+        output = self.run_command('--dry-run')
+
+        self.assertIn(f'- student {self.inside.id}: checked in at 08:00', output)
+        self.assertEqual(list(EntryLog.objects.order_by('id').values_list('id', flat=True)), logs)
+        self.assertEqual(list(DailyAttendanceSummary.objects.order_by('id').values()), summaries)
+        self.assertTrue(Student.objects.get(id=self.inside.id).is_in_university)
+        self.assertEqual(mail.outbox, [])
+
+
+class KeysetPaginationTests(ScanTestCase):
+    def setUp(self):
+        super().setUp()
+        start = timezone.now().replace(microsecond=0)
+        # Two pairs share a timestamp, so pages must break ties on id
+        for offset in [0, 0, 60, 120, 120, 180, 240]:
+            EntryLog.objects.create(student=self.student, timestamp=start + timedelta(seconds=offset), action='in')
+        self.expected = list(EntryLog.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+
+    def ids(self, page):
+        return [log.id for log in page]
+
+    def test_next_cursors_walk_every_row_once(self):
+        pages, cursor = [], None
+        while True:
+            page = keyset_paginate(EntryLog.objects.all(), cursor=cursor, per_page=2, with_count=True)
+            pages.append(self.ids(page))
+            self.assertEqual(page.count, 7)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual([len(ids) for ids in pages], [2, 2, 2, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_previous_cursor_returns_the_earlier_page(self):
+        first = keyset_paginate(EntryLog.objects.all(), per_page=3)
+        second = keyset_paginate(EntryLog.objects.all(), cursor=first.next_cursor, per_page=3)
+        back = keyset_paginate(EntryLog.objects.all(), cursor=second.previous_cursor, per_page=3)
+
+        self.assertFalse(first.has_previous)
+        self.assertEqual(self.ids(second), self.expected[3:6])
+        self.assertEqual(self.ids(back), self.ids(first))
+        self.assertFalse(back.has_previous)
+        self.assertEqual(back.next_cursor, first.next_cursor)
+
+    def test_tampered_cursor_falls_back_to_the_first_page(self):
+        log = EntryLog.objects.first()
+        cursors = [
+            'not-a-cursor',
+            encode_cursor(log.timestamp, log.id, 'next')[:-3],
+            encode_cursor(log.timestamp, log.id, 'sideways'),
+            encode_cursor(log.timestamp, str(log.id), 'next'),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                page = keyset_paginate(EntryLog.objects.all(), cursor=cursor, per_page=2)
+                self.assertEqual(self.ids(page), self.expected[:2])
+                self.assertFalse(page.has_previous)
+
+
+class ThroughputFlushTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.gate = Gate.objects.create(name='Main Gate')
+        self.now = timezone.now().replace(second=30, microsecond=0)
+
+    def tap(self, count, status='accepted'):
+        throughput.count_taps([(self.gate.id, status, self.now)] * count)
+
+    def flushed(self):
+        return list(GateThroughput.objects.values_list('gate_id', 'taps', 'accepted', 'debounced', 'unknown_card'))
+
+    def test_reflushing_is_idempotent(self):
+        self.tap(3)
+        self.tap(1, 'debounced')
+
+        self.assertEqual(throughput.flush_counters(now=self.now), 1)
+        self.assertEqual(throughput.flush_counters(now=self.now), 1)
+        self.assertEqual(self.flushed(), [(self.gate.id, 4, 3, 1, 0)])
+
+        # Taps counted after a flush update the same row instead of adding to it
+        self.tap(2, 'unknown_card')
+        throughput.flush_counters(now=self.now)
+        self.assertEqual(self.flushed(), [(self.gate.id, 6, 3, 1, 2)])
+
+    def test_overlapping_flushes_lose_no_taps(self):
+        self.tap(2)
+        read_counters = throughput.read_counters
+
+        def read_then_overlap(*args):
+            counters = read_counters(*args)
+            if not overlapped:
+                overlapped.append(True)
+                # Taps and a second flush land while the first is between read and write
+                self.tap(3)
+                throughput.flush_counters(now=self.now)
+            return counters
+
+        overlapped = []
+        with mock.patch.object(throughput, 'read_counters', side_effect=read_then_overlap):
+            throughput.flush_counters(now=self.now)
+        # The slower flush wrote its older totals last...
+        self.assertEqual(self.flushed(), [(self.gate.id, 2, 2, 0, 0)])
+
+        # ...but the counters still hold every tap, so the next flush restores them
+        throughput.flush_counters(now=self.now)
+        self.assertEqual(self.flushed(), [(self.gate.id, 5, 5, 0, 0)])
+
+    def test_racing_first_taps_are_both_counted(self):
+        key = throughput.counter_key(self.gate.id, throughput.minute_of(self.now), 'accepted')
+        add = throughput.cache.add
+
+        def add_after_another_worker(*args, **kwargs):
+            add(key, 1)  # The other worker's tap creates the counter first
+            return add(*args, **kwargs)
+
+        with mock.patch.object(throughput.cache, 'add', side_effect=add_after_another_worker):
+            self.tap(1)
+
+        throughput.flush_counters(now=self.now)
+        self.assertEqual(self.flushed(), [(self.gate.id, 2, 2, 0, 0)])
+
+
+class LateMaskTests(ScanTestCase):
+    def test_late_mask_agrees_with_the_policy_checks(self):
+        karachi = zoneinfo.ZoneInfo('Asia/Karachi')
+        PunctualityPolicy.objects.create(
+            name='Karachi', time_zone='Asia/Karachi', grace_minutes=10, thursday_cutoff=time(8, 30),
+        )
+        Holiday.objects.create(date=date(2026, 3, 3), name='Founders Day')
+        arrivals = [
+            datetime(2026, 3, 2, 9, 9, 59, tzinfo=karachi),   # Monday, inside the grace period
+            datetime(2026, 3, 2, 9, 10, tzinfo=karachi),      # Monday, late
+            datetime(2026, 3, 3, 11, 0, tzinfo=karachi),      # Holiday
+            datetime(2026, 3, 4, 8, 0, tzinfo=karachi),       # Wednesday, on time
+            datetime(2026, 3, 5, 8, 45, tzinfo=karachi),      # Thursday's earlier cutoff
+            datetime(2026, 3, 7, 12, 0, tzinfo=karachi),      # Saturday, no cutoff
+        ]
+        for timestamp in arrivals:
+            EntryLog.objects.create(student=self.student, timestamp=timestamp, action='in')
+
+        scans = load_scans()
+        mask = late_mask(scans.timestamp, scans.day, current_policy())
+        logs = EntryLog.objects.order_by('timestamp', 'id')
+        late_ids = set(EntryLog.objects.filter(late_filter('timestamp')).values_list('id', flat=True))
+
+        expected = [False, True, False, False, True, False]
+        self.assertEqual(mask.tolist(), expected)
+        self.assertEqual([is_late(log.timestamp) for log in logs], expected)
+        self.assertEqual([log.id in late_ids for log in logs], expected)
+
+
+class AttendanceReportTests(ScanTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Student.objects.create(name='Bilal Shah', roll_number='CS-002', nfc_uid='E5F6A7B8')
+        logs = [
+            (self.student, datetime(2026, 3, 1, 17, 0), 'in'),     # Outside the range below
+            (self.student, datetime(2026, 3, 2, 8, 0), 'out'),
+            (self.student, datetime(2026, 3, 2, 9, 0), 'in'),
+            (self.student, datetime(2026, 3, 2, 12, 30), 'out'),
+            (self.student, datetime(2026, 3, 3, 8, 15), 'in'),
+            (self.other, datetime(2026, 3, 2, 22, 0), 'in'),
+            (self.other, datetime(2026, 3, 3, 1, 5), 'out'),
+        ]
+        for student, timestamp, action in logs:
+            timestamp = timestamp.replace(tzinfo=CAMPUS_TIME_ZONE)
+            EntryLog.objects.create(student=student, timestamp=timestamp, action=action)
+
+    def rows(self, content):
+        worksheet = openpyxl.load_workbook(io.BytesIO(content)).active
+        return [list(row) for row in worksheet.iter_rows(values_only=True)]
+
+    def test_report_pairs_sessions_within_the_date_range(self):
+        self.client.force_login(User.objects.create_user('teacher'))
+
+        response = self.client.get(reverse('generate_attendance_report'), {'start': '2026-03-02', 'end': '2026-03-03'})
+
+        self.assertEqual(self.rows(b''.join(response.streaming_content)), [
+            REPORT_HEADERS,
+            ['2026-03-02', 'Ayesha Khan', 'CS-001', None, '08:00', None, 'No Check In'],
+            ['2026-03-02', 'Ayesha Khan', 'CS-001', '09:00', '12:30', '3h 30m', 'Complete'],
+            ['2026-03-03', 'Ayesha Khan', 'CS-001', '08:15', None, None, 'No Check Out'],
+            ['2026-03-02', 'Bilal Shah', 'CS-002', '22:00', '01:05', '3h 5m', 'Complete'],
+        ])
+
+    def test_sessions_span_chunk_boundaries(self):
+        logs = EntryLog.objects.filter(student=self.student)
+        with build_attendance_workbook(logs, chunk_size=1) as chunked, build_attendance_workbook(logs) as whole:
+            chunked_rows, whole_rows = self.rows(chunked.read()), self.rows(whole.read())
+
+        self.assertEqual(chunked_rows, whole_rows)
+        self.assertEqual([row[-1] for row in chunked_rows[1:]], ['Complete', 'Complete', 'No Check Out'])
+
+
+class BenchmarkHarnessTests(CachedTestCase):
+    def test_seed_trace_and_cleanup(self):
+        campus = benchmark.seed_campus(students=20, days=2, buses=2)
+
+        self.assertEqual(len(campus['cards']), 20)
+        self.assertEqual(Card.objects.filter(uid__in=campus['cards']).count(), 20)
+        self.assertTrue(EntryLog.objects.filter(student__nfc_uid__in=campus['cards']).exists())
+        self.assertTrue(DailyAttendanceSummary.objects.exists())
+
+        trace = benchmark.build_trace(campus, duplicate_rate=0.5, unknown_rate=0.2)
+        self.assertEqual(trace, benchmark.build_trace(campus, duplicate_rate=0.5, unknown_rate=0.2))
+        gate_cards = [payload['card_id'] for endpoint, payload in trace if endpoint == benchmark.ENDPOINT_SCAN]
+        known = [card for card in gate_cards if card in campus['cards']]
+        self.assertTrue(any('UNKNOWN' in card for card in gate_cards))
+        self.assertGreater(len(known), len(set(known)))  # Some taps are repeated
+        self.assertLessEqual(set(known), set(campus['cards']))
+
+        self.assertGreater(benchmark.cleanup_campus(), 0)
+        self.assertIsNone(benchmark.load_campus())
+        self.assertFalse(Student.objects.exists())
+        self.assertFalse(EntryLog.objects.exists())
+
+    def test_outcomes_and_summary(self):
+        responses = [
+            (200, json.dumps({'success': True})),
+            (200, json.dumps({'success': False, 'error': 'Please wait before scanning again'})),
+            (200, json.dumps({'success': False, 'error': 'Card not recognized'})),
+            (500, json.dumps({'success': False, 'error': 'The scan could not be recorded, please retry'})),
+            (200, 'not json'),
+        ]
+        outcomes = [benchmark.classify(status_code, body) for status_code, body in responses]
+        self.assertEqual(outcomes, [
+            benchmark.OUTCOME_OK, benchmark.OUTCOME_DEBOUNCED, benchmark.OUTCOME_UNKNOWN,
+            benchmark.OUTCOME_ERROR, benchmark.OUTCOME_ERROR,
+        ])
+
+        samples = [
+            {'endpoint': benchmark.ENDPOINT_SCAN, 'latency_ms': float(latency), 'queries': 3, 'outcome': outcome}
+            for latency, outcome in zip([10, 20, 30, 40, 50], outcomes)
+        ]
+        report = benchmark.summarize(samples, elapsed=0.5)
+
+        overall = report['overall']
+        self.assertEqual((overall['requests'], overall['throughput_rps']), (5, 10.0))
+        self.assertEqual(overall['latency_ms']['p50'], 30.0)
+        self.assertEqual((overall['error_rate'], overall['debounce_rate']), (0.4, 0.2))
+        self.assertEqual(report['endpoints'][benchmark.ENDPOINT_SCAN], overall)
@@ -0,0 +1,178 @@
+"""
+Per-gate, per-minute scan throughput counters.
+
+The scan path adds one atomic cache ``incr`` per tap, on a key for the
+gate, the minute of the tap and its outcome (accepted, debounced, unknown
+card or out of order); it never writes to the database. The
+``flush_gate_throughput`` command, run every minute from cron, reads the
+counters of the last ``FLUSH_WINDOW`` and upserts them into
+GateThroughput. Counters hold running totals, so re-flushing a minute is
+idempotent and picks up late batch uploads for it.
+
+Only scans at registered gates are counted.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Gate, GateThroughput
+
+
+COUNTER_KEY_PREFIX = 'attendance:throughput:'
+
+# Outcomes counted per tap; taps is their sum
+COUNTED_STATUSES = ('accepted', 'debounced', 'unknown_card', 'out_of_order')
+
+# How far back each flush re-reads the counters, and how long they live
+FLUSH_WINDOW = getattr(settings, 'ATTENDANCE_THROUGHPUT_FLUSH_WINDOW', timedelta(hours=2))
+COUNTER_TIMEOUT = int(FLUSH_WINDOW.total_seconds()) + 60 * 60
+
+GET_MANY_CHUNK = 1000
+
+
+def minute_of(timestamp):
+    """Whole minutes since the epoch."""
+    return int(timestamp.timestamp()) // 60
+
+
+def minute_start(minute):
+    return datetime.fromtimestamp(minute * 60, tz=dt_timezone.utc)
+
+
+def counter_key(gate_id, minute, status):
+    return f'{COUNTER_KEY_PREFIX}{gate_id}:{minute}:{status}'
+
+
+def _incr(key, amount):
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        if not cache.add(key, amount, COUNTER_TIMEOUT):
+            # Another worker created it first
+            cache.incr(key, amount)
+
+
+def count_taps(taps):
+    """
+    Add taps to the counters. ``taps`` is an iterable of
+    ``(gate_id, status, timestamp)``; taps at unregistered gates are skipped.
+    """
+    totals = {}
+    for gate_id, status, timestamp in taps:
+        if gate_id and status in COUNTED_STATUSES:
+            key = counter_key(gate_id, minute_of(timestamp), status)
+            totals[key] = totals.get(key, 0) + 1
+    for key, amount in totals.items():
+        _incr(key, amount)
+
+
+def count_tap(gate_id, status, timestamp):
+    count_taps([(gate_id, status, timestamp)])
+
+
+async def acount_tap(gate_id, status, timestamp):
+    if not gate_id or status not in COUNTED_STATUSES:
+        return
+    key = counter_key(gate_id, minute_of(timestamp), status)
+    try:
+        await cache.aincr(key, 1)
+    except ValueError:
+        await sync_to_async(_incr)(key, 1)
+
+
+def read_counters(gate_ids, first_minute, last_minute):
+    """
+    ``{(gate_id, minute): {status: count}}`` for the counters still in the
+    cache; minutes without taps are absent.
+    """
+    keys = [
+        counter_key(gate_id, minute, status)
+        for gate_id in gate_ids
+        for minute in range(first_minute, last_minute + 1)
+        for status in COUNTED_STATUSES
+    ]
+    found = {}
+    for start in range(0, len(keys), GET_MANY_CHUNK):
+        found.update(cache.get_many(keys[start:start + GET_MANY_CHUNK]))
+
+    counters = {}
+    for key, value in found.items():
+        gate_id, minute, status = key[len(COUNTER_KEY_PREFIX):].split(':')
+        counters.setdefault((int(gate_id), int(minute)), {})[status] = value
+    return counters
+
+
+def throughput_row(gate_id, minute, counts):
+    return GateThroughput(
+        gate_id=gate_id,
+        minute=minute_start(minute),
+        taps=sum(counts.values()),
+        accepted=counts.get('accepted', 0),
+        debounced=counts.get('debounced', 0),
+        unknown_card=counts.get('unknown_card', 0),
+    )
+
+
+def flush_counters(now=None, window=FLUSH_WINDOW):
+    """Upsert the cached counters of the last ``window`` into GateThroughput."""
+    now = now or timezone.now()
+    gate_ids = list(Gate.objects.values_list('id', flat=True))
+    counters = read_counters(gate_ids, minute_of(now - window), minute_of(now))
+
+    rows = [throughput_row(gate_id, minute, counts) for (gate_id, minute), counts in counters.items()]
+    GateThroughput.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['gate', 'minute'],
+        update_fields=['taps', 'accepted', 'debounced', 'unknown_card'],
+    )
+    return len(rows)
+
+
+def throughput_series(start, end, now=None):
+    """
+    GateThroughput rows from ``start`` up to (excluding) ``end``, with the
+    minutes still inside the flush window read live from the counters.
+    Rows are ordered by minute and gate; live ones are unsaved.
+    """
+    now = now or timezone.now()
+    rows = {
+        (row.gate_id, minute_of(row.minute)): row
+        for row in GateThroughput.objects.filter(minute__gte=start, minute__lt=end)
+    }
+
+    live_start = max(start, now - FLUSH_WINDOW)
+    if live_start < end:
+        gate_ids = list(Gate.objects.values_list('id', flat=True))
+        last_minute = minute_of(min(end, now + timedelta(minutes=1)) - timedelta(microseconds=1))
+        for (gate_id, minute), counts in read_counters(gate_ids, minute_of(live_start), last_minute).items():
+            rows[(gate_id, minute)] = throughput_row(gate_id, minute, counts)
+
+    return sorted(rows.values(), key=lambda row: (row.minute, row.gate_id))
+
+
+def summarize_gates(rows):
+    """
+    Per-gate totals, busiest minute and mean taps per active minute for
+    ``throughput_series`` rows, busiest gate first.
+    """
+    gates = {}
+    for row in rows:
+        summary = gates.setdefault(row.gate_id, {
+            'gate_id': row.gate_id, 'taps': 0, 'accepted': 0, 'debounced': 0,
+            'unknown_card': 0, 'minutes': 0, 'peak_taps': 0, 'peak_minute': None,
+        })
+        for field in ('taps', 'accepted', 'debounced', 'unknown_card'):
+            summary[field] += getattr(row, field)
+        summary['minutes'] += 1
+        if row.taps > summary['peak_taps']:
+            summary['peak_taps'] = row.taps
+            summary['peak_minute'] = row.minute
+
+    for summary in gates.values():
+        summary['mean_taps'] = round(summary['taps'] / summary['minutes'], 1)
+    return sorted(gates.values(), key=lambda summary: (-summary['peak_taps'], -summary['taps']))
@@ -7,7 +7,23 @@ urlpatterns = [
     path('logs/export/', views.export_logs_csv, name='export_logs_csv'),
     path('reports/', views.generate_attendance_report, name='generate_attendance_report'),
     path('analytics/', views.attendance_analytics, name='attendance_analytics'),
+    path('analytics/heatmap/', views.attendance_heatmap, name='attendance_heatmap'),
+    path('analytics/trends/', views.attendance_trends, name='attendance_trends'),
+    path('api/analytics/', views.attendance_analytics_api, name='attendance_analytics_api'),
+    path('alerts/', views.scan_alerts, name='scan_alerts'),
+    path('alerts/<int:alert_id>/resolve/', views.resolve_scan_alert, name='resolve_scan_alert'),
     path('simulate/', views.simulate_card_scan, name='simulate_card_scan'),
     path('student/<int:student_id>/', views.student_detail, name='student_detail'),
     path('api/nfc-scan/', views.nfc_scan_api, name='nfc_scan_api'),
+    path('api/nfc-scan/batch/', views.nfc_scan_batch_api, name='nfc_scan_batch_api'),
+    path('api/nfc-scan/async/', views.nfc_scan_async_api, name='nfc_scan_async_api'),
+    path('api/nfc-scan/queue/', views.scan_queue_status, name='scan_queue_status'),
+    path('api/occupancy/', views.occupancy_api, name='occupancy_api'),
+    path('api/attendance-bitmaps/', views.attendance_bitmaps_api, name='attendance_bitmaps_api'),
+    path('gates/throughput/', views.gate_throughput, name='gate_throughput'),
+    path('api/gates/throughput/', views.gate_throughput_api, name='gate_throughput_api'),
+    path('api/live-feed/', views.live_gate_feed, name='live_gate_feed'),
+    path('api/live-feed/poll/', views.live_gate_feed_poll, name='live_gate_feed_poll'),
+    path('api/roster/', views.roster_snapshot_api, name='roster_snapshot_api'),
+    path('api/roster/delta/', views.roster_delta_api, name='roster_delta_api'),
 ]
\ No newline at end of file
@@ -1,24 +1,47 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, JsonResponse
+from django.http import (
+    HttpResponse, HttpResponseNotModified, JsonResponse, FileResponse, StreamingHttpResponse,
+)
 from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib import messages
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.db.models import Q, Count
-from django.core.paginator import Paginator
 from django.utils.dateparse import parse_date
-from datetime import timedelta
-from io import BytesIO
+from datetime import datetime, time, timedelta
+from asgiref.sync import sync_to_async
 import csv
-import xlsxwriter
 import json
+import logging
+
+from SmartAccess.localdates import CAMPUS_TIME_ZONE, campus_localdate, campus_localtime
+from SmartAccess.pagination import keyset_paginate
 
 # Import from the modular models
-from .models import EntryLog
-from students.models import Student
+from .models import EntryLog, DailyAttendanceSummary, Gate, ScanAlert, Term
+from .analytics import analytics_report, default_range
+from .bitmaps import bitmap_stats, current_term, encode, term_bitmaps
+from .gates import ReaderAuthError, ascan_gate, reader_or_staff_required, scan_gate
+from .idempotency import idempotent
+from .livefeed import event_stream, pending_stream, serialize_event, wait_for_events
+from .occupancy import occupancy_snapshot
+from .punctuality import late_filter
+from .reports import build_attendance_workbook, filter_report_logs
+from .roster import roster_delta, roster_snapshot, roster_version
+from .throughput import summarize_gates, throughput_series
+from .writebehind import write_behind
+from .services import (
+    record_scan, record_scan_batch, arecord_scan,
+    SCAN_ACCEPTED, SCAN_DEBOUNCED, SCAN_UNKNOWN_CARD, SCAN_BATCH_LIMIT,
+)
 
 # Import student_detail from students app
 from students.views import student_detail
+from authentication.decorators import teacher_required
+
+logger = logging.getLogger(__name__)
 
 # Attendance management views - migrated from legacy student app
 
@@ -26,41 +49,56 @@ def simulate_card_scan(request):
     """Simulate card scan view - migrated from legacy student app"""
     if request.method == 'POST':
         card_id = request.POST.get('card_id')
-        try:
-            student = Student.objects.get(nfc_uid=card_id)
-        except Student.DoesNotExist:
-            messages.error(request, "Card not recognized.")
-            return redirect('simulate_card_scan')
+        result = record_scan(card_id)
 
-        now = timezone.now()
-        time_gap = timedelta(minutes=0.5)
-
-        last_log = EntryLog.objects.filter(student=student).order_by('-timestamp').first()
-
-        # Prevent duplicate scans
-        if last_log and (now - last_log.timestamp < time_gap):
+        if result['status'] == SCAN_UNKNOWN_CARD:
+            messages.error(request, "Card not recognized.")
+        elif result['status'] == SCAN_DEBOUNCED:
+            # Prevent duplicate scans
             messages.warning(request, "Please wait before scanning again.")
-            return redirect('simulate_card_scan')
-
-        # Decide next action
-        if last_log and last_log.action == 'in':
-            action = 'out'
-            student.is_in_university = False
-            messages.success(request, f"{student.name} checked out.")
         else:
-            action = 'in'
-            student.is_in_university = True
-            messages.success(request, f"{student.name} checked in.")
-
-        # Save new entry
-        EntryLog.objects.create(student=student, action=action)
-        student.save()
+            messages.success(request, f"{result['message']}.")
 
         return redirect('simulate_card_scan')
 
     return render(request, 'attendance/simulate_scan.html')
 
 
+@login_required
+@teacher_required
+def scan_alerts(request):
+    """Card anomaly alerts raised by the scan path and the batch detector"""
+    status = request.GET.get('status', 'open')
+    kind = request.GET.get('kind', '')
+
+    alerts = ScanAlert.objects.select_related('student')
+    if status == 'open':
+        alerts = alerts.filter(is_resolved=False)
+    elif status == 'resolved':
+        alerts = alerts.filter(is_resolved=True)
+    if kind:
+        alerts = alerts.filter(kind=kind)
+
+    page_alerts = keyset_paginate(alerts, cursor=request.GET.get('cursor'), per_page=25, field='occurred_at')
+
+    return render(request, 'attendance/scan_alerts.html', {
+        'alerts': page_alerts,
+        'status': status,
+        'kind': kind,
+        'kind_choices': ScanAlert.KIND_CHOICES,
+    })
+
+
+@login_required
+@teacher_required
+@require_POST
+def resolve_scan_alert(request, alert_id):
+    """Mark an alert as reviewed"""
+    ScanAlert.objects.filter(id=alert_id).update(is_resolved=True)
+    messages.success(request, "Alert marked as resolved.")
+    return redirect('scan_alerts')
+
+
 def view_logs(request):
     """View logs view - migrated from legacy student app"""
     query = request.GET.get('q', '')
@@ -79,20 +117,22 @@ def view_logs(request):
     if date_filter:
         try:
             parsed_date = parse_date(date_filter)
-            logs = logs.filter(timestamp__date=parsed_date)
+            logs = logs.on_date(parsed_date)
         except Exception:
             pass
 
-    logs = logs.order_by('-timestamp')
-
-    # Pagination
-    paginator = Paginator(logs, 10)  # 10 logs per page
-    page_number = request.GET.get('page')
-    page_logs = paginator.get_page(page_number)
+    # Keyset pagination: no COUNT(*) unless asked for, constant cost per page
+    page_logs = keyset_paginate(
+        logs,
+        cursor=request.GET.get('cursor'),
+        per_page=10,
+        with_count=request.GET.get('count') == '1'
+    )
 
     return render(request, 'attendance/view_logs.html', {
         'logs': page_logs,
-        'students': Student.objects.all()
+        'query': query,
+        'date_filter': date_filter,
     })
 
 
@@ -119,51 +159,43 @@ def export_logs_csv(request):
 
 @login_required
 def generate_attendance_report(request):
-    """Generate attendance report - migrated from legacy student app"""
-    output = BytesIO()
-    workbook = xlsxwriter.Workbook(output)
-    worksheet = workbook.add_worksheet()
-
-    # Add headers
-    headers = ['Date', 'Student Name', 'Roll Number', 'Check In', 'Check Out', 'Duration', 'Status']
-    for col, header in enumerate(headers):
-        worksheet.write(0, col, header)
-
-    # Get data
-    logs = EntryLog.objects.select_related('student').order_by('timestamp')
-    row = 1
-    for log in logs:
-        worksheet.write(row, 0, log.timestamp.date().strftime('%Y-%m-%d'))
-        worksheet.write(row, 1, log.student.name)
-        worksheet.write(row, 2, log.student.roll_number)
-        worksheet.write(row, 3, log.timestamp.time().strftime('%H:%M'))
-        row += 1
-
-    workbook.close()
-    output.seek(0)
+    """Generate sessionized attendance report (optional start, end and student filters)"""
+    start_date = parse_date(request.GET.get('start', '') or '')
+    end_date = parse_date(request.GET.get('end', '') or '')
+    student_id = request.GET.get('student', '')
+
+    logs = filter_report_logs(
+        EntryLog.objects.all(),
+        start_date=start_date,
+        end_date=end_date,
+        student_id=int(student_id) if student_id.isdigit() else None,
+    )
 
-    response = HttpResponse(
-        output.read(),
+    return FileResponse(
+        build_attendance_workbook(logs),
+        as_attachment=True,
+        filename='attendance_report.xlsx',
         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
-    response['Content-Disposition'] = 'attachment; filename=attendance_report.xlsx'
-    return response
 
 
 def attendance_analytics(request):
     """Attendance analytics view - migrated from legacy student app"""
-    today = timezone.now().date()
+    today = campus_localdate()
     start_date = today - timedelta(days=30)
     
-    # Get attendance data
-    daily_attendance = EntryLog.objects.filter(
-        timestamp__date__gte=start_date,
-        action='in'
-    ).values('timestamp__date').annotate(
-        count=Count('id'),
-        on_time=Count('id', filter=Q(timestamp__time__hour__lt=9)),
-        late=Count('id', filter=Q(timestamp__time__hour__gte=9))
-    ).order_by('timestamp__date')
+    # Each day's arrivals split by the punctuality policy in one grouped query
+    daily_attendance = DailyAttendanceSummary.objects.filter(
+        student__isnull=False,
+        check_in_count__gt=0,
+        date__gte=start_date
+    ).values('date').annotate(
+        students_present=Count('id'),
+        late_count=Count('id', filter=late_filter('first_in')),
+    ).order_by('date')
+    daily_attendance = list(daily_attendance)
+    for day in daily_attendance:
+        day['on_time_count'] = day['students_present'] - day['late_count']
     
     # Create template context
     context = {
@@ -174,50 +206,390 @@ def attendance_analytics(request):
     return render(request, 'attendance/attendance_analytics.html', context)
 
 
+def _analytics_range(request):
+    """Inclusive ?start=&end= dates, defaulting to the full history."""
+    first, today = default_range()
+    start = parse_date(request.GET.get('start', '') or '') or first
+    end = parse_date(request.GET.get('end', '') or '') or today
+    return start, end
+
+
+@login_required
+def attendance_heatmap(request):
+    """Arrival heatmap by weekday and hour, with the visit length distribution"""
+    start, end = _analytics_range(request)
+    report = analytics_report(start, end)
+
+    heatmap = report['heatmap']
+    peak = heatmap['peak'] or 1
+    rows = [
+        (weekday, [(count, round(count / peak, 2)) for count in counts])
+        for weekday, counts in zip(heatmap['weekdays'], heatmap['counts'])
+    ]
+
+    context = {
+        'report': report,
+        'rows': rows,
+        'hours': heatmap['hours'],
+        'start': start,
+        'end': end,
+    }
+    return render(request, 'attendance/attendance_heatmap.html', context)
+
+
+@login_required
+def attendance_trends(request):
+    """Term-over-term (or month-over-month) attendance trends"""
+    start, end = _analytics_range(request)
+    context = {
+        'report': analytics_report(start, end),
+        'start': start,
+        'end': end,
+    }
+    return render(request, 'attendance/attendance_trends.html', context)
+
+
+@login_required
+def attendance_analytics_api(request):
+    """Heatmap, dwell distribution and trends as JSON; ?report= picks one"""
+    start, end = _analytics_range(request)
+    report = analytics_report(start, end)
+
+    section = request.GET.get('report')
+    if section:
+        if section not in ('heatmap', 'dwell', 'trends'):
+            return JsonResponse({'success': False, 'error': 'report must be heatmap, dwell or trends'}, status=400)
+        report = {key: report[key] for key in ('start', 'end', 'scans', section)}
+
+    return JsonResponse({'success': True, **report})
+
+
 @csrf_exempt
+@idempotent
 def nfc_scan_api(request):
     """NFC scan API view - migrated from legacy student app"""
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            card_id = data.get('card_id')
+            card_id = data.get('card_id') if isinstance(data, dict) else None
             
             if not card_id:
                 return JsonResponse({'success': False, 'error': 'No card_id provided'})
-            
+
             try:
-                student = Student.objects.get(nfc_uid=card_id)
-            except Student.DoesNotExist:
-                return JsonResponse({'success': False, 'error': 'Card not recognized'})
+                gate = scan_gate(request, data.get('gate'))
+            except ReaderAuthError as e:
+                return JsonResponse({'success': False, 'error': str(e)}, status=401)
 
-            now = timezone.now()
-            time_gap = timedelta(minutes=0.5)
+            result = record_scan(card_id, gate=gate)
 
-            last_log = EntryLog.objects.filter(student=student).order_by('-timestamp').first()
+            if result['status'] == SCAN_UNKNOWN_CARD:
+                return JsonResponse({'success': False, 'error': 'Card not recognized'})
 
             # Prevent duplicate scans
-            if last_log and (now - last_log.timestamp < time_gap):
+            if result['status'] == SCAN_DEBOUNCED:
                 return JsonResponse({'success': False, 'error': 'Please wait before scanning again'})
 
-            # Decide next action
-            if last_log and last_log.action == 'in':
-                action = 'out'
-                student.is_in_university = False
-                message = f"{student.name} checked out"
-            else:
-                action = 'in'
-                student.is_in_university = True
-                message = f"{student.name} checked in"
-
-            # Save new entry
-            EntryLog.objects.create(student=student, action=action)
-            student.save()
-
-            return JsonResponse({'success': True, 'message': message})
+            return JsonResponse({'success': True, 'message': result['message']})
 
         except json.JSONDecodeError:
             return JsonResponse({'success': False, 'error': 'Invalid JSON'})
-        except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)})
+        except Exception:
+            # A 5xx is not stored under the Idempotency-Key, so the reader's retry runs again
+            logger.exception('Scan failed')
+            return JsonResponse({'success': False, 'error': 'The scan could not be recorded, please retry'}, status=500)
     
     return JsonResponse({'success': False, 'error': 'Only POST method allowed'})
+
+
+@csrf_exempt
+@idempotent
+def nfc_scan_batch_api(request):
+    """Batch NFC scan API for gate readers uploading buffered scans"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Only POST method allowed'}, status=405)
+
+    try:
+        gate = scan_gate(request)
+    except ReaderAuthError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=401)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+
+    # Accept either a bare array or {"scans": [...]}
+    scans = data.get('scans') if isinstance(data, dict) else data
+    if not isinstance(scans, list) or not scans:
+        return JsonResponse({'success': False, 'error': 'Expected a non-empty array of scans'}, status=400)
+    if len(scans) > SCAN_BATCH_LIMIT:
+        return JsonResponse({
+            'success': False,
+            'error': f'Batch too large (max {SCAN_BATCH_LIMIT} scans)'
+        }, status=413)
+
+    results = record_scan_batch(scans, gate=gate)
+    return JsonResponse({
+        'success': True,
+        'accepted': sum(1 for result in results if result['status'] == SCAN_ACCEPTED),
+        'results': results,
+    })
+
+
+@csrf_exempt
+@idempotent
+async def nfc_scan_async_api(request):
+    """Async NFC scan API (ASGI) - answers from cache, persists via write-behind"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Only POST method allowed'})
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'})
+
+    card_id = data.get('card_id') if isinstance(data, dict) else None
+    if not card_id:
+        return JsonResponse({'success': False, 'error': 'No card_id provided'})
+
+    try:
+        gate = await ascan_gate(request, data.get('gate'))
+    except ReaderAuthError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=401)
+
+    result = await arecord_scan(card_id, gate=gate)
+
+    if result['status'] == SCAN_UNKNOWN_CARD:
+        return JsonResponse({'success': False, 'error': 'Card not recognized'})
+
+    # Prevent duplicate scans
+    if result['status'] == SCAN_DEBOUNCED:
+        return JsonResponse({'success': False, 'error': 'Please wait before scanning again'})
+
+    return JsonResponse({'success': True, 'action': result['action'], 'message': result['message']})
+
+
+def scan_queue_status(request):
+    """Write-behind queue depth and flush lag for this worker process"""
+    return JsonResponse(write_behind.stats())
+
+
+def occupancy_api(request):
+    """Live occupancy for lobby displays - served from the cache counters"""
+    return JsonResponse({
+        'success': True,
+        **occupancy_snapshot(),
+        'as_of': timezone.now().isoformat(),
+    })
+
+
+def _throughput_window(request):
+    """
+    Campus-local ?date=&from=HH:MM&to=HH:MM (any of them; the rest default
+    to today and the whole day), or the last hour when none is given.
+    """
+    if not any(request.GET.get(name) for name in ('date', 'from', 'to')):
+        now = campus_localtime(timezone.now())
+        end = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        return end - timedelta(hours=1), end
+
+    day = parse_date(request.GET.get('date', '')) or campus_localdate()
+    start = datetime.combine(day, _parse_time(request.GET.get('from')) or time.min, CAMPUS_TIME_ZONE)
+    to = _parse_time(request.GET.get('to'))
+    end = datetime.combine(day, to, CAMPUS_TIME_ZONE) if to else \
+        datetime.combine(day + timedelta(days=1), time.min, CAMPUS_TIME_ZONE)
+    return start, end
+
+
+def _parse_time(value):
+    try:
+        return time.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def _gate_throughput(request):
+    start, end = _throughput_window(request)
+    rows = throughput_series(start, end)
+    names = dict(Gate.objects.values_list('id', 'name'))
+    summaries = summarize_gates(rows)
+    for summary in summaries:
+        summary['gate'] = names.get(summary['gate_id'])
+    return start, end, rows, names, summaries
+
+
+@login_required
+def gate_throughput(request):
+    """Per-gate taps per minute, to find the bottleneck gate at peak time"""
+    start, end, rows, names, summaries = _gate_throughput(request)
+
+    # Minutes down, gates across
+    gate_ids = [summary['gate_id'] for summary in summaries]
+    minutes = {}
+    for row in rows:
+        minutes.setdefault(row.minute, {})[row.gate_id] = row.taps
+    table = [
+        (campus_localtime(minute), [counts.get(gate_id, 0) for gate_id in gate_ids])
+        for minute, counts in sorted(minutes.items())
+    ]
+
+    context = {
+        'summaries': summaries,
+        'gate_names': [names.get(gate_id) for gate_id in gate_ids],
+        'table': table,
+        'start': campus_localtime(start),
+        'end': campus_localtime(end),
+    }
+    return render(request, 'attendance/gate_throughput.html', context)
+
+
+@login_required
+def gate_throughput_api(request):
+    """Per-gate per-minute throughput as JSON (same window parameters as the page)"""
+    start, end, rows, names, summaries = _gate_throughput(request)
+    return JsonResponse({
+        'success': True,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'gates': [
+            dict(summary, peak_minute=summary['peak_minute'].isoformat() if summary['peak_minute'] else None)
+            for summary in summaries
+        ],
+        'minutes': [
+            {
+                'gate': names.get(row.gate_id),
+                'minute': row.minute.isoformat(),
+                'taps': row.taps,
+                'accepted': row.accepted,
+                'debounced': row.debounced,
+                'unknown_card': row.unknown_card,
+            }
+            for row in rows
+        ],
+    })
+
+
+# Upper bound on the number of students in one bitmap request
+BITMAP_API_LIMIT = 1000
+
+
+@login_required
+def attendance_bitmaps_api(request):
+    """
+    Term attendance bitmaps for many students in one call:
+    ?students=1,2,3[&term=<id>]. Bitmaps are base64, one bit per day of the
+    term (see attendance.bitmaps for the layout).
+    """
+    term_id = request.GET.get('term', '')
+    if term_id:
+        term = Term.objects.filter(id=term_id).first() if term_id.isdigit() else None
+    else:
+        term = current_term()
+    if term is None:
+        return JsonResponse({'success': False, 'error': 'Term not found'}, status=404)
+
+    raw_ids = [value for value in request.GET.get('students', '').split(',') if value.strip()]
+    if not raw_ids or not all(value.strip().isdigit() for value in raw_ids):
+        return JsonResponse({'success': False, 'error': 'students must be a comma-separated list of ids'}, status=400)
+    if len(raw_ids) > BITMAP_API_LIMIT:
+        return JsonResponse({
+            'success': False,
+            'error': f'Too many students (max {BITMAP_API_LIMIT})'
+        }, status=413)
+    student_ids = list(dict.fromkeys(int(value) for value in raw_ids))
+
+    # Rates count school days up to today only
+    elapsed = min(term.days, max(0, (campus_localdate() - term.start_date).days + 1))
+    campus, bitmaps = term_bitmaps(term, student_ids)
+    return JsonResponse({
+        'success': True,
+        'term': {
+            'id': term.id,
+            'name': term.name,
+            'start_date': term.start_date.isoformat(),
+            'end_date': term.end_date.isoformat(),
+            'days': term.days,
+            'elapsed_days': elapsed,
+        },
+        'school_days': encode(campus),
+        'students': [
+            {
+                'student_id': student_id,
+                'present': encode(present),
+                'late': encode(late),
+                **bitmap_stats(present, late, campus, elapsed),
+            }
+            for student_id, (present, late) in bitmaps.items()
+        ],
+    })
+
+
+def _feed_cursor(value):
+    return int(value) if value and value.isdigit() else None
+
+
+@login_required
+async def live_gate_feed(request):
+    """Server-Sent Events stream of accepted gate scans for live dashboards (needs ASGI)"""
+    # Browsers send Last-Event-ID when they reconnect after a stream ends
+    after = _feed_cursor(request.headers.get('Last-Event-ID')) or _feed_cursor(request.GET.get('after'))
+
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would buffer the whole stream: send what is pending
+        # and let the browser reconnect instead
+        response = HttpResponse(await sync_to_async(pending_stream)(after), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    response = StreamingHttpResponse(event_stream(after), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+
+@login_required
+async def live_gate_feed_poll(request):
+    """Long-poll fallback for the live gate feed: waits for scans after ?after=<id>"""
+    after = _feed_cursor(request.GET.get('after')) or 0
+    events, cursor = await wait_for_events(after)
+    return JsonResponse({
+        'success': True,
+        'events': [serialize_event(event) for event in events],
+        'cursor': cursor,
+    })
+
+
+def _roster_response(version, payload):
+    response = HttpResponse(payload, content_type='application/octet-stream')
+    response['ETag'] = f'"{version}"'
+    response['X-Roster-Version'] = str(version)
+    return response
+
+
+@reader_or_staff_required
+def roster_snapshot_api(request):
+    """Binary card roster snapshot for gate readers (see attendance.roster for the format)"""
+    version, payload = roster_snapshot()
+    if request.headers.get('If-None-Match') == f'"{version}"':
+        return HttpResponseNotModified()
+    return _roster_response(version, payload)
+
+
+@reader_or_staff_required
+def roster_delta_api(request):
+    """Binary card roster changes since ?since=<version>; 304 when nothing changed"""
+    since = request.GET.get('since', '')
+    if not since.isdigit():
+        return JsonResponse({'success': False, 'error': 'since must be a roster version'}, status=400)
+
+    since = int(since)
+    version = roster_version()
+    if since == version:
+        return HttpResponseNotModified()
+    if since > version:
+        # The reader holds a version this server never issued; it must resync
+        return JsonResponse({'success': False, 'error': 'Unknown roster version, fetch a snapshot'}, status=409)
+
+    version, payload = roster_delta(since)
+    return _roster_response(version, payload)
@@ -0,0 +1,154 @@
+"""
+Visit intervals and per-student visit totals.
+
+``apply_scan`` opens a Visit on check-in and closes it on check-out, keeping
+VisitStats in step, so visit statistics are a couple of indexed reads.
+``rebuild_visits`` recreates both from EntryLog for existing history.
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .models import EntryLog, Visit, VisitStats
+from .reports import iter_sessions
+
+
+REBUILD_CHUNK_SIZE = 2000
+
+
+def _bump_stats(student_id, **increments):
+    rows = VisitStats.objects.filter(student_id=student_id)
+    updates = {field: F(field) + amount for field, amount in increments.items()}
+    if rows.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            VisitStats.objects.create(student_id=student_id, **increments)
+    except IntegrityError:
+        rows.update(**updates)
+
+
+def apply_scan(student_id, action, timestamp, session_start=None):
+    """Open or close the student's visit for one recorded scan."""
+    if action == 'in':
+        Visit.objects.create(student_id=student_id, check_in=timestamp)
+        _bump_stats(student_id, total_visits=1)
+        return
+
+    open_visits = Visit.objects.filter(student_id=student_id, check_out__isnull=True)
+    if session_start is None:
+        session_start = open_visits.order_by('-check_in').values_list('check_in', flat=True).first()
+        if session_start is None:
+            return  # Check-out without a check-in: nothing to close
+
+    seconds = max(0, int((timestamp - session_start).total_seconds()))
+    if open_visits.filter(check_in=session_start).update(check_out=timestamp, duration_seconds=seconds):
+        _bump_stats(student_id, completed_visits=1, total_seconds=seconds)
+
+
+def apply_checkouts(checkouts, timestamp, chunk_size=500):
+    """
+    Set-based ``apply_scan`` closing many open visits at the same ``timestamp``.
+
+    ``checkouts`` is a list of ``(student_id, check_in)`` pairs.
+    """
+    for i in range(0, len(checkouts), chunk_size):
+        chunk = [
+            (student_id, check_in, max(0, int((timestamp - check_in).total_seconds())))
+            for student_id, check_in in checkouts[i:i + chunk_size]
+        ]
+        matches = [Q(student_id=student_id, check_in=check_in) for student_id, check_in, _ in chunk]
+
+        Visit.objects.filter(reduce(or_, matches), check_out__isnull=True).update(
+            check_out=timestamp,
+            duration_seconds=Case(
+                *[When(match, then=Value(seconds)) for match, (_, _, seconds) in zip(matches, chunk)],
+                output_field=IntegerField()
+            ),
+        )
+        VisitStats.objects.filter(student_id__in=[student_id for student_id, _, _ in chunk]).update(
+            completed_visits=F('completed_visits') + 1,
+            total_seconds=F('total_seconds') + Case(
+                *[When(student_id=student_id, then=Value(seconds)) for student_id, _, seconds in chunk],
+                default=Value(0), output_field=IntegerField()
+            ),
+        )
+
+
+def visit_summary(student):
+    """
+    Total visits and average visit length (seconds) for a student.
+
+    A visit still in progress counts up to now, as on the old detail page.
+    """
+    stats = VisitStats.objects.filter(student=student).first()
+    if stats is None:
+        return {'total_visits': 0, 'total_seconds': 0, 'average_seconds': 0}
+
+    total_seconds = stats.total_seconds
+    open_check_in = Visit.objects.filter(student=student, check_out__isnull=True)\
+        .order_by('-check_in').values_list('check_in', flat=True).first()
+    if open_check_in:
+        total_seconds += max(0, (timezone.now() - open_check_in).total_seconds())
+
+    return {
+        'total_visits': stats.total_visits,
+        'total_seconds': total_seconds,
+        'average_seconds': (total_seconds / stats.total_visits) if stats.total_visits else 0,
+    }
+
+
+def rebuild_visits(student_ids=None, chunk_size=REBUILD_CHUNK_SIZE):
+    """Recreate Visit and VisitStats rows from EntryLog; returns visits written."""
+    logs = EntryLog.objects.all()
+    visits = Visit.objects.all()
+    stats = VisitStats.objects.all()
+    if student_ids:
+        logs = logs.filter(student_id__in=student_ids)
+        visits = visits.filter(student_id__in=student_ids)
+        stats = stats.filter(student_id__in=student_ids)
+
+    rows = logs.order_by('student_id', 'timestamp').values_list(
+        'student_id', 'timestamp', 'action'
+    ).iterator(chunk_size=chunk_size)
+    rows = ((student_id, None, None, timestamp, action) for student_id, timestamp, action in rows)
+
+    pending_visits = []
+    totals = {}
+    written = 0
+
+    with transaction.atomic():
+        visits.delete()
+        stats.delete()
+
+        for session in iter_sessions(rows):
+            if session['check_in'] is None:
+                continue
+
+            student_stats = totals.setdefault(
+                session['student_id'], VisitStats(student_id=session['student_id'])
+            )
+            student_stats.total_visits += 1
+
+            visit = Visit(student_id=session['student_id'], check_in=session['check_in'])
+            if session['check_out']:
+                visit.check_out = session['check_out']
+                visit.duration_seconds = int((visit.check_out - visit.check_in).total_seconds())
+                student_stats.completed_visits += 1
+                student_stats.total_seconds += visit.duration_seconds
+            pending_visits.append(visit)
+
+            if len(pending_visits) >= chunk_size:
+                Visit.objects.bulk_create(pending_visits)
+                written += len(pending_visits)
+                pending_visits.clear()
+
+        Visit.objects.bulk_create(pending_visits)
+        written += len(pending_visits)
+        VisitStats.objects.bulk_create(totals.values(), batch_size=chunk_size)
+
+    return written
@@ -0,0 +1,224 @@
+"""
+In-process write-behind queue for EntryLog rows decided by the async scan path.
+
+The async gate view answers the reader as soon as the action is decided and
+hands the row to this queue. A background thread flushes queued rows in
+micro-batches, either when ``WRITE_BEHIND_BATCH_SIZE`` rows are waiting or
+every ``WRITE_BEHIND_INTERVAL_MS`` milliseconds, and drains whatever is left
+when the process shuts down (at exit, or on SIGTERM when the server has not
+installed its own handler).
+
+If a batch insert fails, its rows are retried one at a time so a single bad
+row cannot hold up the scans behind it. Rows that still fail are written to
+the ``attendance.writebehind.deadletter`` logger, one JSON object per row,
+and dropped from the queue; a database that is unreachable instead puts the
+rows back for the next flush. The queue holds at most
+``WRITE_BEHIND_MAX_QUEUE`` rows: scans arriving while it is full go to the
+dead-letter log as well and are counted as dropped.
+
+``stats()`` reports queue depth, flush lag (the time between a scan being
+decided and its row being committed) and the failure counters.
+"""
+
+import atexit
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections
+
+from .models import EntryLog
+
+
+logger = logging.getLogger(__name__)
+deadletter_logger = logging.getLogger('attendance.writebehind.deadletter')
+
+WRITE_BEHIND_BATCH_SIZE = getattr(settings, 'ATTENDANCE_WRITE_BEHIND_BATCH_SIZE', 200)
+WRITE_BEHIND_INTERVAL_MS = getattr(settings, 'ATTENDANCE_WRITE_BEHIND_INTERVAL_MS', 250)
+WRITE_BEHIND_MAX_QUEUE = getattr(settings, 'ATTENDANCE_WRITE_BEHIND_MAX_QUEUE', 10000)
+
+# Failures that say nothing about the rows themselves
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+def dead_letter(log, reason):
+    """Record a scan that could not be saved, in a form that can be replayed."""
+    deadletter_logger.error(json.dumps({
+        'student_id': log.student_id,
+        'action': log.action,
+        'timestamp': log.timestamp.isoformat() if log.timestamp else None,
+        'gate_id': log.gate_id,
+        'reason': reason,
+    }))
+
+
+class WriteBehindQueue:
+    def __init__(self, batch_size=WRITE_BEHIND_BATCH_SIZE, interval_ms=WRITE_BEHIND_INTERVAL_MS,
+                 max_queue=WRITE_BEHIND_MAX_QUEUE):
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+        self.max_queue = max_queue
+        self._pending = deque()  # (enqueued_at, EntryLog)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+        self.flushed = 0
+        self.failed_flushes = 0
+        self.dead_lettered = 0
+        self.dropped = 0
+        self.last_flush_at = None
+        self.last_flush_lag = 0.0
+        self.max_flush_lag = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(
+                    target=self._run, name='attendance-write-behind', daemon=True
+                )
+                self._thread.start()
+                self._handle_sigterm()
+
+    def _handle_sigterm(self):
+        # Servers that manage shutdown install their own handler and exit
+        # through atexit; a bare process would be killed with rows queued
+        if threading.current_thread() is not threading.main_thread():
+            return
+        if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, self._on_sigterm)
+
+    def _on_sigterm(self, signum, frame):
+        self.drain()
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+    def put(self, log):
+        """Queue an unsaved EntryLog for the next flush; returns False if the queue is full."""
+        self.start()
+        with self._lock:
+            accepted = len(self._pending) < self.max_queue
+            if accepted:
+                self._pending.append((time.monotonic(), log))
+            full = len(self._pending) >= self.batch_size
+        if not accepted:
+            self.dropped += 1
+            dead_letter(log, 'queue full')
+        if full:
+            self._wakeup.set()
+        return accepted
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Persist up to one batch of queued rows; returns the number written."""
+        from .services import persist_scans
+
+        with self._lock:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+        if not batch:
+            return 0
+
+        close_old_connections()
+        try:
+            persist_scans([log for _, log in batch])
+        except Exception:
+            logger.exception('Write-behind flush of %d scans failed, retrying them one at a time', len(batch))
+            self.failed_flushes += 1
+            batch = self._flush_rows(batch)
+            if not batch:
+                return 0
+
+        now = time.monotonic()
+        self.flushed += len(batch)
+        self.last_flush_at = time.time()
+        self.last_flush_lag = now - batch[0][0]
+        self.max_flush_lag = max(self.max_flush_lag, self.last_flush_lag)
+
+        # Keep going without waiting if a backlog built up
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return len(batch)
+
+    def _flush_rows(self, batch):
+        """
+        Persist ``batch`` row by row after a failed batch insert; returns the
+        entries written. Rows that fail on their own are dead-lettered; a
+        transient database error puts the rest back in front of the queue.
+        """
+        from .services import persist_scans
+
+        written = []
+        for position, (enqueued_at, log) in enumerate(batch):
+            # The failed bulk insert may have assigned ids before rolling back
+            log.pk = None
+            try:
+                persist_scans([log])
+            except TRANSIENT_ERRORS:
+                logger.exception('Write-behind flush interrupted; requeueing %d scans', len(batch) - position)
+                with self._lock:
+                    self._pending.extendleft(reversed(batch[position:]))
+                break
+            except Exception as e:
+                logger.exception('Scan for student %s could not be saved', log.student_id)
+                self.dead_lettered += 1
+                dead_letter(log, f'{type(e).__name__}: {e}')
+            else:
+                written.append((enqueued_at, log))
+        return written
+
+    def drain(self, timeout=30):
+        """Stop the worker and flush everything still queued."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            if not self.flush():
+                time.sleep(self.interval)
+        if self._pending:
+            logger.error('Write-behind queue shut down with %d unsaved scans', len(self._pending))
+            with self._lock:
+                remaining, self._pending = list(self._pending), deque()
+            for _, log in remaining:
+                self.dead_lettered += 1
+                dead_letter(log, 'unsaved at shutdown')
+
+    def stats(self):
+        with self._lock:
+            depth = len(self._pending)
+            oldest = self._pending[0][0] if depth else None
+        return {
+            'queue_depth': depth,
+            'oldest_pending_age': (time.monotonic() - oldest) if oldest is not None else 0.0,
+            'flushed': self.flushed,
+            'failed_flushes': self.failed_flushes,
+            'dead_lettered': self.dead_lettered,
+            'dropped': self.dropped,
+            'max_queue': self.max_queue,
+            'last_flush_at': self.last_flush_at,
+            'last_flush_lag': self.last_flush_lag,
+            'max_flush_lag': self.max_flush_lag,
+        }
+
+
+write_behind = WriteBehindQueue()
+atexit.register(write_behind.drain)
+
+
+def enqueue_scan(student_id, action, timestamp, gate_id=None):
+    log = EntryLog(student_id=student_id, action=action, timestamp=timestamp, gate_id=gate_id)
+    write_behind.put(log)
+    return log
@@ -25,6 +25,11 @@ def student_required(view_func):
     return _wrapped_view
 
 
+def is_teacher(user):
+    """Whether the user has teacher privileges: the 'Teachers' group or superuser."""
+    return user.is_authenticated and (user.is_superuser or user.groups.filter(name='Teachers').exists())
+
+
 def teacher_required(view_func):
     """
     Decorator to require teacher privileges for a view.
@@ -33,7 +38,7 @@ def teacher_required(view_func):
     Redirects to dashboard_redirect with error message if access denied.
     """
     def _wrapped_view(request, *args, **kwargs):
-        if request.user.groups.filter(name='Teachers').exists() or request.user.is_superuser:
+        if is_teacher(request.user):
             return view_func(request, *args, **kwargs)
         else:
             messages.error(request, "Access denied. Teacher privileges required.")
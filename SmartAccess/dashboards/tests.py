@@ -1,3 +1,46 @@
-from django.test import TestCase
+from datetime import datetime, time
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.urls import reverse
+
+from SmartAccess.localdates import CAMPUS_TIME_ZONE, campus_localdate
+from SmartAccess.testing import CachedTestCase
+from attendance.models import DailyAttendanceSummary, PunctualityPolicy
+from attendance.services import record_scan
+from students.models import Student
+
+
+class PunctualityCountTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        today = campus_localdate()
+        Student.objects.create(name='Ayesha Khan', roll_number='CS-001', nfc_uid='A1B2C3D4')
+        Student.objects.create(name='Bilal Shah', roll_number='CS-002', nfc_uid='B1B2B3B4')
+        # Without a policy, check-ins from 9:00 are late
+        record_scan('A1B2C3D4', now=datetime.combine(today, time(8, 30), CAMPUS_TIME_ZONE))
+        record_scan('B1B2B3B4', now=datetime.combine(today, time(9, 30), CAMPUS_TIME_ZONE))
+
+        self.admin = User.objects.create_superuser('admin', password='pw')
+        self.teacher = User.objects.create_user('teacher', password='pw')
+        self.teacher.groups.add(Group.objects.get_or_create(name='Teachers')[0])
+
+    def late_counts(self):
+        self.client.force_login(self.admin)
+        admin_late = self.client.get(reverse('admin_dashboard')).context['late_entries']
+        self.client.force_login(self.teacher)
+        teacher_late = len(self.client.get(reverse('teacher_dashboard')).context['late_entries'])
+        return admin_late, teacher_late
+
+    def test_dashboards_agree_under_the_default_cutoff(self):
+        self.assertEqual(self.late_counts(), (1, 1))
+
+    def test_dashboards_follow_a_policy_change(self):
+        PunctualityPolicy.objects.create(
+            name='Late start', time_zone=CAMPUS_TIME_ZONE.key,
+            **{field: time(10, 0) for field in PunctualityPolicy.CUTOFF_FIELDS},
+        )
+
+        self.assertEqual(self.late_counts(), (0, 0))
+        # The stored rollup still reflects the policy at scan time
+        campus = DailyAttendanceSummary.objects.get(date=campus_localdate(), student__isnull=True)
+        self.assertEqual(campus.late_count, 1)
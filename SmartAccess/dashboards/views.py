@@ -8,10 +8,15 @@ from datetime import timedelta
 # Import models from modular apps
 from students.models import Student
 from fines.models import Fine  
-from attendance.models import EntryLog
+from attendance.models import EntryLog, DailyAttendanceSummary, ScanAlert
+from attendance.livefeed import recent_events
+from attendance.occupancy import campus_occupancy
+from attendance.punctuality import annotate_punctuality, late_filter
+from attendance.visits import visit_summary
 from events.models import Event
 from library.models import Book
 from authentication.decorators import student_required, teacher_required
+from SmartAccess.localdates import campus_localdate
 
 
 @login_required
@@ -23,14 +28,13 @@ def student_dashboard(request):
     except Student.DoesNotExist:
         messages.error(request, "Student profile not found. Please contact administrator.")
         return redirect('login')
-    today = timezone.now().date()
+    today = campus_localdate()
     last_30_days = today - timedelta(days=30)
     
     # Get Entry Logs
     entry_logs = EntryLog.objects.filter(
-        student=student,
-        timestamp__date__gte=last_30_days
-    ).order_by('-timestamp')
+        student=student
+    ).between_dates(start=last_30_days).order_by('-timestamp')
 
     # Get fine details
     fines = Fine.objects.filter(student=student)
@@ -42,13 +46,19 @@ def student_dashboard(request):
         student=student
     ).order_by('-timestamp')[:5]
 
-    # Calculate attendance stats
-    total_days = entry_logs.filter(action='in').count()
-    late_days = entry_logs.filter(
-        action='in',
-        timestamp__time__hour__gte=9,
-        timestamp__time__minute__gte=0
-    ).count()
+    # Calculate attendance stats from the daily rollup, judging each day's
+    # first check-in by the current punctuality policy
+    attendance = DailyAttendanceSummary.objects.filter(
+        student=student,
+        date__gte=last_30_days,
+        check_in_count__gt=0
+    ).aggregate(
+        total_days=Count('id'),
+        late_days=Count('id', filter=late_filter('first_in'))
+    )
+    total_days = attendance['total_days']
+    late_days = attendance['late_days']
+    visits = visit_summary(student)
 
     context = {
         'student': student,
@@ -60,6 +70,9 @@ def student_dashboard(request):
             'total_days': total_days,
             'present_days': total_days - late_days,
             'late_days': late_days,
+            'total_visits': visits['total_visits'],
+            'avg_visit_hours': int(visits['average_seconds'] // 3600),
+            'avg_visit_minutes': int((visits['average_seconds'] % 3600) // 60),
         },
         'total_fines_count': fines.count(),
         'total_paid': fines.filter(is_paid=True).count(),
@@ -74,28 +87,27 @@ def student_dashboard(request):
 @teacher_required
 def teacher_dashboard(request):
     """Teacher dashboard with student statistics and attendance overview"""
-    today = timezone.now().date()
+    today = campus_localdate()
     
     # Get statistics
     total_students = Student.objects.count()
-    students_inside = Student.objects.filter(is_in_university=True).count()
+    students_inside = campus_occupancy()
     total_fines = Fine.objects.filter(is_paid=False).count()
     
-    # Get today's attendance
-    today_entries = EntryLog.objects.filter(
-        timestamp__date=today,
-        action='in'
-    ).select_related('student')
+    # Get today's attendance (one rollup row per student who checked in)
+    today_entries = annotate_punctuality(DailyAttendanceSummary.objects.filter(
+        date=today,
+        student__isnull=False,
+        check_in_count__gt=0
+    ).select_related('student').order_by('first_in'), 'first_in')
+    today_summary = DailyAttendanceSummary.objects.filter(date=today, student__isnull=True).first()
+    students_present = today_summary.students_present if today_summary else 0
     
-    # Get late entries (after 9 AM)
-    late_entries = today_entries.filter(
-        timestamp__time__hour__gte=9,
-        timestamp__time__minute__gte=0
-    )
+    # Get late entries (first check-in late under the punctuality policy)
+    late_entries = today_entries.filter(late=True)
     
-    # Get recent activities
-    recent_logs = EntryLog.objects.select_related('student')\
-        .order_by('-timestamp')[:10]
+    # Recent activities come from the live feed; the page then follows it over SSE
+    recent_logs = recent_events(10)
     
     # Get unpaid fines
     unpaid_fines = Fine.objects.filter(is_paid=False)\
@@ -110,7 +122,7 @@ def teacher_dashboard(request):
         'late_entries': late_entries,
         'recent_logs': recent_logs,
         'unpaid_fines': unpaid_fines,
-        'attendance_rate': (today_entries.count() / total_students * 100) if total_students > 0 else 0
+        'attendance_rate': (students_present / total_students * 100) if total_students > 0 else 0
     }
     
     return render(request, 'dashboards/teacher_dashboard.html', context)
@@ -124,25 +136,29 @@ def admin_dashboard(request):
         messages.error(request, "Access denied. Admin privileges required.")
         return redirect('dashboard_redirect')
         
-    today = timezone.now().date()
+    today = campus_localdate()
     last_week = today - timedelta(days=7)
 
     # Today's statistics
-    today_entries = EntryLog.objects.filter(
-        timestamp__date=today
-    )
-    today_checkins = today_entries.filter(action='in').count()
-    today_checkouts = today_entries.filter(action='out').count()
+    today_summary = DailyAttendanceSummary.objects.filter(date=today, student__isnull=True).first()
+    today_checkins = today_summary.check_in_count if today_summary else 0
+    today_checkouts = today_summary.check_out_count if today_summary else 0
+    # Judged by the current punctuality policy, like the other dashboards,
+    # rather than the late_count stored when each scan was folded
+    late_entries = DailyAttendanceSummary.objects.filter(
+        date=today,
+        student__isnull=False,
+        check_in_count__gt=0
+    ).filter(late_filter('first_in')).count()
 
     # Students currently inside
-    students_inside = Student.objects.filter(is_in_university=True).count()
+    students_inside = campus_occupancy()
 
     # Weekly statistics
-    weekly_logs = EntryLog.objects.filter(
-        timestamp__date__gte=last_week
-    ).values('timestamp__date').annotate(
-        entries=Count('id', filter=Q(action='in'))
-    ).order_by('timestamp__date')
+    weekly_logs = DailyAttendanceSummary.objects.filter(
+        student__isnull=True,
+        date__gte=last_week
+    ).order_by('date')
 
     # Fine statistics
     total_fines = Fine.objects.aggregate(
@@ -150,15 +166,17 @@ def admin_dashboard(request):
         unpaid=Sum('amount', filter=Q(is_paid=False))
     )
 
-    # Recent activities
-    recent_logs = EntryLog.objects.select_related('student')\
-        .order_by('-timestamp')[:15]
+    # Recent activities come from the live feed; the page then follows it over SSE
+    recent_logs = recent_events(15)
 
     # Event statistics  
     upcoming_events = Event.objects.filter(
         start_datetime__gte=timezone.now()
     ).count()
 
+    # Card anomalies awaiting review
+    open_alerts = ScanAlert.objects.filter(is_resolved=False).count()
+
     # Library statistics
     total_books = Book.objects.count()
     borrowed_books = Book.objects.filter(status='borrowed').count()
@@ -166,6 +184,7 @@ def admin_dashboard(request):
     context = {
         'today_checkins': today_checkins,
         'today_checkouts': today_checkouts,
+        'late_entries': late_entries,
         'students_inside': students_inside,
         'weekly_logs': weekly_logs,
         'total_fines': total_fines,
@@ -173,6 +192,7 @@ def admin_dashboard(request):
         'upcoming_events': upcoming_events,
         'total_books': total_books,
         'borrowed_books': borrowed_books,
+        'open_alerts': open_alerts,
     }
     
     return render(request, 'admin/admin_dashboard.html', context)
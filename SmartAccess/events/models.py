@@ -2,6 +2,7 @@ from django.db import models
 from django.utils import timezone
 from students.models import Student
 from teachers.models import Teacher
+from SmartAccess.localdates import LocalDateBucketed
 
 # Event Management Models
 class EventCategory(models.Model):
@@ -120,7 +121,9 @@ class EventRegistration(models.Model):
     def __str__(self):
         return f"{self.student.roll_number} - {self.event.title} ({self.status})"
 
-class EventAttendance(models.Model):
+class EventAttendance(LocalDateBucketed):
+    LOCAL_DATE_FIELD = 'checkin_time'
+
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='attendances')
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='event_attendances')
     registration = models.OneToOneField(EventRegistration, on_delete=models.CASCADE, related_name='attendance')
@@ -145,10 +148,11 @@ class EventAttendance(models.Model):
     )
     feedback_comments = models.TextField(blank=True)
     
-    class Meta:
+    class Meta(LocalDateBucketed.Meta):
         unique_together = ['event', 'student']
         ordering = ['-checkin_time']
         indexes = [
+            *LocalDateBucketed.Meta.indexes,
             models.Index(fields=['event', 'checkin_time']),
             models.Index(fields=['student', 'checkin_time']),
         ]
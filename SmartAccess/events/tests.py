@@ -1,3 +1,31 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.urls import reverse
+
+from SmartAccess.testing import CachedTestCase
+from attendance.models import Card
+from students.models import Student
+
+
+class EventNfcCheckinTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = Student.objects.create(name='Ayesha Khan', roll_number='CS-001', nfc_uid='A1B2C3D4')
+
+    def checkin(self, card_id):
+        response = self.client.post(
+            reverse('event_nfc_checkin_api'), json.dumps({'card_id': card_id}), content_type='application/json',
+        )
+        return response.json()
+
+    def test_student_card_is_resolved_through_the_registry(self):
+        self.assertEqual(
+            self.checkin('A1B2C3D4'),
+            {'success': True, 'student_id': self.student.pk, 'name': 'Ayesha Khan'},
+        )
+
+    def test_unknown_and_revoked_cards_are_refused(self):
+        Card.objects.filter(uid='A1B2C3D4').update(status='revoked')
+
+        self.assertEqual(self.checkin('FFFFFFFF')['error'], 'Card not recognized')
+        self.assertEqual(self.checkin('A1B2C3D4')['error'], 'Card has been revoked')
@@ -11,6 +11,7 @@ import json
 # Import from the modular models
 from .models import Event, EventCategory, EventRegistration, EventAttendance
 from students.models import Student
+from attendance.cards import card_error, resolve_card
 from .forms import EventForm, EventSearchForm, EventCategoryForm
 from authentication.decorators import teacher_required
 
@@ -259,8 +260,15 @@ def event_nfc_checkin_api(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
+            card = resolve_card(data.get('card_id'))
+            error = card_error(card, 'student')
+            if error:
+                return JsonResponse({'success': False, 'error': error})
+
             # Implementation would be migrated here
-            return JsonResponse({'success': True})
+            return JsonResponse({'success': True, 'student_id': card['student_id'], 'name': card['name']})
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON'})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     return JsonResponse({'success': False, 'error': 'Only POST method allowed'})
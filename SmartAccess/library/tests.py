@@ -1,3 +1,34 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from SmartAccess.testing import CachedTestCase
+from attendance.models import Card
+from students.models import Student
+
+
+class BookNfcCheckoutTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = Student.objects.create(name='Ayesha Khan', roll_number='CS-001', nfc_uid='A1B2C3D4')
+
+    def checkout(self, card_id):
+        response = self.client.post(
+            reverse('book_nfc_checkout_api'), json.dumps({'card_id': card_id}), content_type='application/json',
+        )
+        return response.json()
+
+    def test_student_card_is_resolved_through_the_registry(self):
+        self.assertEqual(
+            self.checkout('A1B2C3D4'),
+            {'success': True, 'student_id': self.student.pk, 'name': 'Ayesha Khan'},
+        )
+
+    def test_unusable_cards_are_refused(self):
+        Card.objects.create(uid='5AFF0001', kind='staff', user=User.objects.create_user('guard'))
+        Card.objects.filter(uid='A1B2C3D4').update(status='lost')
+
+        self.assertEqual(self.checkout('FFFFFFFF')['error'], 'Card not recognized')
+        self.assertEqual(self.checkout('5AFF0001')['error'], 'Card does not belong to a student')
+        self.assertEqual(self.checkout('A1B2C3D4')['error'], 'Card has been reported lost')
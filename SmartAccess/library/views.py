@@ -12,6 +12,7 @@ import json
 # Import from the modular models
 from .models import Book, BookCategory, BookBorrow, BookReservation
 from students.models import Student
+from attendance.cards import card_error, resolve_card
 from .forms import BookForm, BookSearchForm, BookBorrowForm, BookReturnForm, BookReservationForm, BookCategoryForm
 from authentication.decorators import teacher_required, student_required
 
@@ -154,8 +155,15 @@ def book_nfc_checkout_api(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
+            card = resolve_card(data.get('card_id'))
+            error = card_error(card, 'student')
+            if error:
+                return JsonResponse({'success': False, 'error': error})
+
             # Implementation would be migrated here
-            return JsonResponse({'success': True})
+            return JsonResponse({'success': True, 'student_id': card['student_id'], 'name': card['name']})
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON'})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     return JsonResponse({'success': False, 'error': 'Only POST method allowed'})
@@ -0,0 +1,205 @@
+"""
+Background card assignment.
+
+``enqueue_card_assignment`` records a CardAssignmentJob and hands it to an
+in-process worker pool once the request's transaction commits, so the view
+returns immediately instead of holding a web worker for the reader's 30
+second scan window. The worker asks the reader for a card, assigns it
+(the Student save signals update the card registry and roster) and records
+the outcome on the job, which the assignment page polls through
+``card_job_status``.
+
+The reader scans one card at a time, so by default there is one worker and
+jobs wait their turn, however long the queue. A process running workers
+keeps a heartbeat in the shared cache and every job records the process it
+was queued on; open jobs whose process has stopped beating, and scans that
+outlive the reader's timeout, are marked failed when their status is next
+read.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import CardAssignmentJob, Student
+from .readers import SCAN_TIMEOUT, request_card_scan
+from attendance.cards import resolve_card
+
+
+logger = logging.getLogger(__name__)
+
+CARD_JOB_WORKERS = getattr(settings, 'NFC_CARD_JOB_WORKERS', 1)
+# A scan still open after this long was lost, even if its process is alive
+SCANNING_STALE_AFTER = timedelta(seconds=SCAN_TIMEOUT * 2)
+
+HEARTBEAT_INTERVAL = getattr(settings, 'NFC_CARD_JOB_HEARTBEAT_INTERVAL', 10)
+# A process that has not beaten for this long has stopped
+HEARTBEAT_TIMEOUT = HEARTBEAT_INTERVAL * 3
+WORKER_KEY_PREFIX = 'students:cardjobs:worker:'
+JOB_OWNER_KEY_PREFIX = 'students:cardjobs:job:'
+JOB_OWNER_TIMEOUT = 60 * 60 * 24
+
+# Identifies this process's workers in the shared cache
+WORKER_ID = uuid.uuid4().hex
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def worker_key(worker_id):
+    return f'{WORKER_KEY_PREFIX}{worker_id}'
+
+
+def job_owner_key(job_id):
+    return f'{JOB_OWNER_KEY_PREFIX}{job_id}'
+
+
+class WorkerHeartbeat:
+    """Background thread marking this process's workers alive in the cache."""
+
+    def __init__(self, interval=HEARTBEAT_INTERVAL):
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self.beat()
+                self._thread = threading.Thread(target=self._run, name='card-assignment-heartbeat', daemon=True)
+                self._thread.start()
+
+    def beat(self):
+        cache.set(worker_key(WORKER_ID), True, HEARTBEAT_TIMEOUT)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.beat()
+            except Exception:
+                logger.exception('Card assignment heartbeat failed')
+
+
+heartbeat = WorkerHeartbeat()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=CARD_JOB_WORKERS, thread_name_prefix='card-assignment')
+        heartbeat.start()
+        return _executor
+
+
+def submit_card_assignment(job_id):
+    """Hand a job to this process's workers, recording the process as its owner."""
+    pool = executor()
+    cache.set(job_owner_key(job_id), WORKER_ID, JOB_OWNER_TIMEOUT)
+    pool.submit(run_card_assignment, job_id)
+
+
+def worker_alive(job):
+    """Whether the process the job was queued on is still running its workers."""
+    owner = cache.get(job_owner_key(job.pk))
+    if owner is None:
+        # Not handed to a worker yet, or the cache lost the record
+        return job.updated_at > timezone.now() - timedelta(seconds=HEARTBEAT_TIMEOUT)
+    return cache.get(worker_key(owner)) is not None
+
+
+def enqueue_card_assignment(student, user=None):
+    """Queue a card scan for ``student``; an already open job is returned instead of a new one."""
+    job = CardAssignmentJob.objects.filter(student=student, status__in=['queued', 'scanning'])\
+        .order_by('-created_at').first()
+    if job is not None and not expire_if_stale(job):
+        return job
+
+    job = CardAssignmentJob.objects.create(student=student, requested_by=user)
+    transaction.on_commit(lambda: submit_card_assignment(job.pk))
+    return job
+
+
+def _finish(job, status, card_uid='', error=''):
+    job.status, job.card_uid, job.error = status, card_uid, error[:255]
+    job.save(update_fields=['status', 'card_uid', 'error', 'updated_at'])
+
+
+def assign_scanned_card(job, result):
+    """Validate the reader's answer and assign the card to the job's student."""
+    if not result.get('success'):
+        _finish(job, 'failed', error=result.get('error', 'Unknown error'))
+        return
+
+    new_uid = result.get('card_id')
+    if not new_uid:
+        _finish(job, 'failed', error='The reader did not return a card id')
+        return
+    existing_card = resolve_card(new_uid)
+    if existing_card and existing_card['status'] != 'revoked':
+        if existing_card['status'] == 'lost':
+            error = 'This card has been reported lost. Please scan a new card.'
+        else:
+            error = f"Card already assigned to {existing_card['name']}. Please scan a new card."
+        _finish(job, 'failed', card_uid=new_uid, error=error)
+        return
+
+    with transaction.atomic():
+        student = Student.objects.select_for_update().get(pk=job.student_id)
+        if student.nfc_uid:
+            _finish(job, 'failed', error=f'{student.name} already has an assigned NFC card.')
+            return
+        student.nfc_uid = new_uid
+        student.save()
+        _finish(job, 'assigned', card_uid=new_uid)
+
+
+def run_card_assignment(job_id):
+    """Worker entry point: scan a card for one queued job."""
+    close_old_connections()
+    try:
+        job = CardAssignmentJob.objects.select_related('student').filter(pk=job_id, status='queued').first()
+        if job is None:
+            return
+        job.status = 'scanning'
+        job.save(update_fields=['status', 'updated_at'])
+        assign_scanned_card(job, request_card_scan(job.student.roll_number))
+    except Exception as e:
+        logger.exception('Card assignment job %s failed', job_id)
+        CardAssignmentJob.objects.filter(pk=job_id).update(status='failed', error=f'Error: {e}'[:255], updated_at=timezone.now())
+    finally:
+        close_old_connections()
+
+
+def expire_if_stale(job):
+    """Fail an open job whose worker is gone; returns True if it was expired."""
+    if job.is_finished:
+        return False
+    scan_timed_out = job.status == 'scanning' and job.updated_at <= timezone.now() - SCANNING_STALE_AFTER
+    if worker_alive(job) and not scan_timed_out:
+        return False
+    _finish(job, 'failed', error='The assignment was interrupted. Please try again.')
+    return True
+
+
+def job_status(job):
+    expire_if_stale(job)
+    return {
+        'id': job.pk,
+        'student_id': job.student_id,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'finished': job.is_finished,
+        'card_uid': job.card_uid,
+        'error': job.error,
+        'updated_at': job.updated_at.isoformat(),
+    }
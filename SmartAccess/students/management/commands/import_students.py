@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from students.onboarding import IMPORT_CHUNK_SIZE, IMPORT_WORKERS, onboard_students, read_student_rows
+import os
+
+
+class Command(BaseCommand):
+    help = 'Bulk-register students from a CSV or XLSX file (name, roll_number, optional nfc_uid and password)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file with a header row')
+        parser.add_argument('--workers', type=int, default=IMPORT_WORKERS, help='Processes used to hash passwords')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='Students inserted per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the file without creating anything')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+
+        with open(path, 'rb') as handle:
+            stats = onboard_students(
+                read_student_rows(handle, path),
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+            )
+
+        for line, roll_number, error in stats.errors:
+            self.stdout.write(self.style.ERROR(f'Line {line} ({roll_number or "no roll number"}): {error}'))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'Dry run: {stats.valid} of {stats.read} rows would be imported, {len(stats.errors)} rejected.'
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {stats.created} of {stats.read} students in {stats.elapsed:.1f}s '
+            f'({stats.rows_per_second:.0f} rows/s, {stats.hash_seconds:.1f}s hashing); '
+            f'{len(stats.errors)} rows rejected.'
+        ))
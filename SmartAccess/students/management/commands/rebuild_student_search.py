@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from students.search import rebuild_search_index, uses_index
+import time
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the student name/roll number search index from the student table'
+
+    def handle(self, *args, **options):
+        if not uses_index():
+            self.stdout.write('This database does not use the search index; nothing to do.')
+            return
+        started = time.monotonic()
+        indexed = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} students ({time.monotonic() - started:.2f}s).'
+        ))
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import secrets
+import time
+
+
+class Command(BaseCommand):
+    help = 'Serve a stub NFC reader (/status and /scan-for-assignment) for local testing of card assignment'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=5000)
+        parser.add_argument('--delay', type=float, default=2.0, help='Seconds to "wait for a card" before answering')
+        parser.add_argument('--card', help='Card id to return (default: a new random 8-byte hex id per scan)')
+        parser.add_argument('--fail', action='store_true', help='Answer every scan with a no-card timeout')
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer((options['host'], options['port']), stub_reader_handler(options, self.stdout))
+        self.stdout.write(self.style.SUCCESS(
+            f"Stub reader listening on http://{options['host']}:{options['port']} "
+            f"(set NFC_READER_URL to this address)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+def stub_reader_handler(options, stdout):
+    class StubReaderHandler(BaseHTTPRequestHandler):
+        # Keep-alive, like the real reader, so client connection reuse can be tested
+        protocol_version = 'HTTP/1.1'
+
+        def _reply(self, status, data):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/status':
+                self._reply(200, {'status': 'online', 'stub': True})
+            else:
+                self._reply(404, {'error': 'Not found'})
+
+        def do_POST(self):
+            if self.path != '/scan-for-assignment':
+                self._reply(404, {'error': 'Not found'})
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length) or b'{}')
+            time.sleep(options['delay'])
+            if options['fail']:
+                self._reply(200, {'success': False, 'error': 'Timeout - no card detected'})
+                return
+            card_id = options['card'] or secrets.token_hex(8).upper()
+            stdout.write(f"Scanned card {card_id} for {request.get('roll_number')}")
+            self._reply(200, {'success': True, 'card_id': card_id})
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubReaderHandler
@@ -12,3 +12,33 @@ class Student(models.Model):
 
     def __str__(self):
         return f"{self.roll_number} - {self.name}"
+
+
+class CardAssignmentJob(models.Model):
+    """A request to scan a new card for a student, run by a background worker."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('scanning', 'Waiting for card'),
+        ('assigned', 'Assigned'),
+        ('failed', 'Failed'),
+    ]
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='card_jobs')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='card_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    card_uid = models.CharField(max_length=50, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'status']),
+        ]
+
+    @property
+    def is_finished(self):
+        return self.status in ('assigned', 'failed')
+
+    def __str__(self):
+        return f"{self.student.roll_number} card job ({self.status})"
@@ -0,0 +1,259 @@
+"""
+Bulk student onboarding from CSV or XLSX.
+
+``read_student_rows`` yields one dict per row with ``name``, ``roll_number``
+and optional ``nfc_uid`` and ``password`` columns (the password defaults to
+the student's name, as in ``register_student``). ``onboard_students``:
+
+* validates every row up front: required fields, lengths, hexadecimal card
+  UIDs, duplicates within the file, and roll numbers, usernames and card
+  UIDs already in use, by a student or in the card registry (one query per
+  table); revoked registry cards are reissued to the new student;
+* hashes the passwords across a process pool, since a PBKDF2 hash is
+  hundreds of milliseconds of CPU each (the ``import_students`` command;
+  web uploads hash in-process rather than fork the server);
+* inserts the ``User`` rows, their "Students" group memberships, the
+  ``Student`` rows, their registry cards and the roster card assignments
+  with ``bulk_create``, one transaction per chunk.
+
+Invalid rows are reported by line and skipped; the rest are imported.
+"""
+
+import csv
+import io
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+import openpyxl
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Student
+from .search import index_students
+from attendance.cards import forget_cards
+from attendance.models import Card, RosterChange
+
+
+IMPORT_CHUNK_SIZE = 500
+IMPORT_WORKERS = getattr(settings, 'STUDENT_IMPORT_WORKERS', None) or os.cpu_count() or 1
+# Below this many rows a pool costs more than it saves
+POOL_THRESHOLD = 8
+
+COLUMNS = {
+    'name': ('name', 'student_name', 'full_name'),
+    'roll_number': ('roll_number', 'roll_no', 'roll'),
+    'nfc_uid': ('nfc_uid', 'card_id', 'uid', 'card'),
+    'password': ('password',),
+}
+
+NAME_MAX_LENGTH = Student._meta.get_field('name').max_length
+ROLL_MAX_LENGTH = Student._meta.get_field('roll_number').max_length
+UID_MAX_LENGTH = Student._meta.get_field('nfc_uid').max_length
+HEX_UID = re.compile(r'^[A-Fa-f0-9]+$')
+
+
+class OnboardingStats:
+    def __init__(self):
+        self.read = 0
+        self.valid = 0
+        self.created = 0
+        self.errors = []  # (line, roll_number, message)
+        self.hash_seconds = 0.0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+def _file_format(name):
+    return 'xlsx' if name.lower().endswith(('.xlsx', '.xlsm')) else 'csv'
+
+
+def _normalize(header):
+    return str(header or '').strip().lower().replace(' ', '_')
+
+
+def _pick(row, fields):
+    for field in fields:
+        value = row.get(field)
+        if value not in (None, ''):
+            return str(value).strip()
+    return ''
+
+
+def _row(raw):
+    return {column: _pick(raw, fields) for column, fields in COLUMNS.items()}
+
+
+def _csv_rows(handle):
+    reader = csv.DictReader(io.TextIOWrapper(handle, encoding='utf-8-sig', newline=''))
+    reader.fieldnames = [_normalize(field) for field in reader.fieldnames or []]
+    for line, raw in enumerate(reader, start=2):
+        yield line, _row(raw)
+
+
+def _xlsx_rows(handle):
+    workbook = openpyxl.load_workbook(handle, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_normalize(value) for value in next(rows, ())]
+        for line, values in enumerate(rows, start=2):
+            if any(value not in (None, '') for value in values):
+                yield line, _row(dict(zip(header, values)))
+    finally:
+        workbook.close()
+
+
+def read_student_rows(handle, name):
+    """Yield ``(line, row)`` from a CSV or XLSX file opened in binary mode; ``name`` picks the format."""
+    if _file_format(name) == 'xlsx':
+        return _xlsx_rows(handle)
+    return _csv_rows(handle)
+
+
+def validate_rows(rows, stats):
+    """Return the valid ``(line, row)`` pairs, recording an error for every other row."""
+    candidates = []
+    seen_rolls = set()
+    seen_uids = set()
+    for line, row in rows:
+        stats.read += 1
+        error = None
+        if not row['name'] or not row['roll_number']:
+            error = 'Name and roll number are required'
+        elif len(row['name']) > NAME_MAX_LENGTH:
+            error = f'Name is longer than {NAME_MAX_LENGTH} characters'
+        elif len(row['roll_number']) > ROLL_MAX_LENGTH:
+            error = f'Roll number is longer than {ROLL_MAX_LENGTH} characters'
+        elif row['nfc_uid'] and (len(row['nfc_uid']) > UID_MAX_LENGTH or not HEX_UID.match(row['nfc_uid'])):
+            error = 'NFC UID must be hexadecimal'
+        elif row['roll_number'] in seen_rolls:
+            error = 'Roll number appears more than once in the file'
+        elif row['nfc_uid'] and row['nfc_uid'] in seen_uids:
+            error = 'NFC UID appears more than once in the file'
+        if error:
+            stats.errors.append((line, row['roll_number'], error))
+            continue
+        seen_rolls.add(row['roll_number'])
+        if row['nfc_uid']:
+            seen_uids.add(row['nfc_uid'])
+        candidates.append((line, row))
+
+    taken_rolls = set()
+    taken_uids = set()
+    existing = Student.objects.filter(Q(roll_number__in=seen_rolls) | Q(nfc_uid__in=seen_uids))
+    for roll_number, nfc_uid in existing.values_list('roll_number', 'nfc_uid'):
+        taken_rolls.add(roll_number)
+        taken_uids.add(nfc_uid)
+    taken_usernames = set(User.objects.filter(username__in=seen_rolls).values_list('username', flat=True))
+    # Lost cards and teacher or staff cards keep their UID; revoked ones can be reissued
+    taken_uids |= set(
+        Card.objects.filter(uid__in=seen_uids).exclude(status='revoked').values_list('uid', flat=True)
+    )
+
+    valid = []
+    for line, row in candidates:
+        if row['roll_number'] in taken_rolls:
+            stats.errors.append((line, row['roll_number'], 'A student with this roll number already exists'))
+        elif row['roll_number'] in taken_usernames:
+            stats.errors.append((line, row['roll_number'], 'A user with this username already exists'))
+        elif row['nfc_uid'] and row['nfc_uid'] in taken_uids:
+            stats.errors.append((line, row['roll_number'], 'NFC UID is already assigned to another student'))
+        else:
+            valid.append((line, row))
+    return valid
+
+
+def _init_worker():
+    # Spawned (non-forked) workers start without configured settings
+    django.setup()
+
+
+def hash_passwords(passwords, workers=IMPORT_WORKERS):
+    """``make_password`` for each password, spread over ``workers`` processes."""
+    if workers <= 1 or len(passwords) < POOL_THRESHOLD:
+        return [make_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def _insert_chunk(rows, hashes, group):
+    """Insert one chunk of validated rows; call inside a transaction."""
+    users = User.objects.bulk_create([
+        User(username=row['roll_number'], password=password) for row, password in zip(rows, hashes)
+    ])
+    if any(user.pk is None for user in users):
+        # Backends without RETURNING leave the primary keys unset
+        ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'id'))
+        for user in users:
+            user.pk = ids[user.username]
+
+    User.groups.through.objects.bulk_create([
+        User.groups.through(user_id=user.pk, group_id=group.pk) for user in users
+    ])
+    students = Student.objects.bulk_create([
+        Student(user_id=user.pk, name=row['name'], roll_number=row['roll_number'], nfc_uid=row['nfc_uid'] or None)
+        for row, user in zip(rows, users)
+    ])
+    # bulk_create skips the signals that index students, register cards and log them for readers
+    index_students(students)
+    carded = [student for student in students if student.nfc_uid]
+    # Revoked cards are reissued, as sync_student_card does
+    revoked = {
+        card.uid: card
+        for card in Card.objects.filter(uid__in=[student.nfc_uid for student in carded], status='revoked')
+    }
+    now = timezone.now()
+    for student in carded:
+        card = revoked.get(student.nfc_uid)
+        if card is not None:
+            card.kind, card.student_id, card.user_id, card.status = 'student', student.pk, student.user_id, 'active'
+            card.updated_at = now
+    Card.objects.bulk_update(revoked.values(), ['kind', 'student', 'user', 'status', 'updated_at'])
+    Card.objects.bulk_create([
+        Card(uid=student.nfc_uid, kind='student', student_id=student.pk, user_id=student.user_id)
+        for student in carded if student.nfc_uid not in revoked
+    ])
+    # Readers may have cached these UIDs as unknown or revoked
+    forget_cards(*[student.nfc_uid for student in carded])
+    RosterChange.objects.bulk_create([
+        RosterChange(nfc_uid=student.nfc_uid, student_id=student.pk, action='assign')
+        for student in carded
+    ])
+    return len(students)
+
+
+def onboard_students(rows, stats=None, workers=IMPORT_WORKERS, chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+    """Validate and import ``(line, row)`` pairs; returns the OnboardingStats."""
+    stats = stats or OnboardingStats()
+    started = time.monotonic()
+
+    valid = validate_rows(rows, stats)
+    stats.valid = len(valid)
+    if valid and not dry_run:
+        hashed = time.monotonic()
+        hashes = hash_passwords([row['password'] or row['name'] for _, row in valid], workers)
+        stats.hash_seconds = time.monotonic() - hashed
+
+        group, _ = Group.objects.get_or_create(name='Students')
+        for start in range(0, len(valid), chunk_size):
+            chunk = valid[start:start + chunk_size]
+            try:
+                with transaction.atomic():
+                    stats.created += _insert_chunk([row for _, row in chunk], hashes[start:start + chunk_size], group)
+            except IntegrityError as e:
+                # Someone registered one of these students since validation
+                stats.errors.extend((line, row['roll_number'], f'Not imported: {e}') for line, row in chunk)
+
+    stats.errors.sort(key=lambda error: error[0])
+    stats.elapsed = time.monotonic() - started
+    return stats
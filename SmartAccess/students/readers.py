@@ -0,0 +1,317 @@
+"""
+Client for the NFC reader (the Raspberry Pi Flask server) used for card
+assignment. The reader's address comes from ``settings.NFC_READER_URL``;
+``run_stub_reader`` serves the same endpoints locally for testing.
+
+Each reader URL gets one ``ReaderClient`` per process, which owns:
+
+* a keep-alive ``requests.Session`` with a small connection pool, so calls
+  reuse one TCP connection instead of opening a new one each time;
+* bounded retries with exponential backoff. Connection failures are
+  retried for every call (a repeated scan request just re-arms the
+  reader); timeouts and 5xx answers only for the idempotent status check;
+* a circuit breaker: after ``READER_FAILURE_THRESHOLD`` consecutive
+  failures calls fail fast for ``READER_COOLDOWN`` seconds, then a single
+  trial call decides whether it closes again;
+* per-operation latency metrics (calls, errors, mean, p50/p95/max).
+
+``reader_health()`` returns the last health check from the cache and never
+waits on the reader. A background thread refreshes it every
+``READER_HEALTH_INTERVAL`` seconds, starting on first use.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+
+logger = logging.getLogger(__name__)
+
+READER_URL = getattr(settings, 'NFC_READER_URL', 'http://127.0.0.1:5000').rstrip('/')
+STATUS_TIMEOUT = getattr(settings, 'NFC_READER_STATUS_TIMEOUT', 2)
+# The reader waits up to 30 seconds for a card; allow for the round trip
+SCAN_TIMEOUT = getattr(settings, 'NFC_READER_SCAN_TIMEOUT', 35)
+SCAN_WINDOW_SECONDS = SCAN_TIMEOUT - 5
+
+READER_POOL_SIZE = getattr(settings, 'NFC_READER_POOL_SIZE', 4)
+READER_RETRIES = getattr(settings, 'NFC_READER_RETRIES', 2)
+READER_BACKOFF = getattr(settings, 'NFC_READER_BACKOFF', 0.2)  # Seconds, doubled per retry
+READER_FAILURE_THRESHOLD = getattr(settings, 'NFC_READER_FAILURE_THRESHOLD', 3)
+READER_COOLDOWN = getattr(settings, 'NFC_READER_COOLDOWN', 30)
+
+READER_HEALTH_INTERVAL = getattr(settings, 'NFC_READER_HEALTH_INTERVAL', 15)
+HEALTH_KEY_PREFIX = 'students:reader:health:'
+HEALTH_TIMEOUT = READER_HEALTH_INTERVAL * 4
+
+LATENCY_SAMPLES = 500
+
+
+class ReaderUnavailable(Exception):
+    """The circuit breaker is open; the reader is not being called."""
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=READER_FAILURE_THRESHOLD, cooldown=READER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+    def retry_in(self):
+        if self.opened_at is None:
+            return 0
+        return max(0, int(self.cooldown - (time.monotonic() - self.opened_at)))
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # Let one trial call through; the others keep failing fast
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning('Reader circuit opened after %d consecutive failures', self.failures)
+                self.opened_at = time.monotonic()
+
+
+class LatencyStats:
+    """Per-operation call counts and latencies (milliseconds) for one process."""
+
+    def __init__(self):
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, milliseconds, ok):
+        with self._lock:
+            stats = self._operations.setdefault(operation, {
+                'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'samples': deque(maxlen=LATENCY_SAMPLES),
+            })
+            stats['calls'] += 1
+            stats['errors'] += 0 if ok else 1
+            stats['total_ms'] += milliseconds
+            stats['max_ms'] = max(stats['max_ms'], milliseconds)
+            stats['samples'].append(milliseconds)
+
+    def summary(self):
+        with self._lock:
+            operations = {name: dict(stats, samples=sorted(stats['samples'])) for name, stats in self._operations.items()}
+        return {
+            name: {
+                'calls': stats['calls'],
+                'errors': stats['errors'],
+                'mean_ms': round(stats['total_ms'] / stats['calls'], 1),
+                'p50_ms': round(_percentile(stats['samples'], 50), 1),
+                'p95_ms': round(_percentile(stats['samples'], 95), 1),
+                'max_ms': round(stats['max_ms'], 1),
+            }
+            for name, stats in operations.items()
+        }
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+class ReaderClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=READER_POOL_SIZE, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.breaker = CircuitBreaker()
+        self.metrics = LatencyStats()
+
+    def request(self, operation, method, path, timeout, idempotent=False, **kwargs):
+        """
+        One call to the reader with retries; returns the response or raises
+        ReaderUnavailable or the last ``requests`` exception.
+        """
+        if not self.breaker.allow():
+            raise ReaderUnavailable(f'Reader unavailable, retrying in {self.breaker.retry_in()}s')
+
+        for attempt in range(READER_RETRIES + 1):
+            last_attempt = attempt == READER_RETRIES
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, f'{self.base_url}{path}', timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.metrics.record(operation, (time.monotonic() - started) * 1000, ok=False)
+                retryable = idempotent or not isinstance(e, requests.exceptions.ReadTimeout)
+                if last_attempt or not retryable:
+                    self.breaker.record_failure()
+                    raise
+            else:
+                failed = response.status_code >= 500
+                self.metrics.record(operation, (time.monotonic() - started) * 1000, ok=not failed)
+                if not failed:
+                    self.breaker.record_success()
+                    return response
+                if last_attempt or not idempotent:
+                    self.breaker.record_failure()
+                    return response
+            time.sleep(READER_BACKOFF * 2 ** attempt)
+
+    def status(self):
+        """Basic connectivity check to the reader"""
+        try:
+            response = self.request('status', 'GET', '/status', STATUS_TIMEOUT, idempotent=True)
+            if response.status_code == 200:
+                return {'success': True, 'status': 'Scanner online'}
+            return {'success': False, 'error': 'Scanner not responding'}
+        except ReaderUnavailable as e:
+            return {'success': False, 'error': str(e)}
+        except requests.exceptions.ConnectionError:
+            return {'success': False, 'error': self.connection_error()}
+        except requests.exceptions.Timeout:
+            return {'success': False, 'error': 'Scanner status check timed out'}
+        except Exception as e:
+            return {'success': False, 'error': f'Scanner error: {str(e)}'}
+
+    def scan_for_assignment(self, roll_number):
+        """Ask the reader to scan a card for assignment; blocks until a card is read or it times out."""
+        payload = {
+            'roll_number': roll_number,
+            'action': 'assign_card'
+        }
+        try:
+            response = self.request('scan_for_assignment', 'POST', '/scan-for-assignment', SCAN_TIMEOUT, json=payload)
+            logger.debug('Reader %s answered %s: %s', self.base_url, response.status_code, response.text[:200])
+
+            if response.status_code != 200:
+                return {'success': False, 'error': f'Reader server error: {response.status_code}'}
+            try:
+                return response.json()
+            except json.JSONDecodeError:
+                return {'success': False, 'error': f'Invalid response from scanner: {response.text[:100]}'}
+
+        except ReaderUnavailable as e:
+            return {'success': False, 'error': str(e)}
+        except requests.exceptions.ConnectionError:
+            return {'success': False, 'error': self.connection_error()}
+        except requests.exceptions.Timeout:
+            return {'success': False, 'error': f'Scanner timeout - no card detected within {SCAN_WINDOW_SECONDS} seconds'}
+        except Exception as e:
+            return {'success': False, 'error': f'Scanner error: {str(e)}'}
+
+    def connection_error(self):
+        return f'Cannot connect to NFC scanner at {self.base_url}. Please check that the reader server is running.'
+
+    def check_health(self):
+        """Run a status check now and cache the result for ``reader_health``."""
+        started = time.monotonic()
+        result = self.status()
+        health = {
+            'url': self.base_url,
+            'online': result['success'],
+            'status': result.get('status') or result.get('error'),
+            'latency_ms': round((time.monotonic() - started) * 1000, 1),
+            'circuit': self.breaker.state,
+            'checked_at': time.time(),
+        }
+        cache.set(health_key(self.base_url), health, HEALTH_TIMEOUT)
+        return health
+
+    def stats(self):
+        return {
+            'url': self.base_url,
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'operations': self.metrics.summary(),
+        }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def reader_client(url=None):
+    """The process's client for a reader URL (the configured reader by default)."""
+    url = (url or READER_URL).rstrip('/')
+    with _clients_lock:
+        if url not in _clients:
+            _clients[url] = ReaderClient(url)
+        return _clients[url]
+
+
+def health_key(url):
+    return f'{HEALTH_KEY_PREFIX}{url}'
+
+
+class HealthMonitor:
+    """Background thread refreshing the cached health of the configured reader."""
+
+    def __init__(self, interval=READER_HEALTH_INTERVAL):
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='reader-health', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        while True:
+            try:
+                reader_client().check_health()
+            except Exception:
+                logger.exception('Reader health check failed')
+            finally:
+                close_old_connections()
+            time.sleep(self.interval)
+
+
+health_monitor = HealthMonitor()
+
+
+def reader_health():
+    """
+    The cached health of the configured reader, without waiting on it:
+    ``online`` is None until the first background check has finished.
+    """
+    health_monitor.start()
+    health = cache.get(health_key(reader_client().base_url))
+    if health is None:
+        return {'url': reader_client().base_url, 'online': None, 'status': 'Checking scanner...', 'checked_at': None}
+    return health
+
+
+def scanner_status():
+    return reader_client().status()
+
+
+def request_card_scan(roll_number):
+    return reader_client().scan_for_assignment(roll_number)
@@ -0,0 +1,176 @@
+"""
+Student search and autocomplete.
+
+On SQLite, names and roll numbers are indexed in the FTS5 table
+``students_search`` (rowid = student id) with prefix indexes for the first
+one to three characters of every word. ``search_students`` turns a query
+into prefix terms (``ali kh`` matches ``"ali"* "kh"*``), ranks the first
+``RANK_CANDIDATES`` matches with bm25 (roll number weighted above name) and
+returns at most ``limit`` rows with only the requested fields; the indexed
+fields are read from the index itself without touching the student table.
+Empty queries return nothing.
+
+Student signals keep the index in sync; ``rebuild_search_index`` (and the
+``rebuild_student_search`` command) refill it, e.g. after bulk inserts that
+bypass signals. Other databases fall back to prefix lookups on the columns.
+
+Short queries, the first keystrokes of an autocomplete, match the most
+students and repeat the most, so they are cached for ``SEARCH_CACHE_TIMEOUT``
+seconds.
+"""
+
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.db.models import Q
+
+from .models import Student
+
+
+SEARCH_TABLE = 'students_search'
+
+# The search views are public, so card UIDs are never returned
+SEARCH_FIELDS = ('id', 'name', 'roll_number', 'is_in_university')
+INDEXED_FIELDS = ('id', 'name', 'roll_number')
+DEFAULT_FIELDS = INDEXED_FIELDS
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_TERMS = 5
+
+SEARCH_KEY_PREFIX = 'students:search:'
+SEARCH_CACHE_TIMEOUT = getattr(settings, 'STUDENT_SEARCH_CACHE_TIMEOUT', 30)
+CACHE_PREFIX_LENGTH = 4
+
+# bm25 weights for (name, roll_number)
+RANK_WEIGHTS = (1.0, 2.0)
+# Matches ranked per query; broad prefixes (one letter, a batch code) match
+# most of the table, and ranking all of them costs far more than the lookup
+RANK_CANDIDATES = getattr(settings, 'STUDENT_SEARCH_RANK_CANDIDATES', 200)
+
+TOKEN = re.compile(r'\w+')
+
+
+def uses_index():
+    return connection.vendor == 'sqlite'
+
+
+def ensure_search_index():
+    """Create the FTS5 table if needed; returns True if it was just created."""
+    if not uses_index():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SEARCH_TABLE])
+        if cursor.fetchone():
+            return False
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+            f"name, roll_number, tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')"
+        )
+    return True
+
+
+def rebuild_search_index():
+    """Refill the index from the student table; returns the number of students indexed."""
+    if not uses_index():
+        return 0
+    ensure_search_index()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, roll_number) '
+            f'SELECT id, name, roll_number FROM {Student._meta.db_table}'
+        )
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {SEARCH_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def index_students(students):
+    """Add or refresh index rows for saved Student instances."""
+    if not uses_index() or not students:
+        return
+    rows = [(student.pk, student.name, student.roll_number) for student in students]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {SEARCH_TABLE} (rowid, name, roll_number) VALUES (%s, %s, %s)', rows)
+
+
+def unindex_student(student_id):
+    if uses_index():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [student_id])
+
+
+def query_terms(query):
+    return [token.lower() for token in TOKEN.findall(query or '')][:MAX_TERMS]
+
+
+def clean_fields(fields):
+    """The requested fields that may be returned, in a stable order."""
+    if not fields:
+        return DEFAULT_FIELDS
+    fields = [field for field in SEARCH_FIELDS if field in fields]
+    return tuple(fields) or DEFAULT_FIELDS
+
+
+def _indexed_search(terms, fields, limit):
+    match = ' '.join(f'"{term}"*' for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT id, name, roll_number FROM ('
+            f'SELECT rowid AS id, name, roll_number, bm25({SEARCH_TABLE}, %s, %s) AS score '
+            f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s LIMIT %s'
+            f') ORDER BY score LIMIT %s',
+            [*RANK_WEIGHTS, match, max(limit, RANK_CANDIDATES), limit],
+        )
+        rows = [dict(zip(INDEXED_FIELDS, row)) for row in cursor.fetchall()]
+
+    if set(fields) <= set(INDEXED_FIELDS):
+        return [{field: row[field] for field in fields} for row in rows]
+    # Other fields come from the student table, in the index's order
+    students = {
+        student['id']: student
+        for student in Student.objects.filter(id__in=[row['id'] for row in rows]).values('id', *fields)
+    }
+    return [{field: students[row['id']][field] for field in fields} for row in rows if row['id'] in students]
+
+
+def _fallback_search(terms, fields, limit):
+    filters = Q()
+    for term in terms:
+        filters &= Q(name__istartswith=term) | Q(name__icontains=f' {term}') | Q(roll_number__istartswith=term)
+    return list(Student.objects.filter(filters).order_by('name').values(*fields)[:limit])
+
+
+def search_students(query, limit=DEFAULT_LIMIT, fields=None):
+    """Up to ``limit`` students whose name or roll number words start with the query's words."""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    fields = clean_fields(fields)
+
+    normalized = ' '.join(terms)
+    key = None
+    if len(normalized) <= CACHE_PREFIX_LENGTH:
+        key = f'{SEARCH_KEY_PREFIX}{limit}:{",".join(fields)}:{"+".join(terms)}'
+        results = cache.get(key)
+        if results is not None:
+            return results
+
+    results = None
+    if uses_index():
+        try:
+            results = _indexed_search(terms, fields, limit)
+        except DatabaseError:
+            # The index has not been created yet (run rebuild_student_search)
+            results = None
+    if results is None:
+        results = _fallback_search(terms, fields, limit)
+
+    if key:
+        cache.set(key, results, SEARCH_CACHE_TIMEOUT)
+    return results
@@ -0,0 +1,29 @@
+"""
+Keep the student search index in step with the student table, and create
+(and fill) the index after migrations.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Student
+from .search import ensure_search_index, index_students, rebuild_search_index, unindex_student
+
+SEARCHED_FIELDS = {'name', 'roll_number'}
+
+
+@receiver(post_save, sender=Student)
+def index_student_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCHED_FIELDS & set(update_fields):
+        return
+    index_students([instance])
+
+
+@receiver(post_delete, sender=Student)
+def unindex_student_on_delete(sender, instance, **kwargs):
+    unindex_student(instance.pk)
+
+
+def create_search_index(sender, **kwargs):
+    if ensure_search_index():
+        rebuild_search_index()
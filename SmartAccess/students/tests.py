@@ -1,3 +1,275 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+import requests
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from SmartAccess.testing import CachedTestCase
+from students import cardjobs, readers
+from attendance.models import Card
+from students.models import CardAssignmentJob, Student
+from students.onboarding import hash_passwords, onboard_students, read_student_rows
+from students.search import rebuild_search_index
+
+
+class CardJobTestCase(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = Student.objects.create(name='Ayesha Khan', roll_number='CS-001')
+        self.teacher = User.objects.create_user('teacher', password='pass')
+        self.teacher.groups.add(Group.objects.get_or_create(name='Teachers')[0])
+        self.job = CardAssignmentJob.objects.create(student=self.student, requested_by=self.teacher)
+
+    def age(self, job, **delta):
+        CardAssignmentJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(**delta))
+        job.refresh_from_db()
+
+
+class CardJobStatusAccessTests(CardJobTestCase):
+    def status(self, user):
+        self.client.force_login(user)
+        return self.client.get(reverse('card_job_status', args=[self.job.pk]))
+
+    def test_requester_and_staff_see_the_job(self):
+        other_teacher = User.objects.create_user('teacher2')
+        other_teacher.groups.add(Group.objects.get(name='Teachers'))
+        admin = User.objects.create_superuser('admin')
+
+        for user in (self.teacher, other_teacher, admin):
+            response = self.status(user)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['student_id'], self.student.pk)
+
+    def test_other_users_get_404(self):
+        student_user = User.objects.create_user('student')
+        self.assertEqual(self.status(student_user).status_code, 404)
+
+
+class CardJobExpiryTests(CardJobTestCase):
+    def test_queued_job_behind_a_backlog_is_kept_while_its_worker_lives(self):
+        cardjobs.heartbeat.beat()
+        cache.set(cardjobs.job_owner_key(self.job.pk), cardjobs.WORKER_ID)
+        self.age(self.job, hours=1)
+
+        self.assertFalse(cardjobs.expire_if_stale(self.job))
+        self.assertEqual(self.job.status, 'queued')
+
+    def test_job_of_a_stopped_worker_is_failed(self):
+        cache.set(cardjobs.job_owner_key(self.job.pk), 'gone')
+
+        self.assertTrue(cardjobs.expire_if_stale(self.job))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'failed')
+
+    def test_job_never_handed_to_a_worker_is_failed_after_the_grace_period(self):
+        self.assertFalse(cardjobs.expire_if_stale(self.job))
+        self.age(self.job, seconds=cardjobs.HEARTBEAT_TIMEOUT + 1)
+        self.assertTrue(cardjobs.expire_if_stale(self.job))
+
+    def test_scan_past_the_reader_timeout_is_failed(self):
+        cardjobs.heartbeat.beat()
+        cache.set(cardjobs.job_owner_key(self.job.pk), cardjobs.WORKER_ID)
+        CardAssignmentJob.objects.filter(pk=self.job.pk).update(status='scanning')
+        self.age(self.job, seconds=cardjobs.SCANNING_STALE_AFTER.total_seconds() + 1)
+
+        self.assertTrue(cardjobs.expire_if_stale(self.job))
+
+
+class StudentSearchTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        Student.objects.create(name='Ayesha Khan', roll_number='CS-001', nfc_uid='A1B2C3D4')
+        Student.objects.create(name='Bilal Ahmed', roll_number='EE-002', nfc_uid='0A0B0C0D')
+        rebuild_search_index()
+
+    def search(self, **params):
+        response = self.client.get(reverse('student_search'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['students']
+
+    def test_prefix_search(self):
+        self.assertEqual([row['roll_number'] for row in self.search(q='ay kh')], ['CS-001'])
+        self.assertEqual([row['name'] for row in self.search(q='ee')], ['Bilal Ahmed'])
+
+    def test_card_uids_are_never_returned(self):
+        results = self.search(q='ayesha', fields='nfc_uid')
+        self.assertEqual(results, [{'id': results[0]['id'], 'name': 'Ayesha Khan', 'roll_number': 'CS-001'}])
+
+        results = self.search(q='ayesha', fields='name,nfc_uid,is_in_university')
+        self.assertEqual(results, [{'name': 'Ayesha Khan', 'is_in_university': False}])
+
+    def test_empty_query_returns_nothing(self):
+        self.assertEqual(self.search(q=''), [])
+        self.assertEqual(self.client.get(reverse('student_search_api'), {'q': '  '}).json(), [])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class OnboardingTests(CachedTestCase):
+    HEADER = ['Student Name', 'Roll No', 'Card ID']
+    ROWS = [
+        ['Ayesha Khan', 'CS-001', 'A1B2C3D4'],
+        ['', 'CS-002', ''],                      # no name
+        ['Bilal Ahmed', 'CS-003', 'not-hex'],    # bad card UID
+        ['Sara Ali', 'CS-001', ''],              # roll number repeated in the file
+        ['Omar Farooq', 'CS-004', 'A1B2C3D4'],   # card UID repeated in the file
+        ['Zainab Raza', 'CS-900', ''],           # roll number already registered
+        ['x' * 200, 'CS-005', ''],               # name too long
+        ['Hamza Malik', 'CS-006', '0A0B0C0D'],
+    ]
+
+    def setUp(self):
+        super().setUp()
+        Student.objects.create(name='Existing', roll_number='CS-900')
+
+    def csv_file(self):
+        lines = [','.join(self.HEADER)] + [','.join(row) for row in self.ROWS]
+        return io.BytesIO('\n'.join(lines).encode())
+
+    def xlsx_file(self):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(self.HEADER)
+        for row in self.ROWS:
+            sheet.append(row)
+        sheet.append([None, None, None])  # blank rows are skipped
+        handle = io.BytesIO()
+        workbook.save(handle)
+        handle.seek(0)
+        return handle
+
+    def assert_imported(self, stats):
+        self.assertEqual((stats.read, stats.valid, stats.created), (8, 2, 2))
+        self.assertEqual([error[0] for error in stats.errors], [3, 4, 5, 6, 7, 8])
+        self.assertEqual(
+            set(Student.objects.exclude(roll_number='CS-900').values_list('roll_number', 'nfc_uid')),
+            {('CS-001', 'A1B2C3D4'), ('CS-006', '0A0B0C0D')},
+        )
+        self.assertEqual(set(Card.objects.values_list('uid', flat=True)), {'A1B2C3D4', '0A0B0C0D'})
+        self.assertTrue(User.objects.get(username='CS-001').groups.filter(name='Students').exists())
+
+    def test_csv_with_malformed_rows(self):
+        self.assert_imported(onboard_students(read_student_rows(self.csv_file(), 'students.csv'), workers=1))
+
+    def test_xlsx_with_malformed_rows(self):
+        self.assert_imported(onboard_students(read_student_rows(self.xlsx_file(), 'students.xlsx'), workers=1))
+
+    def test_dry_run_writes_nothing(self):
+        stats = onboard_students(read_student_rows(self.csv_file(), 'students.csv'), workers=1, dry_run=True)
+
+        self.assertEqual((stats.valid, stats.created), (2, 0))
+        self.assertEqual(Student.objects.count(), 1)
+
+    def test_registry_cards_are_checked_per_row(self):
+        staff = User.objects.create_user('guard')
+        Card.objects.create(uid='A1B2C3D4', kind='staff', user=staff)
+        Card.objects.create(uid='0A0B0C0D', kind='staff', user=staff, status='revoked')
+
+        stats = onboard_students(read_student_rows(self.csv_file(), 'students.csv'), workers=1)
+
+        self.assertEqual(stats.created, 1)
+        self.assertIn((2, 'CS-001', 'NFC UID is already assigned to another student'), stats.errors)
+        reissued = Card.objects.get(uid='0A0B0C0D')
+        self.assertEqual((reissued.kind, reissued.status), ('student', 'active'))
+        self.assertEqual(reissued.student, Student.objects.get(roll_number='CS-006'))
+
+    def test_upload_hashes_in_process(self):
+        teacher = User.objects.create_user('teacher')
+        teacher.groups.add(Group.objects.get_or_create(name='Teachers')[0])
+        self.client.force_login(teacher)
+        upload = self.csv_file()
+        upload.name = 'students.csv'
+
+        with mock.patch('students.onboarding.hash_passwords', wraps=hash_passwords) as hashed:
+            response = self.client.post(reverse('bulk_import_students'), {'file': upload})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(hashed.call_args.args[1], 1)
+        self.assertEqual(response.context['stats'].created, 2)
+
+
+class ReaderClientTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.clock = 1000.0
+        for name, value in [('monotonic', lambda: self.clock), ('sleep', mock.Mock())]:
+            patcher = mock.patch(f'students.readers.time.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.reader = readers.ReaderClient('http://reader.test/')
+        self.reader.breaker = readers.CircuitBreaker(threshold=2, cooldown=30)
+        self.session = self.reader.session = mock.Mock()
+
+    def answer(self, *responses):
+        self.session.request.reset_mock()
+        self.session.request.side_effect = [
+            mock.Mock(status_code=response) if isinstance(response, int) else response
+            for response in responses
+        ]
+
+    def test_pooled_session_is_shared_per_url(self):
+        client = readers.reader_client('http://pooled.test/')
+        self.addCleanup(readers._clients.pop, 'http://pooled.test')
+        adapter = client.session.get_adapter('http://pooled.test/status')
+
+        self.assertIs(readers.reader_client('http://pooled.test'), client)
+        self.assertEqual(adapter._pool_maxsize, readers.READER_POOL_SIZE)
+
+    def test_status_checks_are_retried_with_backoff(self):
+        self.answer(requests.exceptions.ConnectionError(), 503, 200)
+
+        self.assertEqual(self.reader.status(), {'success': True, 'status': 'Scanner online'})
+        self.assertEqual(self.session.request.call_count, 3)
+        self.assertEqual(readers.time.sleep.call_args_list, [mock.call(0.2), mock.call(0.4)])
+        self.assertEqual(self.reader.breaker.state, 'closed')
+        self.assertEqual(self.reader.stats()['operations']['status']['errors'], 2)
+
+    def test_scan_requests_are_not_retried_after_a_read_timeout(self):
+        self.answer(requests.exceptions.ReadTimeout())
+
+        result = self.reader.scan_for_assignment('CS-001')
+
+        self.assertFalse(result['success'])
+        self.assertIn('no card detected', result['error'])
+        self.assertEqual(self.session.request.call_count, 1)
+
+    def test_breaker_opens_and_fails_fast(self):
+        with self.assertLogs('students.readers', 'WARNING'):
+            for _ in range(2):
+                self.answer(*[requests.exceptions.ConnectionError()] * 3)
+                self.assertFalse(self.reader.status()['success'])
+        self.assertEqual(self.reader.breaker.state, 'open')
+
+        self.session.request.reset_mock()
+        result = self.reader.status()
+
+        self.assertEqual(result, {'success': False, 'error': 'Reader unavailable, retrying in 30s'})
+        self.session.request.assert_not_called()
+
+    def test_half_open_trial_closes_or_reopens_the_breaker(self):
+        breaker = self.reader.breaker
+        with self.assertLogs('students.readers', 'WARNING'):
+            breaker.record_failure()
+            breaker.record_failure()
+        self.clock += 30
+        self.assertEqual(breaker.state, 'half-open')
+
+        # A failed trial opens it again for a full cooldown
+        self.answer(500, 500, 500)
+        self.assertFalse(self.reader.status()['success'])
+        self.assertEqual(breaker.state, 'open')
+        self.assertEqual(breaker.retry_in(), 30)
+
+        # Only one caller gets the trial call; a successful one closes the breaker
+        self.clock += 30
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        self.clock += 30
+        self.answer(200)
+        self.assertTrue(self.reader.status()['success'])
+        self.assertEqual((breaker.state, breaker.failures), ('closed', 0))
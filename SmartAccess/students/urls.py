@@ -4,6 +4,7 @@ from . import views
 # Students app URLs - pure student management functions
 urlpatterns = [
     path('register/', views.register_student, name='register_student'),
+    path('import/', views.bulk_import_students, name='bulk_import_students'),
     path('<int:student_id>/edit/', views.edit_student, name='edit_student'),
     path('<int:student_id>/delete/', views.delete_student, name='delete_student'),
     path('<int:student_id>/', views.student_detail, name='student_detail'),
@@ -14,4 +15,6 @@ urlpatterns = [
     path('<int:student_id>/assign-card/', views.assign_card_page, name='assign_card_page'),
     path('<int:student_id>/assign-card-request/', views.assign_card_request, name='assign_card_request'),
     path('<int:student_id>/remove-card/', views.remove_card, name='remove_card'),
+    path('card-jobs/<int:job_id>/', views.card_job_status, name='card_job_status'),
+    path('reader/status/', views.reader_status_api, name='reader_status_api'),
 ]
\ No newline at end of file
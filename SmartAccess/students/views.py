@@ -1,20 +1,23 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.urls import reverse
+from django.http import Http404, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User, Group
 from django.contrib import messages
-from django.utils import timezone
-from django.db.models import Q
-from django.core.paginator import Paginator
 from datetime import timedelta
-import requests
-import json
 
 # Import from the modular models
-from students.models import Student
+from students.models import CardAssignmentJob, Student
+from students.cardjobs import enqueue_card_assignment, job_status
+from students.readers import SCAN_WINDOW_SECONDS, reader_client, reader_health
 from students.forms import StudentForm, StudentPhotoForm
+from students.onboarding import onboard_students, read_student_rows
+from students.search import search_students
 from authentication.decorators import student_required, teacher_required
 from attendance.models import EntryLog
+from attendance.visits import visit_summary
+from SmartAccess.localdates import campus_localdate
+from SmartAccess.pagination import keyset_paginate
 
 # All student-related functions are now implemented in this module
 
@@ -55,6 +58,30 @@ def register_student(request):
     return render(request, 'students/register.html', {'form': form, 'students': students})
 
 
+@login_required
+@teacher_required
+def bulk_import_students(request):
+    """Register many students at once from an uploaded CSV or XLSX file"""
+    context = {}
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'Please choose a CSV or XLSX file to import.')
+        else:
+            try:
+                # Hash in this process: a pool would fork the server and its threads
+                stats = onboard_students(
+                    read_student_rows(upload, upload.name),
+                    workers=1,
+                    dry_run=request.POST.get('dry_run') == 'on',
+                )
+            except Exception as e:
+                messages.error(request, f'Could not read {upload.name}: {e}')
+            else:
+                context = {'stats': stats, 'dry_run': request.POST.get('dry_run') == 'on'}
+    return render(request, 'students/bulk_import.html', context)
+
+
 @teacher_required
 def edit_student(request, student_id):
     """Edit student view - migrated from legacy student app"""
@@ -90,30 +117,21 @@ def student_detail(request, student_id):
     student = get_object_or_404(Student, id=student_id)
     logs = EntryLog.objects.filter(student=student).order_by('-timestamp')
 
-    total_visits = logs.filter(action='in').count()
-
-    visits = []
-    check_in_time = None
-    for log in logs.order_by('timestamp'):
-        if log.action == 'in':
-            check_in_time = log.timestamp
-        elif log.action == 'out' and check_in_time:
-            visits.append((check_in_time, log.timestamp))
-            check_in_time = None
-
-    if check_in_time:
-        visits.append((check_in_time, timezone.now()))
-
-    total_duration = sum([(out - inn).total_seconds() for inn, out in visits])
-    average_duration = (total_duration / total_visits) if total_visits > 0 else 0
+    # Visit totals are maintained by the scan path
+    summary = visit_summary(student)
+    total_visits = summary['total_visits']
+    average_duration = summary['average_seconds']
 
     # Calculate hours and minutes from average_duration seconds
     avg_hours = int(average_duration // 3600)
     avg_minutes = int((average_duration % 3600) // 60)
 
+    # Keyset pagination over the student's log
+    page_logs = keyset_paginate(logs, cursor=request.GET.get('cursor'), per_page=25)
+
     context = {
         'student': student,
-        'logs': logs,
+        'logs': page_logs,
         'total_visits': total_visits,
         'average_duration': average_duration,  # seconds, optional if needed
         'avg_hours': avg_hours,
@@ -140,21 +158,18 @@ def update_photo(request):
 
 
 def student_search(request):
-    """Student search view - migrated from legacy student app"""
+    """Student search view - prefix search on name and roll number, at most ``limit`` rows"""
     query = request.GET.get('q', '')
-    students = Student.objects.filter(
-        Q(name__icontains=query) |
-        Q(roll_number__icontains=query)
-    )
-    return JsonResponse({'students': list(students.values())})
+    limit = request.GET.get('limit', '')
+    limit = int(limit) if limit.isdigit() else 25
+    fields = [field for field in request.GET.get('fields', '').split(',') if field]
+    return JsonResponse({'students': search_students(query, limit=limit, fields=fields)})
 
 
 def student_search_api(request):
-    """Student search API view - migrated from legacy student app"""
+    """Student autocomplete API - the 10 best prefix matches"""
     q = request.GET.get('q', '')
-    students = Student.objects.filter(name__icontains=q)[:10]
-    results = [{'id': s.id, 'name': s.name, 'roll_number': s.roll_number} for s in students]
-    return JsonResponse(results, safe=False)
+    return JsonResponse(search_students(q, limit=10), safe=False)
 
 
 # ===================================================================
@@ -166,74 +181,52 @@ def student_search_api(request):
 def assign_card_page(request, student_id):
     """NFC Card assignment page for students"""
     student = get_object_or_404(Student, id=student_id)
+    job = None
+    if request.GET.get('job', '').isdigit():
+        job = CardAssignmentJob.objects.filter(id=request.GET['job'], student=student).first()
     context = {
         'student': student,
+        'job': job,
+        'timeout_seconds': SCAN_WINDOW_SECONDS,
+        'scanner': reader_health(),
     }
     return render(request, 'students/assign_card.html', context)
 
 
-def nfc_scanner_interface(request):
-    """Interface for NFC scanner communication"""
-    try:
-        # Basic connectivity check to Raspberry Pi
-        response = requests.get('http://192.168.1.100:5000/status', timeout=5)
-        if response.status_code == 200:
-            return {'success': True, 'status': 'Scanner online'}
-        else:
-            return {'success': False, 'error': 'Scanner not responding'}
-    except requests.exceptions.ConnectionError:
-        return {'success': False, 'error': 'Cannot connect to NFC scanner. Please check if Raspberry Pi Flask server is running on port 5000.'}
-    except requests.exceptions.Timeout:
-        return {'success': False, 'error': 'Scanner timeout - no card detected within 30 seconds'}
-    except Exception as e:
-        return {'success': False, 'error': f'Scanner error: {str(e)}'}
-
-
 @login_required
 def assign_card_request(request, student_id):
-    """Process card assignment request to Raspberry Pi"""
+    """Queue a card scan on the reader; the assignment page polls the job"""
     # Check permissions
     if not (request.user.is_superuser or request.user.groups.filter(name='Teachers').exists()):
         messages.error(request, "Access denied. Teacher or admin privileges required.")
         return redirect('login')  # Redirect to login instead of dashboard_redirect
     
-    try:
-        student = Student.objects.get(id=student_id)
-        
-        # Check if student already has a card
-        if student.nfc_uid:
-            messages.warning(request, f"{student.name} already has an assigned NFC card.")
-            return redirect('login')
-        
-        # Send request to Raspberry Pi to scan card
-        pi_response = request_card_scan_from_pi(student.roll_number)
-        
-        if pi_response.get('success'):
-            # Card scanned successfully, update student
-            new_uid = pi_response.get('card_id')
-            
-            # Check if card is already assigned to another student
-            existing_student = Student.objects.filter(nfc_uid=new_uid).first()
-            if existing_student:
-                messages.error(request, f"Card already assigned to {existing_student.name} ({existing_student.roll_number}). Please scan a new card.")
-                return redirect('assign_card_page', student_id=student_id)
-            
-            student.nfc_uid = new_uid
-            student.save()
-            messages.success(request, f"NFC card successfully assigned to {student.name}!")
-            
-        else:
-            error_msg = pi_response.get('error', 'Unknown error')
-            if 'timeout' in error_msg.lower():
-                messages.error(request, "No card detected within 30 seconds. Please try again.")
-            else:
-                messages.error(request, f"Failed to assign card: {error_msg}")
-            return redirect('assign_card_page', student_id=student_id)
-            
-    except Student.DoesNotExist:
-        messages.error(request, "Student not found")
+    student = get_object_or_404(Student, id=student_id)
     
-    return redirect('login')
+    # Check if student already has a card
+    if student.nfc_uid:
+        messages.warning(request, f"{student.name} already has an assigned NFC card.")
+        return redirect('assign_card_page', student_id=student_id)
+    
+    job = enqueue_card_assignment(student, request.user)
+    return redirect(f"{reverse('assign_card_page', args=[student_id])}?job={job.id}")
+
+
+@login_required
+def card_job_status(request, job_id):
+    """Status of a card assignment job, polled by the assignment page"""
+    job = get_object_or_404(CardAssignmentJob, id=job_id)
+    # Only the requester and staff may see it; 404 so job ids cannot be probed
+    is_staff = request.user.is_superuser or request.user.groups.filter(name='Teachers').exists()
+    if not is_staff and job.requested_by_id != request.user.id:
+        raise Http404('No CardAssignmentJob matches the given query.')
+    return JsonResponse(job_status(job))
+
+
+@login_required
+def reader_status_api(request):
+    """Cached reader health plus this process's reader call metrics"""
+    return JsonResponse({'health': reader_health(), 'client': reader_client().stats()})
 
 
 @login_required  
@@ -259,40 +252,6 @@ def remove_card(request, student_id):
     return redirect('login')
 
 
-def request_card_scan_from_pi(roll_number):
-    """Send request to Raspberry Pi to scan a card for assignment"""
-    try:
-        # Replace with your actual Pi IP
-        pi_url = "http://172.20.10.2:5000/scan-for-assignment"
-        payload = {
-            'roll_number': roll_number,
-            'action': 'assign_card'
-        }
-        
-        print(f"DEBUG: Sending request to {pi_url}")  # Debug info
-        response = requests.post(pi_url, json=payload, timeout=35)  # 35 second timeout (30 + buffer)
-        
-        print(f"DEBUG: Response status: {response.status_code}")  # Debug info
-        print(f"DEBUG: Response text: {response.text}")  # Debug info
-        
-        # Check if response is successful
-        if response.status_code != 200:
-            return {'success': False, 'error': f'Pi server error: {response.status_code}'}
-        
-        # Try to parse JSON
-        try:
-            return response.json()
-        except json.JSONDecodeError:
-            return {'success': False, 'error': f'Invalid response from Pi scanner: {response.text[:100]}'}
-        
-    except requests.exceptions.ConnectionError:
-        return {'success': False, 'error': 'Cannot connect to NFC scanner. Please check if Raspberry Pi Flask server is running on port 5000.'}
-    except requests.exceptions.Timeout:
-        return {'success': False, 'error': 'Scanner timeout - no card detected within 30 seconds'}
-    except Exception as e:
-        return {'success': False, 'error': f'Scanner error: {str(e)}'}
-
-
 # ===================================================================
 # PROFILE VIEW FUNCTION
 # Migrated from legacy student app for complete modularization
@@ -304,7 +263,7 @@ def profile_view(request):
     user = request.user
     
     # Get today and last 30 days for statistics
-    today = timezone.now().date()
+    today = campus_localdate()
     last_30_days = today - timedelta(days=30)
     context = {}
     
@@ -312,9 +271,8 @@ def profile_view(request):
         try:
             student = user.student_profile
             entry_logs = EntryLog.objects.filter(
-                student=student,
-                timestamp__date__gte=last_30_days
-            ).order_by('-timestamp')[:10]
+                student=student
+            ).between_dates(start=last_30_days).order_by('-timestamp')[:10]
             
             context = {
                 'user_type': 'student',
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from SmartAccess.localdates import LocalDateBucketed
 
 
 class Bus(models.Model):
@@ -47,7 +48,9 @@ class Route(models.Model):
         return f"{self.route_name} ({self.start_location} → {self.end_location})"
 
 
-class TransportLog(models.Model):
+class TransportLog(LocalDateBucketed):
+    LOCAL_DATE_FIELD = 'boarding_time'
+
     BOARDING_STATUS_CHOICES = [
         ('boarded', 'Boarded'),
         ('alighted', 'Alighted'),
@@ -81,11 +84,12 @@ class TransportLog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True, help_text="Additional notes or remarks")
 
-    class Meta:
+    class Meta(LocalDateBucketed.Meta):
         verbose_name = "Transport Log"
         verbose_name_plural = "Transport Logs"
         ordering = ['-boarding_time']
         indexes = [
+            *LocalDateBucketed.Meta.indexes,
             models.Index(fields=['nfc_uid', 'boarding_time']),
             models.Index(fields=['bus', 'boarding_time']),
             models.Index(fields=['user', 'boarding_time']),
@@ -3,16 +3,18 @@ from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Q, Count
+from django.db.models import Q, Count, F
+from django.utils.dateparse import parse_date
 from django.core.paginator import Paginator
 from datetime import timedelta
 import json
 
 # Import from the modular models
 from transportation.models import Bus, Route, TransportLog
+from attendance.cards import card_error, resolve_card
 from authentication.decorators import teacher_required
-from students.models import Student
-from teachers.models import Teacher
+from SmartAccess.localdates import campus_localdate, local_date_q
+from SmartAccess.pagination import keyset_paginate
 
 
 # Transportation Management Views
@@ -21,12 +23,12 @@ from teachers.models import Teacher
 @teacher_required
 def transportation_dashboard(request):
     """Transportation dashboard showing buses, routes, and recent logs"""
-    today = timezone.now().date()
+    today = campus_localdate()
     
     # Get statistics
     total_buses = Bus.objects.filter(is_active=True).count()
     total_routes = Route.objects.filter(status='active').count()
-    today_logs = TransportLog.objects.filter(boarding_time__date=today).count()
+    today_logs = TransportLog.objects.on_date(today).count()
     
     # Recent transport logs
     recent_logs = TransportLog.objects.select_related(
@@ -35,12 +37,12 @@ def transportation_dashboard(request):
     
     # Bus utilization data
     bus_utilization = Bus.objects.filter(is_active=True).annotate(
-        today_usage=Count('transport_logs', filter=Q(transport_logs__boarding_time__date=today))
+        today_usage=Count('transport_logs', filter=local_date_q(on=today, prefix='transport_logs__'))
     ).order_by('-today_usage')[:5]
     
     # Popular routes
     popular_routes = Route.objects.filter(status='active').annotate(
-        usage_count=Count('transport_logs', filter=Q(transport_logs__boarding_time__date=today))
+        usage_count=Count('transport_logs', filter=local_date_q(on=today, prefix='transport_logs__'))
     ).order_by('-usage_count')[:5]
     
     context = {
@@ -177,15 +179,17 @@ def transport_logs(request):
     date_from = request.GET.get('date_from', '')
     date_to = request.GET.get('date_to', '')
     
-    if date_from:
-        logs = logs.filter(boarding_time__date__gte=date_from)
-    if date_to:
-        logs = logs.filter(boarding_time__date__lte=date_to)
+    if date_from or date_to:
+        logs = logs.between_dates(start=parse_date(date_from), end=parse_date(date_to))
     
-    # Pagination
-    paginator = Paginator(logs, 20)
-    page_number = request.GET.get('page')
-    logs = paginator.get_page(page_number)
+    # Keyset pagination on (boarding_time, id); total only on request
+    logs = keyset_paginate(
+        logs,
+        cursor=request.GET.get('cursor'),
+        per_page=20,
+        field='boarding_time',
+        with_count=request.GET.get('count') == '1'
+    )
     
     context = {
         'logs': logs,
@@ -210,32 +214,18 @@ def api_log_transport(request):
             boarding_location = data.get('boarding_location', 'University Gate')
             action = data.get('action', 'board')  # 'board' or 'alight'
             
-            # Find user by NFC UID
-            user = None
-            user_type = None
-            
-            # Check if it's a student
-            try:
-                student = Student.objects.get(nfc_uid=nfc_uid)
-                user = student.user
-                user_type = 'student'
-            except Student.DoesNotExist:
-                pass
-            
-            # Check if it's a teacher
-            if not user:
-                try:
-                    teacher = Teacher.objects.get(nfc_uid=nfc_uid)
-                    user = teacher.user
-                    user_type = 'teacher'
-                except Teacher.DoesNotExist:
-                    pass
-            
-            if not user:
+            # Find the card holder through the card registry
+            card = resolve_card(nfc_uid)
+            if card is None or not card['user_id']:
                 return JsonResponse({
                     'success': False, 
                     'message': 'NFC card not found in system'
                 }, status=404)
+            error = card_error(card)
+            if error:
+                return JsonResponse({'success': False, 'message': error}, status=403)
+            user_id = card['user_id']
+            user_type = card['kind']
             
             # Get bus and route
             bus = get_object_or_404(Bus, id=bus_id)
@@ -244,7 +234,7 @@ def api_log_transport(request):
             if action == 'board':
                 # Check if user is already on board (no alighting time)
                 existing_log = TransportLog.objects.filter(
-                    user=user,
+                    user_id=user_id,
                     bus=bus,
                     alighting_time__isnull=True
                 ).first()
@@ -255,13 +245,21 @@ def api_log_transport(request):
                         'message': 'User is already on board this bus'
                     }, status=400)
                 
+                # Bus.route is the route's name, TransportLog.route a Route
+                route = Route.objects.filter(route_name=bus.route).first()
+                if route is None:
+                    return JsonResponse({
+                        'success': False,
+                        'message': f'Bus {bus.bus_number} is on an unregistered route "{bus.route}"'
+                    }, status=400)
+                
                 # Create new transport log
                 transport_log = TransportLog.objects.create(
-                    user=user,
+                    user_id=user_id,
                     user_type=user_type,
                     nfc_uid=nfc_uid,
                     bus=bus,
-                    route=bus.route if hasattr(bus, 'route') else None,
+                    route=route,
                     boarding_status='boarded',
                     boarding_location=boarding_location,
                     boarding_time=timezone.now()
@@ -269,7 +267,7 @@ def api_log_transport(request):
                 
                 return JsonResponse({
                     'success': True,
-                    'message': f'{user.get_full_name()} boarded bus {bus.bus_number}',
+                    'message': f"{card['name']} boarded bus {bus.bus_number}",
                     'log_id': transport_log.id
                 })
             
@@ -277,7 +275,7 @@ def api_log_transport(request):
             elif action == 'alight':
                 # Find the most recent boarding log without alighting time
                 transport_log = TransportLog.objects.filter(
-                    user=user,
+                    user_id=user_id,
                     bus=bus,
                     alighting_time__isnull=True
                 ).order_by('-boarding_time').first()
@@ -295,7 +293,7 @@ def api_log_transport(request):
                 
                 return JsonResponse({
                     'success': True,
-                    'message': f'{user.get_full_name()} alighted from bus {bus.bus_number}',
+                    'message': f"{card['name']} alighted from bus {bus.bus_number}",
                     'travel_duration': str(transport_log.get_travel_duration())
                 })
             
@@ -358,16 +356,14 @@ def api_bus_status(request, bus_id):
 @teacher_required
 def transportation_analytics(request):
     """Transportation analytics and reports"""
-    today = timezone.now().date()
+    today = campus_localdate()
     last_week = today - timedelta(days=7)
     last_month = today - timedelta(days=30)
     
     # Daily usage statistics
-    daily_stats = TransportLog.objects.filter(
-        boarding_time__date__gte=last_week
-    ).extra({
-        'day': "date(boarding_time)"
-    }).values('day').annotate(
+    daily_stats = TransportLog.objects.between_dates(
+        start=last_week
+    ).values(day=F('local_date')).annotate(
         total_rides=Count('id'),
         unique_users=Count('user', distinct=True)
     ).order_by('day')
@@ -381,8 +377,8 @@ def transportation_analytics(request):
     
     # Bus utilization
     bus_stats = Bus.objects.filter(is_active=True).annotate(
-        monthly_rides=Count('transport_logs', filter=Q(transport_logs__boarding_time__date__gte=last_month)),
-        weekly_rides=Count('transport_logs', filter=Q(transport_logs__boarding_time__date__gte=last_week))
+        monthly_rides=Count('transport_logs', filter=local_date_q(start=last_month, prefix='transport_logs__')),
+        weekly_rides=Count('transport_logs', filter=local_date_q(start=last_week, prefix='transport_logs__'))
     ).order_by('-monthly_rides')
     
     # Calculate occupancy rate and progress bar width for each bus
@@ -399,7 +395,7 @@ def transportation_analytics(request):
     
     # Route popularity
     route_stats = Route.objects.filter(status='active').annotate(
-        monthly_usage=Count('transport_logs', filter=Q(transport_logs__boarding_time__date__gte=last_month))
+        monthly_usage=Count('transport_logs', filter=local_date_q(start=last_month, prefix='transport_logs__'))
     ).order_by('-monthly_usage')
     
     # Calculate progress bar width for routes
@@ -408,11 +404,9 @@ def transportation_analytics(request):
         route.progress_width = (route.monthly_usage / max_route_usage * 100) if max_route_usage > 0 else 0
     
     # Peak hours analysis
-    peak_hours = TransportLog.objects.filter(
-        boarding_time__date__gte=last_week
-    ).extra({
-        'hour': "strftime('%%H', boarding_time)"
-    }).values('hour').annotate(
+    peak_hours = TransportLog.objects.between_dates(
+        start=last_week
+    ).values(hour=F('local_hour')).annotate(
         rides_count=Count('id')
     ).order_by('-rides_count')
     